@@ -0,0 +1,101 @@
+"""
+Benchmark: N intentos de login concurrentes con hash scrypt.
+
+Compara verificar en el event loop (inline) contra el pool de core.passwords, midiendo
+throughput, latencia por intento y el bloqueo máximo del loop (un ticker cada 5 ms:
+si el loop se congela, el hueco entre ticks crece).
+
+Con --url se lanzan los logins contra un servidor corriendo (POST /clientes/login); el
+usuario debe existir con esa contraseña.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_login --attempts 500
+    python -m benchmarks.bench_login --attempts 500 --url http://localhost:8000 \\
+        --username demo --pwd demo
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from core import passwords
+
+
+def percentiles(latencies: list[float]) -> str:
+    q = statistics.quantiles(latencies, n=100)
+    return f"p50={q[49] * 1e3:7.1f}  p95={q[94] * 1e3:7.1f}  p99={q[98] * 1e3:7.1f} ms"
+
+
+async def run_attempts(attempt, n: int) -> tuple[float, list[float], float]:
+    ticks: list[float] = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.005)
+
+    async def timed():
+        start = time.perf_counter()
+        await attempt()
+        return time.perf_counter() - start
+
+    tick_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(timed() for _ in range(n)))
+    elapsed = time.perf_counter() - start
+    tick_task.cancel()
+    stall = max((b - a for a, b in zip(ticks, ticks[1:])), default=elapsed)
+    return elapsed, latencies, stall
+
+
+def report(name: str, n: int, elapsed: float, latencies: list[float], stall: float) -> None:
+    print(
+        f"{name:<8} {n / elapsed:8.1f} logins/s  {percentiles(latencies)}"
+        f"  bloqueo máx. del loop={stall * 1e3:7.1f} ms"
+    )
+
+
+async def bench_local(n: int) -> None:
+    stored = passwords.hash_password("s3creta")
+
+    async def inline():
+        passwords.verify_password("s3creta", stored)
+
+    async def pool():
+        await passwords.verify_password_async("s3creta", stored)
+
+    print(f"{n} intentos, scrypt n={passwords.SCRYPT_N}, {passwords.PASSWORD_HASH_WORKERS} hilos")
+    report("inline", n, *await run_attempts(inline, n))
+    report("pool", n, *await run_attempts(pool, n))
+
+
+async def bench_http(n: int, url: str, username: str, pwd: str) -> None:
+    import httpx
+
+    limits = httpx.Limits(max_connections=n)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        failures = 0
+
+        async def login():
+            nonlocal failures
+            response = await client.post("/clientes/login", json={"username": username, "pwd": pwd})
+            failures += response.status_code != 200
+
+        elapsed, latencies, stall = await run_attempts(login, n)
+    report("http", n, elapsed, latencies, stall)
+    print(f"respuestas no 200: {failures}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--attempts", type=int, default=500)
+    parser.add_argument("--url")
+    parser.add_argument("--username", default="demo")
+    parser.add_argument("--pwd", default="demo")
+    args = parser.parse_args()
+    if args.url:
+        asyncio.run(bench_http(args.attempts, args.url, args.username, args.pwd))
+    else:
+        asyncio.run(bench_local(args.attempts))
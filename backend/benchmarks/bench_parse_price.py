@@ -0,0 +1,93 @@
+"""
+Benchmark: parse_price anterior (varias pasadas de regex/replace) contra catalog.pricing.
+
+Mide el costo por búsqueda (20 productos) sin caché y con la caché LRU caliente, y cuenta
+en cuántos formatos difieren los resultados.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_parse_price --searches 20000 --distinct 2000
+"""
+
+import argparse
+import random
+import re
+import time
+
+from catalog import pricing
+
+
+def legacy_parse_price(price_str):
+    """Implementación previa de routers/products.py, conservada como referencia."""
+    if not price_str:
+        return None
+    cleaned = re.sub(r"[^\d.,]", "", price_str)
+    if "." in cleaned and "," in cleaned:
+        cleaned = cleaned.replace(",", "")
+    elif "," in cleaned and "." not in cleaned:
+        cleaned = cleaned.replace(",", ".")
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
+
+
+def sample_prices(n: int, distinct: int = 2000, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    formats = [
+        lambda v: f"MX${v:,.2f}",
+        lambda v: f"${v:,.0f}",
+        lambda v: f"USD {v:,.2f}",
+        lambda v: f"{v:,.2f} €".replace(",", "X").replace(".", ",").replace("X", "."),
+    ]
+    # Precios repetidos como en resultados reales (mismo producto en varias tiendas)
+    pool = [rng.choice(formats)(rng.uniform(50, 150000)) for _ in range(distinct)]
+    return [rng.choice(pool) for _ in range(n)]
+
+
+def bench(fn, searches: list[list[str]]) -> float:
+    start = time.perf_counter()
+    for results in searches:
+        for price in results:
+            fn(price)
+    return (time.perf_counter() - start) / len(searches) * 1e6
+
+
+def main(n_searches: int, distinct: int) -> None:
+    prices = sample_prices(n_searches * 20, distinct)
+    searches = [prices[i : i + 20] for i in range(0, len(prices), 20)]
+
+    legacy_us = bench(legacy_parse_price, searches)
+    cold_us = bench(lambda p: pricing.parse_money.__wrapped__(p, "mx"), searches)
+    pricing.parse_money.cache_clear()
+    mixed_us = bench(pricing.parse_price, searches)
+    warm_us = bench(pricing.parse_price, searches)
+    batch_start = time.perf_counter()
+    for results in searches:
+        pricing.parse_prices(results)
+    batch_us = (time.perf_counter() - batch_start) / len(searches) * 1e6
+
+    unique = sorted(set(prices))
+    disagreements = [
+        (p, legacy_parse_price(p), pricing.parse_price(p))
+        for p in unique
+        if legacy_parse_price(p) != pricing.parse_price(p)
+    ]
+
+    print(f"búsquedas: {len(searches):,} x 20 precios ({len(unique):,} distintos)")
+    print(f"{'implementación':<32}{'µs/búsqueda':>14}")
+    print(f"{'legacy_parse_price':<32}{legacy_us:>14.2f}")
+    print(f"{'parse_price (sin caché)':<32}{cold_us:>14.2f}")
+    print(f"{'parse_price (caché llenándose)':<32}{mixed_us:>14.2f}")
+    print(f"{'parse_price (caché caliente)':<32}{warm_us:>14.2f}")
+    print(f"{'parse_prices (lote)':<32}{batch_us:>14.2f}")
+    print(f"\nresultados distintos: {len(disagreements)} de {len(unique)}")
+    for price, old, new in disagreements[:5]:
+        print(f"  {price!r}: legacy={old} nuevo={new}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--searches", type=int, default=20000)
+    parser.add_argument("--distinct", type=int, default=2000, help="precios distintos en el pool")
+    args = parser.parse_args()
+    main(args.searches, args.distinct)
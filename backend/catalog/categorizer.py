@@ -0,0 +1,157 @@
+"""
+Clasificación de productos en las categorías de gasto (Luz, Agua, Gas, Transporte).
+
+Se clasifica la lista completa de resultados de una búsqueda en una sola pasada:
+
+1. Caché LRU por título normalizado: búsquedas repetidas no cuestan nada.
+2. Reglas por palabras clave (mismo analizador que el índice de búsqueda, así
+   "paneles solares" y "Panel Solar" caen en la misma raíz). Gana la categoría con
+   mayor puntaje; un empate o ningún acierto deja el título pendiente.
+3. Los pendientes se mandan juntos a Gemini en una sola llamada (opcional; requiere
+   GEMINI_API_KEY y CATEGORIZER_USE_LLM distinto de "0").
+4. Lo que siga sin resolver recibe la categoría por defecto (la de la consulta), y
+   no se guarda en caché para que una llamada posterior pueda resolverlo.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Sequence
+
+from cachetools import LRUCache
+
+from gemini.baseGeminiQueries import gemini_structured_response
+from models.gemini import ProductCategories
+
+from .search_index import analyze, fold_accents
+
+logger = logging.getLogger(__name__)
+
+CATEGORIAS = ("Luz", "Agua", "Gas", "Transporte")
+DEFAULT_CATEGORIA = "Luz"
+
+# Peso 3: el tipo de producto; 2: señal fuerte; 1: atributo que aparece en varias
+KEYWORDS: Dict[str, Dict[str, int]] = {
+    "Luz": {
+        "solar": 3, "panel": 3, "fotovoltaico": 3, "foco": 3, "bombilla": 3,
+        "regulador": 3, "inversor": 3, "lampara": 3, "luminaria": 2, "voltaje": 2,
+        "watts": 1, "led": 1, "luz": 1, "bateria": 1,
+    },
+    "Agua": {
+        "regadera": 3, "aireador": 3, "pluvial": 3, "lluvia": 2, "grifo": 2,
+        "llave": 1, "filtro": 2, "inodoro": 3, "ducha": 3, "tinaco": 3, "cisterna": 3,
+        "agua": 1, "ahorradora": 1,
+    },
+    "Gas": {
+        "gas": 3, "lp": 2, "estufa": 3, "boiler": 1, "instantaneo": 2, "aislante": 3,
+        "termico": 1, "sellador": 2, "fuga": 2, "parrilla": 2, "quemador": 3,
+        "calentador": 1,
+    },
+    "Transporte": {
+        "bicicleta": 3, "scooter": 3, "patin": 3, "vehiculo": 3, "coche": 3, "auto": 3,
+        "moto": 3, "motobici": 3, "ev": 3, "cargador": 1, "hibrido": 2, "llanta": 2,
+    },
+}
+
+# raíz -> [(categoría, peso)], con la misma normalización que los títulos
+_STEM_WEIGHTS: Dict[str, List[tuple]] = {}
+for _categoria, _words in KEYWORDS.items():
+    for _word, _weight in _words.items():
+        for _stem in analyze(_word):
+            _STEM_WEIGHTS.setdefault(_stem, []).append((_categoria, _weight))
+
+_cache: LRUCache = LRUCache(maxsize=int(os.getenv("CATEGORIZER_CACHE_SIZE", "8192")))
+
+
+def clear_cache() -> None:
+    _cache.clear()
+
+
+def _cache_key(title: str) -> str:
+    return " ".join(fold_accents(title).split())
+
+
+def classify_by_rules(title: str) -> Optional[str]:
+    """Categoría por palabras clave, o None si no hay aciertos o hay empate."""
+    scores = dict.fromkeys(CATEGORIAS, 0)
+    for token in set(analyze(title)):
+        for categoria, weight in _STEM_WEIGHTS.get(token, ()):
+            scores[categoria] += weight
+    best = max(scores.values())
+    if best == 0:
+        return None
+    winners = [c for c, score in scores.items() if score == best]
+    return winners[0] if len(winners) == 1 else None
+
+
+def _llm_enabled() -> bool:
+    return os.getenv("CATEGORIZER_USE_LLM", "1") != "0" and bool(os.getenv("GEMINI_API_KEY"))
+
+
+def _classify_with_gemini(titles: Sequence[str]) -> Dict[int, str]:
+    listing = "\n".join(f"{i}. {title}" for i, title in enumerate(titles))
+    prompt = f"""
+    Classify each product into the household expense it helps reduce.
+    Possible categories: 'Luz' (electricity), 'Agua' (water), 'Gas' (gas / heating fuel),
+    'Transporte' (vehicles and transportation fuel).
+
+    Products:
+    {listing}
+
+    Respond with a JSON object with a 'categorias' list containing one object per product,
+    with its 'index' (the number before the product) and its 'categoria'.
+    """
+    result = gemini_structured_response(prompt, ProductCategories)
+    if "error" in result:
+        logger.warning("categorizer: Gemini failed: %s", result["error"])
+        return {}
+    return {
+        c["index"]: c["categoria"]
+        for c in result["categorias"]
+        if 0 <= c["index"] < len(titles)
+    }
+
+
+async def categorize_products(
+    titles: Sequence[str],
+    default: Optional[str] = None,
+    use_llm: Optional[bool] = None,
+) -> List[str]:
+    """
+    Categoría para cada título, en el mismo orden.
+
+    default: categoría para los títulos que no se pudieron resolver; si no se da se
+    usa DEFAULT_CATEGORIA.
+    use_llm: forzar (o evitar) la llamada a Gemini; por defecto según el entorno.
+    """
+    keys = [_cache_key(t) for t in titles]
+    resolved: Dict[str, str] = {}
+    pending: Dict[str, str] = {}  # llave -> título original (sin duplicados)
+
+    for key, title in zip(keys, titles):
+        if key in resolved or key in pending:
+            continue
+        categoria = _cache.get(key)
+        if categoria is None:
+            categoria = classify_by_rules(title)
+            if categoria is not None:
+                _cache[key] = categoria
+        if categoria is None:
+            pending[key] = title
+        else:
+            resolved[key] = categoria
+
+    if pending and (_llm_enabled() if use_llm is None else use_llm):
+        pending_keys = list(pending)
+        by_index = await asyncio.to_thread(_classify_with_gemini, list(pending.values()))
+        for i, categoria in by_index.items():
+            key = pending_keys[i]
+            resolved[key] = _cache[key] = categoria
+            pending.pop(key, None)
+        logger.info(
+            "categorizer: %d titles, %d sent to Gemini, %d unresolved",
+            len(titles), len(pending_keys), len(pending),
+        )
+
+    fallback = default or DEFAULT_CATEGORIA
+    return [resolved.get(key, fallback) for key in keys]
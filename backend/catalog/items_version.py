@@ -0,0 +1,37 @@
+"""
+Versión de la tabla items compartida entre workers (tabla items_version).
+
+La caché de /items (core/http_cache.py) y el índice de búsqueda local
+(catalog/search_index.py) son por proceso; invalidarlos en el worker que escribe no
+alcanza a los demás. Las escrituras llaman a bump_items_version() dentro de su
+transacción y las lecturas consultan get_items_version(): una búsqueda por llave
+primaria que dice si lo que el worker tiene en memoria sigue vigente.
+"""
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from models.item import ItemsVersion
+
+
+async def get_items_version(session: AsyncSession) -> int:
+    result = await session.execute(select(ItemsVersion.version).where(ItemsVersion.id == 1))
+    return result.scalar_one_or_none() or 0
+
+
+async def bump_items_version(session: AsyncSession) -> int:
+    """Incrementa la versión (en la transacción de quien llama) y devuelve la nueva."""
+    result = await session.execute(
+        update(ItemsVersion)
+        .where(ItemsVersion.id == 1)
+        .values(version=ItemsVersion.version + 1)
+        .returning(ItemsVersion.version)
+    )
+    version = result.scalar_one_or_none()
+    if version is None:
+        # Base sin la fila sembrada por la migración 0003 (p. ej. create_all en tests)
+        session.add(ItemsVersion(id=1, version=1))
+        await session.flush()
+        version = 1
+    return version
@@ -0,0 +1,135 @@
+"""
+Normalización de precios de la API de productos ('MX$3,140.50', 'USD 1,200.75',
+'1.299,00 €', '$1,299'...).
+
+Una sola expresión regular precompilada extrae moneda y cifra en una pasada; luego se
+decide qué separador es decimal:
+
+- Si aparecen coma y punto, el último es el decimal (1,299.50 / 1.299,50).
+- Si un separador se repite, es de miles (1,234,567 / 1.234.567).
+- Una sola coma seguida de exactamente 3 dígitos es de miles (formato MX/US: $1,299);
+  con 1-2 dígitos es decimal (12,5).
+- Un solo punto es decimal, salvo en locales con punto de miles (es, eu, br).
+"""
+
+import re
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Optional
+
+SYMBOLS = {
+    "MX$": "MXN",
+    "US$": "USD",
+    "USD$": "USD",
+    "CA$": "CAD",
+    "R$": "BRL",
+    "€": "EUR",
+    "£": "GBP",
+}
+
+# Locales donde el punto separa miles ("1.299" = mil doscientos noventa y nueve)
+DOT_THOUSANDS_LOCALES = frozenset({"es", "eu", "br", "ar", "co", "cl"})
+
+DEFAULT_CURRENCY = {"mx": "MXN", "us": "USD", "es": "EUR", "eu": "EUR", "br": "BRL"}
+
+_PRICE_RE = re.compile(
+    r"""
+    (?P<prefix>[A-Z]{3}\$?|[A-Z]{1,2}\$|\$|€|£)?\s*
+    # Grupos de miles exactos: "1,2345" no es "1,234" seguido de un 5
+    (?P<number>\d{1,3}(?:[.,\s]\d{3})+(?!\d)(?:[.,]\d+)?|\d+(?:[.,]\d+)?)
+    (?:\s*(?P<suffix>[A-Z]{3}\b|€|£))?
+    """,
+    re.VERBOSE,
+)
+
+
+# Camino rápido para el formato más común de la API en MX/US: "MX$3,140.50", "$1,299"
+_FAST_RE = re.compile(r"(MX\$|US\$|\$)?(\d{1,3}(?:,\d{3})*|\d+)(\.\d{1,2})?")
+_FAST_LOCALES = frozenset({"mx", "us"})
+
+_SPACES_RE = re.compile(r"\s")
+
+
+class Money(NamedTuple):
+    amount: float
+    currency: Optional[str]
+
+
+def _to_float(number: str, locale: str) -> float:
+    if not number.isdigit():
+        number = _SPACES_RE.sub("", number)
+    last_comma = number.rfind(",")
+    last_dot = number.rfind(".")
+
+    if last_comma != -1 and last_dot != -1:
+        decimal = "," if last_comma > last_dot else "."
+    elif last_comma != -1:
+        digits_after = len(number) - last_comma - 1
+        decimal = "," if number.count(",") == 1 and digits_after != 3 else None
+    elif last_dot != -1:
+        digits_after = len(number) - last_dot - 1
+        if number.count(".") > 1:
+            decimal = None
+        elif locale in DOT_THOUSANDS_LOCALES and digits_after == 3:
+            decimal = None
+        else:
+            decimal = "."
+    else:
+        return float(number)
+
+    thousands = "." if decimal == "," else ","
+    number = number.replace(thousands, "")
+    if decimal is None:
+        number = number.replace(".", "")
+    elif decimal == ",":
+        number = number.replace(",", ".")
+    return float(number)
+
+
+def _currency(token: Optional[str], locale: str) -> Optional[str]:
+    if not token:
+        return None
+    if token in SYMBOLS:
+        return SYMBOLS[token]
+    if token == "$":
+        return DEFAULT_CURRENCY.get(locale)
+    return token.rstrip("$")
+
+
+@lru_cache(maxsize=8192)
+def parse_money(price_str: Optional[str], locale: str = "mx") -> Optional[Money]:
+    """Cifra y moneda (ISO 4217 si se puede inferir) del primer precio del texto."""
+    if not price_str:
+        return None
+    if locale in _FAST_LOCALES:
+        fast = _FAST_RE.fullmatch(price_str)
+        if fast is not None:
+            symbol, integer, decimals = fast.groups()
+            amount = float(integer.replace(",", "") + (decimals or ""))
+            return Money(amount, _currency(symbol, locale))
+    match = _PRICE_RE.search(price_str)
+    if match is None:
+        return None
+    try:
+        amount = _to_float(match.group("number"), locale)
+    except ValueError:
+        return None
+    prefix, suffix = match.group("prefix"), match.group("suffix")
+    if prefix == "$" and suffix:
+        # "$20 USD": el código explícito manda sobre el "$" genérico
+        prefix = None
+    currency = _currency(prefix, locale) or _currency(suffix, locale)
+    return Money(amount, currency)
+
+
+def parse_price(price_str: Optional[str], locale: str = "mx") -> Optional[float]:
+    """
+    Convert a price string like 'MX$3,140.50' or 'USD 1,200.75' into a float.
+    Returns None if parsing fails.
+    """
+    money = parse_money(price_str, locale)
+    return money.amount if money else None
+
+
+def parse_prices(price_strs: Iterable[Optional[str]], locale: str = "mx") -> List[Optional[float]]:
+    """Versión por lotes para listas completas de resultados (usa la misma caché)."""
+    return [parse_price(p, locale) for p in price_strs]
@@ -0,0 +1,21 @@
+"""
+Catálogo local de productos verdes (productList.json).
+Se lee y valida una sola vez por proceso.
+"""
+
+import json
+import os
+from functools import lru_cache
+from typing import Tuple
+
+from models.gemini import ProductData
+
+PRODUCT_LIST_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "productList.json"
+)
+
+
+@lru_cache(maxsize=1)
+def load_product_catalog() -> Tuple[ProductData, ...]:
+    with open(PRODUCT_LIST_PATH, "r", encoding="utf-8") as f:
+        return tuple(ProductData(**p) for p in json.load(f))
@@ -0,0 +1,247 @@
+"""
+Cliente asíncrono para la API de búsqueda de productos de RapidAPI.
+
+- Un solo httpx.AsyncClient por proceso, con keep-alive y un único contexto SSL
+  (CA bundle de certifi): no se repite el handshake TLS en cada búsqueda.
+- Resultados cacheados por (query, page, country) durante RAPIDAPI_CACHE_TTL segundos.
+- Single-flight: búsquedas idénticas concurrentes comparten una sola petición.
+
+La petición en sí la hace un ProductSearchProvider, elegido con RAPIDAPI_PROVIDER:
+"rapidapi" (por defecto, la API real) o "fake", que responde localmente con latencia,
+tasa de errores y cuota configurables (core/fakes.py: FAKE_RAPIDAPI_LATENCY,
+FAKE_RAPIDAPI_ERROR_RATE, FAKE_RAPIDAPI_RPM, FAKE_SEED) para pruebas de carga sin
+gastar cuota. La caché y el single-flight aplican igual a los dos.
+
+Con RAPIDAPI_CIRCUIT_FAILURES fallas seguidas (5xx, 429, timeouts) el circuito se abre
+y las búsquedas fallan de inmediato con CircuitOpenError durante RAPIDAPI_CIRCUIT_RESET
+segundos (core/circuit.py). retry_after_for() dice si un error significa que la
+búsqueda no está disponible (y en cuánto reintentar): las rutas responden 503 con
+Retry-After en lugar de un 500.
+"""
+
+import asyncio
+import hashlib
+import math
+import os
+import random
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Protocol, Tuple
+
+from cachetools import TTLCache
+
+if TYPE_CHECKING:
+    import httpx
+
+from core.circuit import CircuitBreaker, CircuitOpenError
+from core.fakes import FakeProviderError, FaultInjector, injector_from_env
+from core.telemetry import traced
+
+RAPIDAPI_HOST = "product-search-api.p.rapidapi.com"
+RAPIDAPI_CACHE_TTL = float(os.getenv("RAPIDAPI_CACHE_TTL", "600"))
+RAPIDAPI_TIMEOUT = float(os.getenv("RAPIDAPI_TIMEOUT", "10"))
+RAPIDAPI_CIRCUIT_FAILURES = int(os.getenv("RAPIDAPI_CIRCUIT_FAILURES", "5"))
+RAPIDAPI_CIRCUIT_RESET = float(os.getenv("RAPIDAPI_CIRCUIT_RESET", "30"))
+
+SearchKey = Tuple[str, int, str]
+
+_client: Optional["httpx.AsyncClient"] = None
+_results: TTLCache = TTLCache(maxsize=1024, ttl=RAPIDAPI_CACHE_TTL)
+_inflight: Dict[SearchKey, "asyncio.Task[List[Dict[str, Any]]]"] = {}
+breaker = CircuitBreaker("rapidapi", RAPIDAPI_CIRCUIT_FAILURES, RAPIDAPI_CIRCUIT_RESET)
+
+
+def get_client() -> "httpx.AsyncClient":
+    """Devuelve el cliente compartido, creándolo la primera vez."""
+    global _client
+    if _client is None or _client.is_closed:
+        # httpx y certifi se cargan aquí y no al importar el módulo (arranque en frío)
+        import ssl
+
+        import certifi
+        import httpx
+
+        ssl_context = ssl.create_default_context(cafile=certifi.where())
+        _client = httpx.AsyncClient(
+            # RAPIDAPI_BASE_URL permite apuntar a un servidor falso en tests
+            base_url=os.getenv("RAPIDAPI_BASE_URL", f"https://{RAPIDAPI_HOST}"),
+            verify=ssl_context,
+            timeout=RAPIDAPI_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=50, max_keepalive_connections=20, keepalive_expiry=30
+            ),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def clear_cache() -> None:
+    _results.clear()
+
+
+class RapidAPINotConfigured(RuntimeError):
+    """Falta RAPIDAPI_KEY: la búsqueda externa no está disponible en este despliegue."""
+
+
+def retry_after_for(error: BaseException) -> Optional[int]:
+    """
+    Segundos para reintentar si `error` significa que la búsqueda externa no está
+    disponible (circuito abierto, sin llave, error HTTP o de red); None si es otro error.
+    """
+    if isinstance(error, CircuitOpenError):
+        seconds = error.retry_after
+    elif isinstance(error, RapidAPINotConfigured):
+        seconds = RAPIDAPI_CIRCUIT_RESET
+    else:
+        # Solo se llega aquí con un error: httpx ya está importado si vino de la API
+        import httpx
+
+        if isinstance(error, httpx.HTTPStatusError):
+            try:
+                seconds = float(error.response.headers.get("Retry-After", RAPIDAPI_CIRCUIT_RESET))
+            except ValueError:
+                seconds = RAPIDAPI_CIRCUIT_RESET
+        elif isinstance(error, httpx.TransportError):
+            seconds = RAPIDAPI_CIRCUIT_RESET
+        else:
+            return None
+    return max(1, math.ceil(seconds))
+
+
+class ProductSearchProvider(Protocol):
+    async def search(self, query: str, page: int, country: str) -> List[Dict[str, Any]]:
+        """Productos crudos (title, link, imageUrl, price) de una página de resultados."""
+        ...
+
+
+class RapidAPIProvider:
+    async def search(self, query: str, page: int, country: str) -> List[Dict[str, Any]]:
+        rapidapi_key = os.environ.get("RAPIDAPI_KEY")
+        if not rapidapi_key:
+            raise RapidAPINotConfigured("RAPIDAPI_KEY not set in environment variables")
+
+        response = await get_client().post(
+            "/shopping",
+            data={"query": query, "page": page, "country": country},
+            headers={
+                "x-rapidapi-key": rapidapi_key,
+                "x-rapidapi-host": RAPIDAPI_HOST,
+            },
+        )
+        response.raise_for_status()
+        return response.json().get("products", [])
+
+
+class FakeProductSearchProvider:
+    """Resultados deterministas por (query, page, country); las fallas salen como HTTPStatusError."""
+
+    def __init__(self, faults: FaultInjector, seed: int = 0, page_size: int = 20):
+        self.faults = faults
+        self.seed = seed
+        self.page_size = page_size
+
+    async def search(self, query: str, page: int, country: str) -> List[Dict[str, Any]]:
+        call = self.faults.next_call(os.environ.get("RAPIDAPI_KEY", ""))
+        await asyncio.sleep(call.delay)
+        if call.error:
+            raise _http_error(call.error)
+        digest = hashlib.sha256(f"{self.seed}:{query}:{page}:{country}".encode()).digest()
+        rng = random.Random(int.from_bytes(digest[:8], "big"))
+        title = query.strip().title()
+        return [
+            {
+                "title": f"{title} modelo {rng.randint(100, 999)}",
+                "link": f"https://fake.example/p/{rng.randint(1, 10**6)}",
+                "imageUrl": f"https://fake.example/img/{rng.randint(1, 10**6)}.jpg",
+                "price": f"${rng.uniform(500, 150000):,.2f}",
+            }
+            for _ in range(self.page_size)
+        ]
+
+
+def _http_error(error: FakeProviderError) -> "httpx.HTTPStatusError":
+    # Lo mismo que levantaría raise_for_status() con la API real
+    import httpx
+
+    request = httpx.Request("POST", f"https://{RAPIDAPI_HOST}/shopping")
+    headers = {"Retry-After": "60"} if error.status_code == 429 else None
+    response = httpx.Response(error.status_code, request=request, headers=headers)
+    return httpx.HTTPStatusError(str(error), request=request, response=response)
+
+
+_provider: Optional[ProductSearchProvider] = None
+
+
+def get_provider() -> ProductSearchProvider:
+    """Proveedor según RAPIDAPI_PROVIDER ("rapidapi" o "fake"), creado la primera vez."""
+    global _provider
+    if _provider is None:
+        name = os.getenv("RAPIDAPI_PROVIDER", "rapidapi")
+        if name == "fake":
+            _provider = FakeProductSearchProvider(
+                injector_from_env("RAPIDAPI", default_latency="lognormal:300:1200"),
+                seed=int(os.getenv("FAKE_SEED", "0")),
+            )
+        elif name == "rapidapi":
+            _provider = RapidAPIProvider()
+        else:
+            raise ValueError(f"RAPIDAPI_PROVIDER desconocido: {name!r}")
+    return _provider
+
+
+def set_provider(provider: Optional[ProductSearchProvider] = None) -> None:
+    """Reemplaza el proveedor (benchmarks, tests); None vuelve a RAPIDAPI_PROVIDER."""
+    global _provider
+    _provider = provider
+
+
+def _counts_as_outage(error: BaseException) -> bool:
+    # Un 4xx (salvo 429) es un problema de la petición, no de la API
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status is None or status == 429 or status >= 500
+
+
+@traced("rapidapi.shopping", kind="rapidapi")
+async def _post_shopping(query: str, page: int, country: str) -> List[Dict[str, Any]]:
+    breaker.before_call()
+    try:
+        products = await get_provider().search(query, page, country)
+    except asyncio.CancelledError:
+        breaker.record_cancelled()
+        raise
+    except Exception as e:
+        if _counts_as_outage(e):
+            breaker.record_failure(e)
+        else:
+            breaker.record_success()
+        raise
+    breaker.record_success()
+    return products
+
+
+async def fetch_products(
+    query: str, page: int = 1, country: str = "mx"
+) -> List[Dict[str, Any]]:
+    """Productos crudos de la API (lista de dicts), con caché y single-flight."""
+    key: SearchKey = (query.strip().lower(), page, country.lower())
+    if key in _results:
+        return _results[key]
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_post_shopping(query, page, country))
+        _inflight[key] = task
+
+        def _done(t: "asyncio.Task[List[Dict[str, Any]]]") -> None:
+            _inflight.pop(key, None)
+            if not t.cancelled() and t.exception() is None:
+                _results[key] = t.result()
+
+        task.add_done_callback(_done)
+
+    # shield: si quien disparó la petición se cancela, los demás siguen esperándola
+    return await asyncio.shield(task)
@@ -0,0 +1,220 @@
+"""
+Índice invertido en memoria para búsqueda local de productos.
+
+- Normalización: minúsculas, sin acentos (panel/panél, eléctrico/electrico).
+- Stemming ligero para español: plurales y sufijos comunes (paneles -> panel,
+  eléctricos/eléctrica -> electric).
+- Ranking BM25 sobre nombre + categoría.
+
+Los documentos se identifican con una llave (origen, id): ("item", 12) para filas de la
+tabla items y ("catalog", 3) para productList.json. upsert/remove actualizan el índice
+en sitio, sin reconstruirlo.
+
+El índice es por proceso: ensure_loaded() compara la versión de items con la que se
+cargó (catalog/items_version.py) y lo reconstruye si otro worker escribió en la tabla.
+Las escrituras de este worker pasan su nueva versión a upsert_item/remove_item para no
+reconstruir por un cambio que ya se aplicó en sitio.
+"""
+
+import asyncio
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from models.gemini import ProductData
+from models.item import Item
+
+from .items_version import get_items_version
+from .product_catalog import load_product_catalog
+
+STOPWORDS = frozenset(
+    """
+    a al con de del el en la las lo los o para por sin su sus un una unos unas y
+    e u que se es mi me tu the and of for with
+    """.split()
+)
+
+# Sufijos derivativos (raíz mínima de 4 letras); orden importa: largos primero
+DERIVATIONAL_SUFFIXES = (
+    "amientos", "imientos", "amiento", "imiento", "aciones", "iciones", "uciones",
+    "acion", "icion", "ucion", "mente", "idades", "idad", "ables", "ibles", "able",
+    "ible", "istas", "ista",
+)
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+DocKey = Tuple[str, Hashable]
+
+
+def fold_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def stem(token: str) -> str:
+    """Stemmer ligero: quita un sufijo (o el plural) y la vocal final de género."""
+    if token.isdigit() or len(token) <= 3:
+        return token
+    for suffix in DERIVATIONAL_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+            token = token[: -len(suffix)]
+            break
+    else:
+        if token.endswith("ces"):  # luces -> luz
+            token = token[:-3] + "z"
+        elif token.endswith("es") and len(token) > 4 and token[-3] not in "aeiou":
+            token = token[:-2]  # paneles -> panel, estaciones -> estacion
+        elif token.endswith("s"):
+            token = token[:-1]
+    if len(token) > 4 and token[-1] in "aeo":
+        token = token[:-1]
+    return token
+
+
+def analyze(text: str) -> List[str]:
+    return [
+        stem(t) for t in TOKEN_RE.findall(fold_accents(text)) if t not in STOPWORDS
+    ]
+
+
+class ProductSearchIndex:
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._load_lock = asyncio.Lock()
+        self._clear()
+
+    def _clear(self) -> None:
+        self._docs: Dict[DocKey, ProductData] = {}
+        self._doc_terms: Dict[DocKey, Dict[str, int]] = {}
+        self._doc_lengths: Dict[DocKey, int] = {}
+        self._postings: Dict[str, Dict[DocKey, int]] = defaultdict(dict)
+        self._total_length = 0
+        self.loaded = False
+        # Versión de items con la que se cargó (None: sin base, p. ej. load() en tests)
+        self.version: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def upsert(self, key: DocKey, product: ProductData) -> None:
+        self.remove(key)
+        terms: Dict[str, int] = defaultdict(int)
+        for term in analyze(f"{product.nombre} {product.categoria}"):
+            terms[term] += 1
+        self._docs[key] = product
+        self._doc_terms[key] = dict(terms)
+        for term, tf in terms.items():
+            self._postings[term][key] = tf
+        self._doc_lengths[key] = sum(terms.values())
+        self._total_length += self._doc_lengths[key]
+
+    def remove(self, key: DocKey) -> None:
+        terms = self._doc_terms.pop(key, None)
+        if terms is None:
+            return
+        del self._docs[key]
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(key)
+
+    def upsert_item(self, item: Item, version: Optional[int] = None) -> None:
+        self.upsert(("item", item.id), item_to_product(item))
+        self._advance(version)
+
+    def remove_item(self, item_id: int, version: Optional[int] = None) -> None:
+        self.remove(("item", item_id))
+        self._advance(version)
+
+    def _advance(self, version: Optional[int]) -> None:
+        """
+        Tras una escritura propia que dejó items en `version`: si el índice estaba justo
+        en la anterior, ya refleja ese cambio y sigue vigente; si no, se perdió escrituras
+        de otro worker y el siguiente ensure_loaded() lo reconstruye.
+        """
+        if version is not None and self.version == version - 1:
+            self.version = version
+
+    def has_matches(self, query: str) -> bool:
+        """Si algún producto comparte un término con la consulta (sin calcular scores)."""
+        return any(term in self._postings for term in analyze(query))
+
+    def search(
+        self, query: str, limit: int = 20, offset: int = 0
+    ) -> List[Tuple[float, ProductData]]:
+        """Productos ordenados por score BM25 (solo los que comparten algún término)."""
+        n_docs = len(self._docs)
+        if n_docs == 0:
+            return []
+        avg_length = self._total_length / n_docs
+        scores: Dict[DocKey, float] = defaultdict(float)
+        for term in set(analyze(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, tf in postings.items():
+                norm = self.k1 * (
+                    1 - self.b + self.b * self._doc_lengths[key] / avg_length
+                )
+                scores[key] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        return [(score, self._docs[key]) for key, score in ranked[offset : offset + limit]]
+
+    def load(
+        self, catalog: Iterable[ProductData], items: Iterable[Item], version: Optional[int] = None
+    ) -> None:
+        self.version = version
+        for i, product in enumerate(catalog):
+            self.upsert(("catalog", i), product)
+        for item in items:
+            self.upsert_item(item)
+        self.loaded = True
+
+    def _current(self, version: int) -> bool:
+        return self.loaded and self.version == version
+
+    async def ensure_loaded(self, session: AsyncSession) -> None:
+        """
+        Carga el catálogo JSON y la tabla items la primera vez que se necesita, y los
+        vuelve a cargar si la versión de items cambió desde entonces.
+        """
+        if self.loaded and self.version is None:
+            return  # cargado con load() sin versión: no se compara con la base
+        version = await get_items_version(session)
+        if self._current(version):
+            return
+        async with self._load_lock:
+            if self._current(version):
+                return
+            result = await session.execute(select(Item))
+            self._clear()
+            self.load(load_product_catalog(), result.scalars().all(), version)
+
+
+def item_to_product(item: Item) -> ProductData:
+    return ProductData(
+        nombre=item.nombre,
+        link=item.link or "",
+        img_link=item.img_link or "",
+        precio=item.precio,
+        categoria=item.categoria or "",
+    )
+
+
+# Índice compartido por el proceso; las rutas de items lo mantienen al día
+product_index = ProductSearchIndex()
+
+
+def search_local(
+    query: str, limit: int = 20, offset: int = 0, index: Optional[ProductSearchIndex] = None
+) -> List[ProductData]:
+    return [p for _, p in (index or product_index).search(query, limit, offset)]
@@ -1,19 +1,33 @@
-from dotenv import load_dotenv
+import core.env  # noqa: F401  (primero: carga .env)
+from contextlib import asynccontextmanager
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-import os, ssl
+import asyncio, logging, os, ssl, time
+
+from core.telemetry import instrument_engine
 
-load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Opcional: réplica de solo lectura para los listados pesados
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
 
 if not DATABASE_URL:
     raise ValueError("Missing DATABASE_URL in .env")
 
+logger = logging.getLogger(__name__)
+
+
 # asyncpg
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+asyncpg://", 1)
-elif DATABASE_URL.startswith("postgresql://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+def to_asyncpg_url(url: str) -> str:
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    elif url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+
+DATABASE_URL = to_asyncpg_url(DATABASE_URL)
+if DATABASE_REPLICA_URL:
+    DATABASE_REPLICA_URL = to_asyncpg_url(DATABASE_REPLICA_URL)
 
 # WARNING: Disables SSL verification (for development only)
 ssl_context = ssl.create_default_context()
@@ -22,15 +36,88 @@ ssl_context.verify_mode = ssl.CERT_NONE
 
 engine = create_async_engine(
     DATABASE_URL,
-    echo=True,
+    # Cada sentencia al log solo para depurar; los tiempos van en spans (core.telemetry)
+    echo=os.getenv("SQL_ECHO") == "1",
     connect_args={"ssl": ssl_context},
 )
+instrument_engine(engine)
 
 AsyncSessionLocal = sessionmaker(
     bind=engine, expire_on_commit=False, class_=AsyncSession
 )
 
+# Réplica: si no responde se usa la primaria y se reintenta tras REPLICA_RETRY_SECONDS
+REPLICA_CONNECT_TIMEOUT = float(os.getenv("REPLICA_CONNECT_TIMEOUT", "2"))
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+
+replica_engine = (
+    create_async_engine(
+        DATABASE_REPLICA_URL,
+        pool_pre_ping=True,
+        connect_args={"ssl": ssl_context, "timeout": REPLICA_CONNECT_TIMEOUT},
+    )
+    if DATABASE_REPLICA_URL
+    else None
+)
+
+if replica_engine is not None:
+    instrument_engine(replica_engine)
+
+ReplicaSessionLocal = (
+    sessionmaker(bind=replica_engine, expire_on_commit=False, class_=AsyncSession)
+    if replica_engine is not None
+    else None
+)
+
+_replica_down_until = 0.0
+
 
 async def get_session():
     async with AsyncSessionLocal() as session:
         yield session
+
+
+async def _open_replica_session():
+    """Abre una sesión en la réplica, o None si no hay réplica o no está disponible."""
+    global _replica_down_until
+    if ReplicaSessionLocal is None or time.monotonic() < _replica_down_until:
+        return None
+    session = ReplicaSessionLocal()
+    try:
+        await asyncio.wait_for(session.connection(), REPLICA_CONNECT_TIMEOUT)
+    except Exception as e:
+        logger.warning("Réplica no disponible, usando la primaria: %s", e)
+        _replica_down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+        await session.close()
+        return None
+    return session
+
+
+@asynccontextmanager
+async def open_read_session():
+    """Sesión de lectura (réplica si responde, si no la primaria) que se cierra al salir."""
+    session = await _open_replica_session()
+    if session is None:
+        session = AsyncSessionLocal()
+    async with session:
+        yield session
+
+
+async def get_read_session():
+    """
+    Sesión para endpoints de solo lectura (listados pesados).
+    Usa DATABASE_REPLICA_URL si está configurada y responde; si no, la primaria.
+    No usar en flujos que leen lo que acaban de escribir (pagos, login, PATCH):
+    la réplica puede ir atrasada.
+    """
+    async with open_read_session() as session:
+        yield session
+
+
+def get_read_session_factory():
+    """
+    Fábrica de sesiones de lectura, para tareas en segundo plano que necesitan su
+    propia sesión: una tarea cancelada a mitad de una consulta cierra la suya sin dejar
+    a medias la de la petición.
+    """
+    return open_read_session
@@ -0,0 +1,13 @@
+"""
+Configuración común de pytest: cuenta las consultas SQL de cada petición y falla los
+tests que pasan el presupuesto de su ruta o hacen N+1 (core/querycount.py).
+"""
+
+import os
+
+# Antes de que los tests importen main: instala QueryCountMiddleware
+os.environ.setdefault("QUERY_COUNT_ENABLED", "1")
+# core.auth exige AUTH_SECRET al importarse
+os.environ.setdefault("AUTH_SECRET", "test-secret")
+
+pytest_plugins = ["core.pytest_querycount", "pytester"]
@@ -0,0 +1,140 @@
+"""
+Tokens firmados (HMAC-SHA256) para clientes y admins, y la dependencia de FastAPI que
+resuelve qué cliente hace la petición.
+
+Token: "<payload>.<firma>", ambos en base64url; el payload es JSON con
+{"sub": id, "role": "cliente" | "admin", "exp": epoch}. No hay estado en el servidor:
+cualquier worker con el mismo AUTH_SECRET valida el token sin tocar la base, por eso
+AUTH_SECRET es obligatorio (como DATABASE_URL).
+
+Alcance: hoy solo /clientes/me exige el token (get_current_cliente) y el rate limiting
+lo usa para identificar al cliente. Las rutas que reciben un cliente_id (transacciones,
+créditos, Gemini) y las de admin todavía confían en el id que les llega: el frontend
+aún no manda el token.
+
+El principal (ClienteRead / AdminRead) se guarda en una caché LRU con TTL por
+(rol, id), así una petición autenticada no hace un SELECT por el usuario. Las
+escrituras que cambian esos datos llaman a invalidate_principal(); el TTL acota lo que
+puede quedar atrasado otro worker que no vio la escritura.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from cachetools import TTLCache
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import get_session
+from models.cliente import Cliente, ClienteRead
+
+logger = logging.getLogger(__name__)
+
+ROLE_CLIENTE = "cliente"
+ROLE_ADMIN = "admin"
+
+AUTH_TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL", str(12 * 3600)))
+PRINCIPAL_CACHE_TTL = float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "300"))
+
+_secret = os.getenv("AUTH_SECRET", "").encode()
+if not _secret:
+    # Un secreto aleatorio por proceso haría que un token de un worker falle en los demás
+    raise ValueError("Missing AUTH_SECRET in .env")
+
+_principals: TTLCache = TTLCache(maxsize=4096, ttl=PRINCIPAL_CACHE_TTL)
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    # utf-8: un header con caracteres no ASCII debe dar firma inválida, no un 500
+    return _b64encode(hmac.new(_secret, payload.encode("utf-8"), hashlib.sha256).digest())
+
+
+def issue_token(subject_id: int, role: str, ttl: Optional[int] = None) -> str:
+    claims = {"sub": subject_id, "role": role, "exp": int(time.time()) + (ttl or AUTH_TOKEN_TTL)}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def decode_token(token: str) -> Dict[str, Any]:
+    """Claims del token; InvalidToken si la firma no cuadra, está mal formado o expiró."""
+    payload, _, signature = token.partition(".")
+    expected = _sign(payload).encode("ascii")
+    if not signature or not hmac.compare_digest(signature.encode("utf-8"), expected):
+        raise InvalidToken("firma inválida")
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError as exc:
+        raise InvalidToken("payload inválido") from exc
+    if not isinstance(claims, dict):
+        raise InvalidToken("payload inválido")
+    if claims.get("exp", 0) < time.time():
+        raise InvalidToken("token expirado")
+    return claims
+
+
+def invalidate_principal(role: str, subject_id: int) -> None:
+    _principals.pop((role, subject_id), None)
+
+
+def clear_principal_cache() -> None:
+    _principals.clear()
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"}
+    )
+
+
+def _claims_for(credentials: Optional[HTTPAuthorizationCredentials], role: str) -> int:
+    if credentials is None:
+        raise _unauthorized("No autenticado")
+    try:
+        claims = decode_token(credentials.credentials)
+    except InvalidToken as exc:
+        raise _unauthorized(f"Token inválido: {exc}")
+    if claims.get("role") != role:
+        raise HTTPException(status_code=403, detail="Sin permisos para este recurso")
+    return claims["sub"]
+
+
+async def _principal(
+    key: Tuple[str, Hashable], session: AsyncSession, model, read_model
+):
+    principal = _principals.get(key)
+    if principal is None:
+        db_obj = await session.get(model, key[1])
+        if db_obj is None:
+            # Token válido de un usuario ya eliminado
+            raise _unauthorized("Usuario no encontrado")
+        principal = _principals[key] = read_model.model_validate(db_obj)
+    return principal
+
+
+async def get_current_cliente(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer),
+    session: AsyncSession = Depends(get_session),
+) -> ClienteRead:
+    cliente_id = _claims_for(credentials, ROLE_CLIENTE)
+    return await _principal((ROLE_CLIENTE, cliente_id), session, Cliente, ClienteRead)
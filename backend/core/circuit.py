@@ -0,0 +1,82 @@
+"""
+Circuit breaker para dependencias externas (hoy: la búsqueda de RapidAPI).
+
+Tras `failure_threshold` fallas seguidas el circuito se abre y las llamadas fallan de
+inmediato con CircuitOpenError durante `reset_timeout` segundos, en lugar de esperar
+el timeout de una API caída o seguir gastando cuota con 429. Pasado ese tiempo queda
+medio abierto: una sola llamada de prueba pasa; si sale bien se cierra, si falla se
+vuelve a abrir.
+
+El estado (closed / open / half_open) se reporta en /health, con el tipo de la última
+excepción pero sin su mensaje: /health es público y el mensaje puede traer URLs o
+detalles de la API.
+"""
+
+import threading
+import time
+from typing import Optional
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """El circuito está abierto: la llamada no se intentó."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name}: circuito abierto, reintentar en {retry_after:.0f} s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self.last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return CLOSED
+        if self._clock() - self._opened_at < self.reset_timeout:
+            return OPEN
+        return HALF_OPEN
+
+    def before_call(self) -> None:
+        """Levanta CircuitOpenError si la llamada no debe intentarse."""
+        with self._lock:
+            state = self.state
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            retry_after = max(self.reset_timeout - (self._clock() - self._opened_at), 0.0)
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self, error: BaseException) -> None:
+        with self._lock:
+            self._failures += 1
+            self.last_error = type(error).__name__
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+            self._probing = False
+
+    def record_cancelled(self) -> None:
+        """La llamada se canceló sin resultado: libera la prueba del estado medio abierto."""
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self._failures, "last_error": self.last_error}
@@ -0,0 +1,11 @@
+"""
+Carga de .env, una sola vez y antes que todo lo demás.
+
+Varios módulos leen variables al importarse (AUTH_SECRET, TELEMETRY_SAMPLE_RATE,
+RAPIDAPI_CACHE_TTL, ...), así que main.py y config.py importan este módulo primero.
+Las variables ya definidas en el entorno no se sobrescriben.
+"""
+
+from dotenv import load_dotenv
+
+load_dotenv()
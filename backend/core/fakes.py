@@ -0,0 +1,122 @@
+"""
+Piezas comunes de los proveedores falsos (Gemini, búsqueda de productos) para pruebas
+de carga y latencia sin gastar cuota de las APIs reales.
+
+- LatencyDistribution: latencia por llamada a partir de una especificación de texto
+  ("fixed:300", "uniform:100:500", "lognormal:800:3000" = p50 y p99 en ms).
+- FaultInjector: errores aleatorios con probabilidad `error_rate` y cuota por llave
+  (`rpm` llamadas por minuto, ventana deslizante); pasada la cuota responde 429.
+
+injector_from_env("GEMINI", ...) lee FAKE_GEMINI_LATENCY, FAKE_GEMINI_ERROR_RATE,
+FAKE_GEMINI_RPM y FAKE_SEED (igual con otros prefijos).
+
+Todo sale de un random.Random con semilla: misma semilla y mismo orden de llamadas,
+mismas latencias y fallas.
+"""
+
+import math
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+
+# z de la normal estándar en el percentil 99
+_Z99 = 2.326
+
+
+class FakeProviderError(Exception):
+    """Falla simulada del proveedor (equivale a un 5xx)."""
+
+    status_code = 500
+
+
+class FakeRateLimited(FakeProviderError):
+    """Cuota simulada agotada (429)."""
+
+    status_code = 429
+
+
+@dataclass(frozen=True)
+class LatencyDistribution:
+    kind: str
+    a: float = 0.0
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        """"fixed:MS", "uniform:MIN:MAX" o "lognormal:P50:P99" (milisegundos)."""
+        kind, *values = spec.strip().split(":")
+        try:
+            numbers = [float(v) for v in values]
+        except ValueError:
+            raise ValueError(f"Latencia inválida: {spec!r}") from None
+        arity = {"fixed": 1, "uniform": 2, "lognormal": 2}.get(kind)
+        if arity is None or len(numbers) != arity or any(n < 0 for n in numbers):
+            raise ValueError(f"Latencia inválida: {spec!r}")
+        if kind == "lognormal" and not 0 < numbers[0] <= numbers[1]:
+            raise ValueError(f"Latencia inválida: {spec!r} (se espera 0 < p50 <= p99)")
+        return cls(kind, *numbers)
+
+    def sample(self, rng: random.Random) -> float:
+        """Segundos."""
+        if self.kind == "fixed":
+            ms = self.a
+        elif self.kind == "uniform":
+            ms = rng.uniform(self.a, self.b)
+        else:
+            sigma = math.log(self.b / self.a) / _Z99
+            ms = rng.lognormvariate(math.log(self.a), sigma)
+        return ms / 1000
+
+
+@dataclass(frozen=True)
+class FakeCall:
+    delay: float
+    error: Optional[FakeProviderError] = None
+
+
+class FaultInjector:
+    def __init__(
+        self,
+        latency: LatencyDistribution,
+        error_rate: float = 0.0,
+        rpm: int = 0,
+        seed: int = 0,
+        clock=time.monotonic,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self._rng = random.Random(seed)
+        self._calls: Dict[str, Deque[float]] = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._clock = clock
+
+    def next_call(self, key: str = "") -> FakeCall:
+        """Decide latencia y resultado de la siguiente llamada con esa llave."""
+        with self._lock:
+            delay = self.latency.sample(self._rng)
+            failed = self._rng.random() < self.error_rate
+            if self.rpm:
+                now = self._clock()
+                window = self._calls[key]
+                while window and window[0] <= now - 60:
+                    window.popleft()
+                if len(window) >= self.rpm:
+                    # Una API con cuota agotada responde rápido
+                    error = FakeRateLimited("429 Resource has been exhausted (fake quota)")
+                    return FakeCall(min(delay, 0.05), error)
+                window.append(now)
+        return FakeCall(delay, FakeProviderError("500 Internal error (fake)") if failed else None)
+
+
+def injector_from_env(prefix: str, default_latency: str) -> FaultInjector:
+    return FaultInjector(
+        LatencyDistribution.parse(os.getenv(f"FAKE_{prefix}_LATENCY", default_latency)),
+        error_rate=float(os.getenv(f"FAKE_{prefix}_ERROR_RATE", "0")),
+        rpm=int(os.getenv(f"FAKE_{prefix}_RPM", "0")),
+        seed=int(os.getenv("FAKE_SEED", "0")),
+    )
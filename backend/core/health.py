@@ -0,0 +1,174 @@
+"""
+Estado de las dependencias para /health y /health/ready.
+
+Cada chequeo devuelve un dict con "status" ("ok", "degraded" o "down") y su detalle:
+
+- database: SELECT 1 con timeout (HEALTH_DB_TIMEOUT) y estadísticas del pool.
+- database_replica: igual, si hay DATABASE_REPLICA_URL.
+- gemini: estado de cada llave (gemini/keyHealth.py); "down" si ninguna está usable.
+- rapidapi: estado del circuit breaker de la búsqueda (core/circuit.py).
+
+El resultado se guarda HEALTH_CACHE_SECONDS segundos y las consultas concurrentes
+comparten una sola ronda de chequeos: un balanceador que consulta /health cada
+segundo desde varios nodos hace como mucho una consulta a la base cada
+HEALTH_CACHE_SECONDS por worker.
+
+Solo los chequeos requeridos (la base primaria) y el calentamiento (core/warmup.py)
+deciden la readiness. Mientras el calentamiento está pendiente o corriendo el worker no
+está listo; si terminó en FAILED (y sigue reintentando) decide el chequeo en vivo, así
+un worker cuya base se recuperó vuelve al balanceador. Gemini, RapidAPI y la réplica
+solo degradan el estado: el worker sigue sirviendo el resto de la API sin ellos.
+
+Los errores se reportan solo por tipo de excepción ("ConnectionRefusedError",
+"timeout"): /health es público y los mensajes pueden traer hosts o credenciales.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, Optional
+
+from core.warmup import PENDING, RUNNING
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "5"))
+HEALTH_DB_TIMEOUT = float(os.getenv("HEALTH_DB_TIMEOUT", "2"))
+
+OK, DEGRADED, DOWN = "ok", "degraded", "down"
+
+
+@dataclass(frozen=True)
+class HealthProbe:
+    name: str
+    run: Callable[[], Awaitable[dict]]
+    required: bool = False
+
+
+class HealthCheck:
+    def __init__(
+        self,
+        probes: Iterable[HealthProbe],
+        warmup=None,
+        ttl: float = HEALTH_CACHE_SECONDS,
+        timeout: float = HEALTH_DB_TIMEOUT,
+        clock=time.monotonic,
+    ):
+        self.probes = list(probes)
+        self.warmup = warmup
+        self.ttl = ttl
+        self.timeout = timeout
+        self._clock = clock
+        self._cached: Optional[dict] = None
+        self._expires = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _probe(self, probe: HealthProbe) -> dict:
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(probe.run(), self.timeout)
+        except Exception as e:
+            # El mensaje completo va al log, no a la respuesta
+            logger.warning("health: %s falló: %r", probe.name, e)
+            error = "timeout" if isinstance(e, asyncio.TimeoutError) else type(e).__name__
+            result = {"status": DOWN, "error": error}
+        result.setdefault("latency_ms", round((time.perf_counter() - start) * 1000, 1))
+        return result
+
+    async def _run(self) -> dict:
+        results = await asyncio.gather(*(self._probe(p) for p in self.probes))
+        checks = {p.name: r for p, r in zip(self.probes, results)}
+        required_down = any(p.required and checks[p.name]["status"] == DOWN for p in self.probes)
+        warming = self.warmup is not None and self.warmup.status in (PENDING, RUNNING)
+        if required_down or warming:
+            status = DOWN
+        elif any(r["status"] != OK for r in checks.values()):
+            status = DEGRADED
+        else:
+            status = OK
+        report = {"status": status, "checks": checks}
+        if self.warmup is not None:
+            report["warmup"] = self.warmup.snapshot()
+        return report
+
+    def _fresh(self) -> bool:
+        if self._cached is None or self._clock() >= self._expires:
+            return False
+        # Al terminar el calentamiento el worker pasa a listo sin esperar al TTL
+        return self.warmup is None or self._cached["warmup"]["status"] == self.warmup.status
+
+    async def report(self) -> dict:
+        """Último resultado si tiene menos de `ttl` segundos; si no, corre los chequeos."""
+        if self._fresh():
+            return self._cached
+        async with self._lock:
+            # Quien esperaba el lock usa el resultado que acaba de calcular el otro
+            if not self._fresh():
+                self._cached = await self._run()
+                self._expires = self._clock() + self.ttl
+            return self._cached
+
+
+# --- Chequeos --------------------------------------------------------------------------
+
+
+def pool_stats(engine) -> dict:
+    pool = engine.pool
+    stats = {}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    return stats
+
+
+async def check_database(engine) -> dict:
+    from sqlalchemy import text
+
+    start = time.perf_counter()
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    return {
+        "status": OK,
+        "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+        "pool": pool_stats(engine),
+    }
+
+
+async def check_gemini_keys() -> dict:
+    from gemini.keyHealth import key_health
+    from routers.gemini import gemini_api_keys
+
+    keys = key_health.snapshot(gemini_api_keys())
+    usable = [k for k in keys if k["status"] in ("ok", "unused")]
+    if not usable:
+        status = DOWN
+    elif len(usable) < len(keys):
+        status = DEGRADED
+    else:
+        status = OK
+    return {"status": status, "keys": keys}
+
+
+async def check_rapidapi() -> dict:
+    from catalog.rapidapi import breaker
+    from core.circuit import CLOSED, HALF_OPEN
+
+    circuit = breaker.snapshot()
+    status = {CLOSED: OK, HALF_OPEN: DEGRADED}.get(circuit["state"], DOWN)
+    return {"status": status, "circuit": circuit}
+
+
+def default_probes() -> list:
+    import config
+
+    probes = [
+        HealthProbe("database", lambda: check_database(config.engine), required=True),
+        HealthProbe("gemini", check_gemini_keys),
+        HealthProbe("rapidapi", check_rapidapi),
+    ]
+    if config.replica_engine is not None:
+        probes.append(HealthProbe("database_replica", lambda: check_database(config.replica_engine)))
+    return probes
@@ -0,0 +1,66 @@
+"""
+Caché HTTP en proceso para endpoints de lectura frecuente (catálogo y búsquedas).
+
+Cada respuesta cacheada guarda el cuerpo JSON ya serializado y su ETag. Si el cliente
+manda If-None-Match con el mismo ETag se responde 304 sin tocar la base ni la API
+externa. Las escrituras llaman a invalidate() para que la siguiente lectura se regenere.
+
+La caché es por proceso y invalidate() solo limpia la del worker que escribió. Donde
+los datos viven en la base (items), la llave incluye la versión compartida de la tabla
+(catalog/items_version.py), así otro worker nunca sirve una entrada de antes de la
+escritura. Donde no (la API externa), el TTL acota cuánto puede quedar atrasada.
+"""
+
+import hashlib
+import json
+from typing import Any, Hashable, Optional
+
+from cachetools import TTLCache
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+
+class ResponseCache:
+    def __init__(self, cache_control: str, ttl: float = 60, maxsize: int = 1024):
+        self.cache_control = cache_control
+        self._entries: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def lookup(self, request: Request, key: Hashable) -> Optional[Response]:
+        """Devuelve la respuesta cacheada (200 o 304), o None si no hay entrada."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return self._respond(request, *entry)
+
+    def store(self, request: Request, key: Hashable, payload: Any) -> Response:
+        """Serializa el payload, lo guarda bajo `key` y responde (200 o 304)."""
+        body = json.dumps(jsonable_encoder(payload), ensure_ascii=False).encode("utf-8")
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self._entries[key] = (body, etag)
+        return self._respond(request, body, etag)
+
+    def invalidate(self) -> None:
+        self._entries.clear()
+
+    def _respond(self, request: Request, body: bytes, etag: str) -> Response:
+        headers = {"ETag": etag, "Cache-Control": self.cache_control}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    # Comparación débil (RFC 9110): W/"x" equivale a "x"
+    return "*" in candidates or etag in [c.removeprefix("W/") for c in candidates]
+
+
+# Items: el cliente siempre revalida (no-cache) y la llave lleva la versión de la tabla,
+# así un cambio se ve de inmediato en cualquier worker y una lectura sin cambios cuesta
+# un 304 (más la consulta de la versión).
+items_cache = ResponseCache(cache_control="no-cache", ttl=300)
+
+# Búsquedas en la API externa: los resultados cambian poco, se pueden reusar 5 min.
+productos_cache = ResponseCache(cache_control="public, max-age=300", ttl=300)
@@ -0,0 +1,99 @@
+"""
+Hash y verificación de contraseñas (clientes y admins).
+
+Formato guardado en la columna pwd: "scrypt$<n>$<r>$<p>$<salt b64>$<hash b64>".
+
+scrypt es costoso a propósito (~50 ms y 16 MB por intento con los parámetros por
+defecto), así que nunca corre en el event loop: se manda a un pool de hilos propio
+(hashlib.scrypt suelta el GIL) con PASSWORD_HASH_WORKERS hilos como máximo. Los
+intentos que no caben esperan en la cola del pool sin bloquear el resto de la API.
+
+Las filas anteriores guardan la contraseña en texto plano; verify_password las acepta
+(comparación en tiempo constante) e indica needs_rehash para que el login las
+reemplace por el hash en ese mismo momento.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import NamedTuple
+
+SCHEME = "scrypt"
+SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", str(2**14)))
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="pwd-hash")
+
+
+class Verification(NamedTuple):
+    ok: bool
+    needs_rehash: bool
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode("ascii")
+
+
+def _scrypt(pwd: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        pwd.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r, dklen=KEY_BYTES
+    )
+
+
+def is_hashed(stored: str) -> bool:
+    return stored.startswith(SCHEME + "$")
+
+
+def hash_password(pwd: str) -> str:
+    salt = secrets.token_bytes(SALT_BYTES)
+    key = _scrypt(pwd, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"{SCHEME}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(key)}"
+
+
+def verify_password(pwd: str, stored: str) -> Verification:
+    """Compara pwd contra lo guardado; needs_rehash si es texto plano o parámetros viejos."""
+    if not is_hashed(stored):
+        ok = hmac.compare_digest(pwd.encode("utf-8"), stored.encode("utf-8"))
+        return Verification(ok, ok)
+    try:
+        _, n, r, p, salt, key = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+        expected = base64.b64decode(salt), base64.b64decode(key)
+    except ValueError:
+        return Verification(False, False)
+    ok = hmac.compare_digest(_scrypt(pwd, expected[0], n, r, p), expected[1])
+    return Verification(ok, ok and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P))
+
+
+@lru_cache(maxsize=1)
+def _dummy_hash() -> str:
+    # Hash de relleno para que un usuario inexistente cueste lo mismo que uno con
+    # contraseña incorrecta (no se puede distinguir por tiempo de respuesta)
+    return hash_password(secrets.token_urlsafe(16))
+
+
+async def hash_password_async(pwd: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, hash_password, pwd)
+
+
+async def verify_password_async(pwd: str, stored: str) -> Verification:
+    return await asyncio.get_running_loop().run_in_executor(
+        _executor, verify_password, pwd, stored
+    )
+
+
+async def verify_missing_user(pwd: str) -> Verification:
+    """Verificación contra el hash de relleno; siempre falla."""
+    await asyncio.get_running_loop().run_in_executor(
+        _executor, lambda: verify_password(pwd, _dummy_hash())
+    )
+    return Verification(False, False)
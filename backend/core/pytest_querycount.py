@@ -0,0 +1,47 @@
+"""
+Plugin de pytest para core/querycount.py: falla el test si alguna petición que hizo
+pasa su presupuesto de consultas o repite la misma sentencia (N+1).
+
+Presupuestos:
+- los declarados por ruta en main.QUERY_BUDGETS (aplican a todos los tests);
+- @pytest.mark.query_budget(max_queries, route=None) en el test, para todas sus
+  peticiones o solo las de `route` (plantilla, p. ej. "/clientes/{cliente_id}").
+
+@pytest.mark.allow_n_plus_one desactiva el detector de N+1 en un test.
+Se carga desde conftest.py (pytest_plugins).
+"""
+
+import pytest
+
+from core import querycount
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "query_budget(max_queries, route=None): máximo de consultas SQL por petición"
+    )
+    config.addinivalue_line("markers", "allow_n_plus_one: no fallar por sentencias repetidas")
+
+
+def _violations(item, reports):
+    marker = item.get_closest_marker("query_budget")
+    allow_n_plus_one = item.get_closest_marker("allow_n_plus_one") is not None
+    for report in reports:
+        if marker is not None and marker.kwargs.get("route") in (None, report.route):
+            report.budget = marker.args[0] if marker.args else marker.kwargs["max_queries"]
+        if report.over_budget or (report.stats.repeated() and not allow_n_plus_one):
+            yield report.describe()
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    reports = []
+    querycount.add_observer(reports.append)
+    try:
+        result = yield
+    finally:
+        querycount.remove_observer(reports.append)
+    violations = list(_violations(item, reports))
+    if violations:
+        pytest.fail("Consultas SQL por encima de lo esperado:\n" + "\n".join(violations), pytrace=False)
+    return result
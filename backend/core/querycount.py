@@ -0,0 +1,169 @@
+"""
+Conteo de consultas SQL por petición y detector de N+1, para desarrollo y CI.
+
+Los eventos se registran sobre la clase Engine, así que cuentan en cualquier engine
+(primaria, réplica o el SQLite de los tests). Cada petición lleva su QueryStats en un
+contextvar: número de consultas, tiempo total en la base y cuántas veces se repitió
+cada "forma" de sentencia (la SQL con literales, parámetros y listas IN normalizados).
+Una misma forma ejecutada N_PLUS_ONE_THRESHOLD veces o más es el patrón N+1 típico
+(un session.get por fila).
+
+QueryCountMiddleware agrega X-DB-Queries / X-DB-Time-Ms a la respuesta, compara contra
+el presupuesto declarado para la ruta (main.QUERY_BUDGETS) y avisa en el log si se
+pasa o detecta N+1. Los observadores (add_observer) reciben cada RequestQueries; el
+plugin de pytest (core/pytest_querycount.py) los usa para fallar los tests.
+
+Se activa con QUERY_COUNT_ENABLED=1; en producción no se instala.
+"""
+
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+N_PLUS_ONE_THRESHOLD = 3
+
+_CAST_RE = re.compile(r"::\w+(\[\])?")
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAM = r"(?:\?|\$\?|%\(\w+\)s|%s|:\w+)"
+_IN_LIST_RE = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})*\s*\)")
+_WS_RE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """SQL sin valores: dos consultas con la misma forma solo difieren en parámetros."""
+    shape = _LITERAL_RE.sub("?", _CAST_RE.sub("", statement))
+    return _WS_RE.sub(" ", _IN_LIST_RE.sub("(?)", shape)).strip()
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    db_time: float = 0.0
+    shapes: Counter = field(default_factory=Counter)
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+@dataclass
+class RequestQueries:
+    method: str
+    route: str
+    status: int
+    stats: QueryStats
+    budget: Optional[int]
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.stats.count > self.budget
+
+    def describe(self) -> str:
+        lines = [
+            f"{self.method} {self.route} -> {self.status}: {self.stats.count} consultas"
+            f" ({self.stats.db_time * 1000:.1f} ms)"
+            + (f", presupuesto {self.budget}" if self.budget is not None else "")
+        ]
+        lines += [f"  {n}x {shape[:160]}" for shape, n in self.stats.repeated()]
+        return "\n".join(lines)
+
+
+_current: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar(
+    "query_stats", default=None
+)
+_observers: List[Callable[[RequestQueries], None]] = []
+_install_lock = threading.Lock()
+_installed = False
+
+
+def install() -> None:
+    """Registra los eventos en la clase Engine (una sola vez por proceso)."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        @event.listens_for(Engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            if _current.get() is not None:
+                conn.info.setdefault("querycount_started", []).append(time.perf_counter())
+
+        @event.listens_for(Engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            stats = _current.get()
+            started = conn.info.get("querycount_started")
+            if stats is None or not started:
+                return
+            stats.count += 1
+            stats.db_time += time.perf_counter() - started.pop()
+            stats.shapes[statement_shape(statement)] += 1
+
+        _installed = True
+
+
+class track_queries:
+    """Cuenta las consultas del bloque: `with track_queries() as stats: ...`."""
+
+    def __enter__(self) -> QueryStats:
+        install()
+        self.stats = QueryStats()
+        self._token = _current.set(self.stats)
+        return self.stats
+
+    def __exit__(self, *exc) -> None:
+        _current.reset(self._token)
+
+
+def add_observer(observer: Callable[[RequestQueries], None]) -> None:
+    _observers.append(observer)
+
+
+def remove_observer(observer: Callable[[RequestQueries], None]) -> None:
+    if observer in _observers:
+        _observers.remove(observer)
+
+
+class QueryCountMiddleware:
+    """Middleware ASGI; budgets: plantilla de ruta -> máximo de consultas."""
+
+    def __init__(self, app, budgets: Optional[Dict[str, int]] = None):
+        install()
+        self.app = app
+        self.budgets = dict(budgets or {})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = QueryStats()
+        token = _current.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-db-queries", str(stats.count).encode()),
+                    (b"x-db-time-ms", f"{stats.db_time * 1000:.1f}".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None) or scope["path"]
+            report = RequestQueries(scope["method"], route, status, stats, self.budgets.get(route))
+            if report.over_budget or stats.repeated():
+                logger.warning("consultas SQL sospechosas:\n%s", report.describe())
+            for observer in list(_observers):
+                observer(report)
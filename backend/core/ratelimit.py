@@ -0,0 +1,235 @@
+"""
+Rate limiting por token bucket para los endpoints que gastan cuota de Gemini.
+
+Cada regla limita una ruta (método + path exacto) con dos cubetas:
+
+- por cliente: el sujeto del token Bearer si viene uno válido, si no la IP;
+- por ruta: total entre todos los clientes, para que muchos clientes distintos
+  tampoco agoten las llaves de Gemini.
+
+Una cubeta de `capacity` fichas se rellena a `capacity / per_seconds` fichas por
+segundo; cada petición consume una de cada cubeta. Si alguna no tiene ficha se responde
+429 con Retry-After (segundos hasta la siguiente ficha) y se devuelven las fichas ya
+tomadas de las otras: una petición rechazada no gasta cuota de nadie.
+
+Backends:
+- InMemoryBackend: por proceso. Con varios workers cada uno lleva su cuenta.
+- RedisBackend: compartido entre workers (script Lua atómico). Se activa con
+  RATE_LIMIT_REDIS_URL; requiere el paquete `redis`.
+
+Si el backend falla (Redis caído) la petición pasa: el limitador no debe tumbar la API.
+"""
+
+import json
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Protocol, Tuple
+
+from cachetools import TTLCache
+
+from core.auth import InvalidToken, decode_token
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    capacity: int
+    per_seconds: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.per_seconds
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    method: str
+    path: str
+    per_client: Optional[RateLimit] = None
+    per_route: Optional[RateLimit] = None
+
+
+class RateLimitBackend(Protocol):
+    async def acquire(self, key: str, limit: RateLimit) -> Tuple[bool, float]:
+        """Consume una ficha. Devuelve (permitido, segundos hasta la siguiente ficha)."""
+        ...
+
+    async def refund(self, key: str, limit: RateLimit) -> None:
+        """Devuelve una ficha consumida por una petición que al final se rechazó."""
+        ...
+
+
+def _refill(tokens: float, updated: float, now: float, limit: RateLimit) -> float:
+    return min(limit.capacity, tokens + (now - updated) * limit.rate)
+
+
+class InMemoryBackend:
+    def __init__(self, maxsize: int = 100_000, clock=time.monotonic):
+        # Las cubetas inactivas caducan solas; una cubeta llena equivale a no tener entrada
+        self._buckets: TTLCache = TTLCache(maxsize=maxsize, ttl=24 * 3600, timer=clock)
+        self._clock = clock
+
+    async def acquire(self, key: str, limit: RateLimit) -> Tuple[bool, float]:
+        now = self._clock()
+        tokens, updated = self._buckets.get(key, (limit.capacity, now))
+        tokens = _refill(tokens, updated, now, limit)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            return True, 0.0
+        self._buckets[key] = (tokens, now)
+        return False, (1 - tokens) / limit.rate
+
+    async def refund(self, key: str, limit: RateLimit) -> None:
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            tokens, updated = bucket
+            self._buckets[key] = (min(limit.capacity, tokens + 1), updated)
+
+
+_REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(tokens)}
+"""
+
+_REDIS_REFUND = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+if tokens then
+    redis.call('HSET', KEYS[1], 'tokens', math.min(tonumber(ARGV[1]), tokens + 1))
+end
+return 0
+"""
+
+
+class RedisBackend:
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        import redis.asyncio as redis  # dependencia opcional
+
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(_REDIS_TOKEN_BUCKET)
+        self._refund = self._redis.register_script(_REDIS_REFUND)
+        self._prefix = prefix
+
+    async def acquire(self, key: str, limit: RateLimit) -> Tuple[bool, float]:
+        allowed, tokens = await self._script(
+            keys=[self._prefix + key], args=[limit.capacity, limit.rate, time.time()]
+        )
+        if int(allowed):
+            return True, 0.0
+        return False, (1 - float(tokens)) / limit.rate
+
+    async def refund(self, key: str, limit: RateLimit) -> None:
+        await self._refund(keys=[self._prefix + key], args=[limit.capacity])
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def backend_from_env() -> RateLimitBackend:
+    url = os.getenv("RATE_LIMIT_REDIS_URL")
+    if url:
+        return RedisBackend(url)
+    return InMemoryBackend()
+
+
+def _client_key(scope) -> str:
+    """Sujeto del token si es válido; si no, la IP (X-Forwarded-For solo si se confía)."""
+    headers = dict(scope.get("headers") or ())
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    if authorization.lower().startswith("bearer "):
+        try:
+            claims = decode_token(authorization[7:].strip())
+            return f"{claims['role']}:{claims['sub']}"
+        except (InvalidToken, KeyError):
+            pass
+    if os.getenv("RATE_LIMIT_TRUST_FORWARDED") == "1" and b"x-forwarded-for" in headers:
+        return "ip:" + headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    """Middleware ASGI; solo mira las rutas con regla, el resto pasa directo."""
+
+    def __init__(
+        self,
+        app,
+        rules: Iterable[RateLimitRule],
+        backend: Optional[RateLimitBackend] = None,
+    ):
+        self.app = app
+        self.rules: Dict[Tuple[str, str], RateLimitRule] = {
+            (r.method.upper(), r.path.rstrip("/")): r for r in rules
+        }
+        self.backend = backend or backend_from_env()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        rule = self.rules.get((scope["method"], scope["path"].rstrip("/")))
+        if rule is None:
+            return await self.app(scope, receive, send)
+
+        # Primero la del cliente: uno que abusa se rechaza sin gastar la cubeta global
+        checks = []
+        if rule.per_client:
+            checks.append((f"client:{rule.path}:{_client_key(scope)}", rule.per_client))
+        if rule.per_route:
+            checks.append((f"route:{rule.path}", rule.per_route))
+
+        acquired = []
+        for key, limit in checks:
+            try:
+                allowed, retry_after = await self.backend.acquire(key, limit)
+            except Exception:
+                logger.warning("rate limit backend failed; allowing request", exc_info=True)
+                break
+            if not allowed:
+                # Rechazada por la regla de la ruta: la ficha del cliente no se gasta
+                await self._refund(acquired)
+                return await self._reject(send, limit, retry_after)
+            acquired.append((key, limit))
+        await self.app(scope, receive, send)
+
+    async def _refund(self, acquired) -> None:
+        for key, limit in acquired:
+            try:
+                await self.backend.refund(key, limit)
+            except Exception:
+                logger.warning("rate limit refund failed", exc_info=True)
+
+    @staticmethod
+    async def _reject(send, limit: RateLimit, retry_after: float) -> None:
+        body = json.dumps(
+            {"detail": "Demasiadas solicitudes, intenta de nuevo más tarde"},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+                    (b"x-ratelimit-limit", f"{limit.capacity};w={limit.per_seconds:g}".encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,351 @@
+"""
+Trazas por petición y métricas en formato Prometheus, sin dependencias externas.
+
+Spans (al estilo OpenTelemetry): cada petición HTTP abre una traza (trace_id) en un
+contextvar; span() / @traced abren spans hijos con nombre, tipo ("db", "gemini",
+"rapidapi", ...), duración y atributos. asyncio.to_thread copia el contexto, así que
+las llamadas a Gemini en hilos caen en la misma traza. Las consultas SQL se miden con
+eventos del engine (instrument_engine), lo que cubre todo session.execute/get.
+
+Métricas: histogramas y contadores en memoria del proceso, expuestos en /metrics con
+el formato de texto de Prometheus (render_metrics). Cada worker expone los suyos.
+
+Logs: al terminar, la petición se registra como una línea JSON (logger "telemetry")
+con sus spans si cae en la muestra (TELEMETRY_SAMPLE_RATE), si tardó más de
+TELEMETRY_SLOW_MS o si respondió 5xx.
+"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("telemetry")
+
+SAMPLE_RATE = float(os.getenv("TELEMETRY_SAMPLE_RATE", "0.05"))
+SLOW_MS = float(os.getenv("TELEMETRY_SLOW_MS", "1000"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# --- Métricas -----------------------------------------------------------------------
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # bucket counts + [sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for label_values, series in sorted(items):
+            for bound, count in zip(self.buckets, series):
+                le = _format_labels(self.labels, label_values, f'le="{bound:g}"')
+                yield f"{self.name}_bucket{le} {count:g}"
+            inf = _format_labels(self.labels, label_values, 'le="+Inf"')
+            yield f"{self.name}_bucket{inf} {series[-1]:g}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {series[-2]:.6f}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {series[-1]:g}"
+
+
+class CounterSource:
+    """Contador cuyo valor vive en otro módulo (p. ej. un collections.Counter); se lee al exportar."""
+
+    def __init__(self, name: str, help: str, label: str, read: Callable[[], Dict[str, float]]):
+        self.name, self.help, self.label, self.read = name, help, label, read
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in sorted(dict(self.read()).items()):
+            yield f'{self.name}{{{self.label}="{_escape(key)}"}} {value:g}'
+
+
+_registry: Dict[str, object] = {}
+
+
+def register(metric):
+    _registry[metric.name] = metric
+    return metric
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in list(_registry.values()):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+http_request_duration = register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Latencia de las peticiones HTTP por ruta",
+        ("method", "route", "status"),
+    )
+)
+span_duration = register(
+    Histogram(
+        "span_duration_seconds",
+        "Duración de las operaciones instrumentadas (db, gemini, rapidapi, ...)",
+        ("kind", "name"),
+    )
+)
+
+
+# --- Spans --------------------------------------------------------------------------
+
+
+class Span:
+    __slots__ = ("name", "kind", "attrs", "span_id", "parent_id", "start", "end", "status", "trace")
+
+    def __init__(self, name: str, kind: str, parent_id: Optional[str], attrs: dict):
+        self.name, self.kind, self.attrs, self.parent_id = name, kind, attrs, parent_id
+        # Captured at start: the span may finish in another context (generators, events)
+        self.trace: Optional["Trace"] = _current_trace.get()
+        self.span_id = secrets.token_hex(8)
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.status = "ok"
+
+
+class Trace:
+    def __init__(self, name: str):
+        self.trace_id = secrets.token_hex(16)
+        self.name = name
+        self.start = time.perf_counter()
+        self.attrs: dict = {}
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "duration_ms": round((time.perf_counter() - self.start) * 1000, 2),
+            **self.attrs,
+            "spans": [
+                {
+                    "name": s.name,
+                    "kind": s.kind,
+                    "span_id": s.span_id,
+                    "parent_id": s.parent_id,
+                    "start_ms": round((s.start - self.start) * 1000, 2),
+                    "duration_ms": round(((s.end or s.start) - s.start) * 1000, 2),
+                    "status": s.status,
+                    **({"attrs": s.attrs} if s.attrs else {}),
+                }
+                for s in spans
+            ],
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def annotate(**attrs) -> None:
+    """Agrega atributos a la traza de la petición actual (aparecen en el log muestreado)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+
+def _start_span(name: str, kind: str, attrs: dict) -> Span:
+    parent = _current_span.get()
+    return Span(name, kind, parent.span_id if parent else None, attrs)
+
+
+def _finish_span(span: Span) -> None:
+    span.end = time.perf_counter()
+    span_duration.observe(span.end - span.start, span.kind, span.name)
+    if span.trace is not None:
+        span.trace.add(span)
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attrs):
+    current = _start_span(name, kind, attrs)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        current.status = "cancelled" if isinstance(exc, asyncio.CancelledError) else "error"
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish_span(current)
+
+
+def traced(name: str, kind: str = "internal"):
+    """Decorador: un span por llamada. Sirve para funciones normales, async y generadores."""
+
+    def decorator(fn):
+        if inspect.isasyncgenfunction(fn):
+
+            @functools.wraps(fn)
+            async def agen_wrapper(*args, **kwargs):
+                # Generators can be resumed from another context, so the span is recorded
+                # but not made current
+                current = _start_span(name, kind, {})
+                try:
+                    async for item in fn(*args, **kwargs):
+                        yield item
+                except BaseException:
+                    current.status = "error"
+                    raise
+                finally:
+                    _finish_span(current)
+
+            return agen_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, kind):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        if inspect.isgeneratorfunction(fn):
+
+            @functools.wraps(fn)
+            def gen_wrapper(*args, **kwargs):
+                current = _start_span(name, kind, {})
+                try:
+                    yield from fn(*args, **kwargs)
+                except BaseException:
+                    current.status = "error"
+                    raise
+                finally:
+                    _finish_span(current)
+
+            return gen_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# --- Base de datos ------------------------------------------------------------------
+
+
+def instrument_engine(engine) -> None:
+    """Un span "db" por sentencia SQL ejecutada por el engine (async o sync)."""
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+        conn.info.setdefault("telemetry_spans", []).append(
+            _start_span(f"db.{operation.lower()}", "db", {"statement": statement[:200]})
+        )
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("telemetry_spans")
+        if stack:
+            _finish_span(stack.pop())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        stack = conn.info.get("telemetry_spans") if conn is not None else None
+        if stack:
+            failed = stack.pop()
+            failed.status = "error"
+            _finish_span(failed)
+
+
+# --- Middleware ---------------------------------------------------------------------
+
+
+def _should_log(status: int, duration_ms: float) -> bool:
+    return status >= 500 or duration_ms >= SLOW_MS or random.random() < SAMPLE_RATE
+
+
+class TelemetryMiddleware:
+    """Middleware ASGI: abre la traza, mide la ruta y registra el log muestreado."""
+
+    def __init__(self, app, exclude: Iterable[str] = ("/metrics",)):
+        self.app = app
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            return await self.app(scope, receive, send)
+
+        trace = Trace(f'{scope["method"]} {scope["path"]}')
+        token = _current_trace.set(trace)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            duration = time.perf_counter() - trace.start
+            # Plantilla de la ruta ("/clientes/{cliente_id}") para no crear una serie por id
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_request_duration.observe(duration, scope["method"], route, str(status))
+            if _should_log(status, duration * 1000):
+                record = trace.to_dict()
+                record.update(method=scope["method"], route=route, status=status)
+                logger.info(json.dumps(record, ensure_ascii=False, default=str))
@@ -0,0 +1,208 @@
+"""
+Calentamiento del worker al arrancar (lifespan) y estado de readiness.
+
+Las primeras peticiones después de un deploy pagaban el handshake TLS con Postgres,
+la primera lectura de productList.json, el índice de búsqueda y la importación del
+SDK de Gemini. Warmup corre esos pasos en segundo plano al iniciar el worker; mientras
+tanto /health/live responde 200 y /health/ready 503, así el balanceador no le manda
+tráfico hasta que termine.
+
+Cada paso tiene un timeout (WARMUP_TIMEOUT). Los pasos requeridos (base, catálogo)
+deciden la readiness: si uno falla el worker sigue vivo pero no listo, y esos pasos se
+reintentan con backoff exponencial (WARMUP_RETRY_SECONDS, hasta WARMUP_RETRY_MAX_SECONDS)
+hasta que terminen bien; así una base que tarda en levantar no deja al worker fuera
+del balanceador para siempre. Los opcionales
+(clientes de Gemini y RapidAPI) solo se registran: esas APIs ya se reintentan por
+llamada y no deben sacar al worker del balanceador.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "30"))
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+WARMUP_RETRY_MAX_SECONDS = float(os.getenv("WARMUP_RETRY_MAX_SECONDS", "60"))
+
+PENDING, RUNNING, READY, FAILED = "pending", "running", "ready", "failed"
+
+
+@dataclass(frozen=True)
+class WarmupStep:
+    name: str
+    run: Callable[[], Awaitable[None]]
+    required: bool = True
+
+
+class Warmup:
+    def __init__(
+        self,
+        steps: Iterable[WarmupStep],
+        timeout: float = WARMUP_TIMEOUT,
+        retry: float = WARMUP_RETRY_SECONDS,
+        retry_max: float = WARMUP_RETRY_MAX_SECONDS,
+    ):
+        self.steps = list(steps)
+        self.timeout = timeout
+        # 0 desactiva los reintentos: un paso requerido que falla deja el estado en FAILED
+        self.retry = retry
+        self.retry_max = retry_max
+        self.status = PENDING
+        self.results: Dict[str, dict] = {}
+        self.started: Optional[float] = None
+        self.duration_ms: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == READY
+
+    async def _run_step(self, step: WarmupStep) -> None:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(step.run(), self.timeout)
+            result = {"status": "ok"}
+        except Exception as e:
+            # En el snapshot (público en /health) solo el tipo; el mensaje, al log
+            error = "timeout" if isinstance(e, asyncio.TimeoutError) else type(e).__name__
+            result = {"status": "error", "error": error}
+            log = logger.error if step.required else logger.warning
+            log("warmup: %s falló: %r", step.name, e)
+        result["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        result["required"] = step.required
+        previous = self.results.get(step.name)
+        result["attempts"] = previous["attempts"] + 1 if previous else 1
+        self.results[step.name] = result
+
+    def _failed_required(self) -> list:
+        return [
+            step for step in self.steps
+            if step.required and self.results[step.name]["status"] != "ok"
+        ]
+
+    async def run(self) -> None:
+        """
+        Corre todos los pasos en paralelo y después reintenta los requeridos que fallaron,
+        con backoff, hasta que pasen (mientras tanto el estado es FAILED). No levanta
+        excepciones; se cancela al apagar el worker.
+        """
+        self.status = RUNNING
+        self.started = time.perf_counter()
+        await asyncio.gather(*(self._run_step(step) for step in self.steps))
+        failed = self._failed_required()
+        delay = self.retry
+        while failed:
+            self.status = FAILED
+            self.duration_ms = round((time.perf_counter() - self.started) * 1000, 1)
+            if self.retry <= 0:
+                break
+            logger.warning(
+                "warmup: reintentando %s en %.0f s", [step.name for step in failed], delay
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.retry_max)
+            await asyncio.gather(*(self._run_step(step) for step in failed))
+            failed = self._failed_required()
+        if not failed:
+            self.status = READY
+        self.duration_ms = round((time.perf_counter() - self.started) * 1000, 1)
+        logger.info("warmup: %s en %.0f ms %s", self.status, self.duration_ms, self.results)
+
+    def skip(self) -> None:
+        """Sin calentamiento (WARMUP_ENABLED=0): listo desde el inicio."""
+        self.status = READY
+
+    def snapshot(self) -> dict:
+        return {"status": self.status, "duration_ms": self.duration_ms, "steps": self.results}
+
+
+# --- Pasos ---------------------------------------------------------------------------
+
+WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", "2"))
+
+
+def _hot_statements():
+    """Consultas de las rutas más usadas, con la misma forma que en los routers."""
+    from datetime import datetime, timedelta
+
+    from sqlmodel import select
+
+    from models.cliente import Cliente
+    from models.credito import Credito
+    from models.transacciones import Transaccion
+
+    return [
+        select(Cliente).where(Cliente.id == 0),
+        select(Credito).where(Credito.cliente_id == 0),
+        select(Transaccion).where(
+            Transaccion.cliente_id == 0, Transaccion.fecha >= datetime.now() - timedelta(days=365)
+        ),
+    ]
+
+
+async def warm_pool(engine, connections: int = WARMUP_DB_CONNECTIONS) -> None:
+    """
+    Abre `connections` conexiones a la vez (sin pasar del tamaño del pool) y en cada una
+    corre las consultas calientes: asyncpg guarda las sentencias preparadas por conexión,
+    así la primera petición real ya no paga el handshake ni el PREPARE.
+    """
+    from sqlalchemy import text
+
+    size = getattr(engine.pool, "size", None)
+    if callable(size):
+        connections = min(connections, size())
+    statements = _hot_statements()
+
+    async def open_one():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            for statement in statements:
+                await conn.execute(statement)
+
+    await asyncio.gather(*(open_one() for _ in range(max(connections, 1))))
+
+
+async def warm_catalog(session_factory) -> None:
+    """Lee productList.json y construye el índice de búsqueda con la tabla items."""
+    from catalog.product_catalog import load_product_catalog
+    from catalog.search_index import product_index
+
+    await asyncio.to_thread(load_product_catalog)
+    async with session_factory() as session:
+        await product_index.ensure_loaded(session)
+
+
+async def warm_gemini() -> None:
+    """Importa el SDK de Gemini y crea el modelo por defecto (sin llamar a la API)."""
+    from gemini.baseGeminiQueries import get_provider
+
+    provider = get_provider()
+    warm_up = getattr(provider, "warm_up", None)
+    if warm_up is not None:
+        await asyncio.to_thread(warm_up)
+
+
+async def warm_rapidapi() -> None:
+    """Crea el cliente HTTP compartido (importa httpx/certifi y arma el contexto SSL)."""
+    from catalog.rapidapi import get_client
+
+    await asyncio.to_thread(get_client)
+
+
+def default_steps() -> list:
+    import config
+
+    steps = [
+        WarmupStep("db_pool", lambda: warm_pool(config.engine)),
+        WarmupStep("catalog", lambda: warm_catalog(config.AsyncSessionLocal)),
+        WarmupStep("gemini", warm_gemini, required=False),
+        WarmupStep("rapidapi", warm_rapidapi, required=False),
+    ]
+    if config.replica_engine is not None:
+        # Si la réplica no responde se usa la primaria (config.get_read_session)
+        steps.append(WarmupStep("db_replica", lambda: warm_pool(config.replica_engine), required=False))
+    return steps
@@ -2,18 +2,103 @@
 Gemini API Integration
 """
 
-import google.generativeai as genai
+import importlib
 import os
+import threading
+from collections import Counter
+from typing import Iterator
 from pydantic import BaseModel
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+from core.telemetry import traced
+from .jsonRepair import count as count_failure, parse_structured
+from .keyHealth import key_health
+from .providers import GeminiProvider, fake_provider_from_env
+
+
+def __getattr__(name):
+    # google.generativeai (grpc, protobuf, google-api-core...) takes most of the app's
+    # import time, so it is only loaded on first use: `baseGeminiQueries.genai`
+    if name == "genai":
+        return importlib.import_module("google.generativeai")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # Remove global configuration. API key will be set per request.
 
 
+class GoogleGeminiProvider:
+    """The real API through the google.generativeai SDK."""
+
+    def generate_content(self, prompt, model_name, api_key, generation_config=None, stream=False):
+        genai = importlib.import_module("google.generativeai")
+        genai.configure(api_key=api_key)
+        model = genai.GenerativeModel(model_name, generation_config=generation_config)
+        if stream:
+            return model.generate_content(prompt, stream=True)
+        return model.generate_content(prompt)
+
+    def warm_up(self, model_name: str = "gemini-2.5-flash-lite") -> None:
+        """Load the SDK and build a model at startup so the first request doesn't pay for it."""
+        genai = importlib.import_module("google.generativeai")
+        genai.GenerativeModel(model_name)
+
+
+_provider: GeminiProvider = None
+
+
+def get_provider() -> GeminiProvider:
+    """Backend selected by GEMINI_PROVIDER ("google" or "fake"), created on first use."""
+    global _provider
+    if _provider is None:
+        name = os.getenv("GEMINI_PROVIDER", "google")
+        if name == "fake":
+            _provider = fake_provider_from_env()
+        elif name == "google":
+            _provider = GoogleGeminiProvider()
+        else:
+            raise ValueError(f"Unknown GEMINI_PROVIDER: {name!r}")
+    return _provider
+
+
+def set_provider(provider: GeminiProvider = None) -> None:
+    """Replace the backend (benchmarks, tests); None goes back to GEMINI_PROVIDER."""
+    global _provider
+    _provider = provider
+
+
+def _api_key(api_key: str = None) -> str:
+    key = api_key or os.getenv("GEMINI_API_KEY")
+    if not key:
+        raise ValueError("GEMINI_API_KEY not found in environment variables or as argument")
+    return key
+
+
+def _generate(prompt: str, model_name: str, key: str, **kwargs):
+    """Non-streaming provider call; the outcome goes to the key's health (/health)."""
+    try:
+        response = get_provider().generate_content(prompt, model_name, key, **kwargs)
+    except Exception as e:
+        key_health.record_failure(key, e)
+        raise
+    key_health.record_success(key)
+    return response
+
+
+# Token usage accumulated across all calls in this process (calls run in worker threads)
+token_usage: Counter = Counter()
+_usage_lock = threading.Lock()
+
+
+def record_usage(response) -> None:
+    """Adds a response's usage_metadata (prompt/output tokens) to token_usage."""
+    usage = getattr(response, "usage_metadata", None)
+    with _usage_lock:
+        token_usage["calls"] += 1
+        if usage is not None:
+            token_usage["prompt_tokens"] += getattr(usage, "prompt_token_count", 0) or 0
+            token_usage["output_tokens"] += getattr(usage, "candidates_token_count", 0) or 0
+
+
 # Pydantic models for structured output
 class AnalysisResult(BaseModel):
     """Structured output model for analysis results"""
@@ -34,6 +119,7 @@ class ProductRecommendation(BaseModel):
     recommended: bool
 
 
+@traced("gemini.basic", kind="gemini")
 def gemini_basic_response(
     prompt: str, model_name: str = "gemini-2.5-flash-lite", api_key: str = None
 ) -> str:
@@ -53,17 +139,9 @@ def gemini_basic_response(
         "The capital of France is Paris."
     """
     try:
-        # Configure Gemini API with the provided key, or fallback to env var
-        key = api_key or os.getenv("GEMINI_API_KEY")
-        if not key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables or as argument")
-        genai.configure(api_key=key)
-
-        # Initialize the model
-        model = genai.GenerativeModel(model_name)
-
-        # Generate response
-        response = model.generate_content(prompt)
+        # Use the provided key, or fallback to env var
+        response = _generate(prompt, model_name, _api_key(api_key))
+        record_usage(response)
 
         # Return the text content
         return response.text
@@ -72,6 +150,37 @@ def gemini_basic_response(
         return f"Error generating response: {str(e)}"
 
 
+@traced("gemini.stream", kind="gemini")
+def gemini_stream_response(
+    prompt: str, model_name: str = "gemini-2.5-flash-lite", api_key: str = None
+) -> Iterator[str]:
+    """
+    Streaming variant of gemini_basic_response: yields text chunks as Gemini produces them.
+
+    Unlike the other helpers, errors are raised instead of returned as text, so the
+    caller can tell a failed key from the model's answer (and try the next key).
+    This is a blocking generator: iterate it from a worker thread in async code.
+    """
+    key = _api_key(api_key)
+    chunk = None
+    try:
+        for chunk in get_provider().generate_content(prompt, model_name, key, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunk without text parts (e.g. only a finish reason)
+                continue
+            if text:
+                yield text
+    except Exception as e:
+        key_health.record_failure(key, e)
+        raise
+    key_health.record_success(key)
+    # The last chunk carries the usage totals for the whole stream
+    record_usage(chunk)
+
+
+@traced("gemini.structured", kind="gemini")
 def gemini_structured_response(
     prompt: str, response_schema: BaseModel, model_name: str = "gemini-2.5-flash-lite", api_key: str = None
 ) -> dict:
@@ -98,31 +207,35 @@ def gemini_structured_response(
         }
     """
     try:
-        # Configure Gemini API with the provided key, or fallback to env var
-        key = api_key or os.getenv("GEMINI_API_KEY")
-        if not key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables or as argument")
-        genai.configure(api_key=key)
-
-        # Initialize the model with structured output configuration
-        model = genai.GenerativeModel(
+        # Use the provided key, or fallback to env var
+        key = _api_key(api_key)
+
+        # Generate response with structured output configuration
+        response = _generate(
+            prompt,
             model_name,
+            key,
             generation_config={
                 "response_mime_type": "application/json",
                 "response_schema": response_schema,
             },
         )
+        record_usage(response)
+    except Exception as e:
+        count_failure("api_error")
+        return {"error": f"Error generating structured response: {str(e)}"}
 
-        # Generate response
-        response = model.generate_content(prompt)
-
-        # Parse and validate the response
-        import json
-
-        structured_data = json.loads(response.text)
+    def follow_up(follow_up_prompt: str) -> str:
+        # Only the fields that are still invalid; the answer is a small path -> value object
+        fix = _generate(
+            follow_up_prompt, model_name, key, generation_config={"response_mime_type": "application/json"}
+        )
+        record_usage(fix)
+        return fix.text
 
-        # Validate against the schema
-        validated_response = response_schema(**structured_data)
+    try:
+        # Parse and validate against the schema, repairing locally before re-asking
+        validated_response = parse_structured(response.text, response_schema, follow_up=follow_up)
 
         # Return as dictionary
         return validated_response.model_dump()
@@ -1,8 +1,19 @@
 from .baseGeminiQueries import gemini_structured_response
-from models.gemini import ChatResponseType, CreditOffer, CreditOffers
+from models.gemini import (
+    ChatResponseType,
+    ClassifiedCreditOffers,
+    ClientProfile,
+    CreditOffer,
+    CreditOfferDraft,
+    CreditOfferDrafts,
+    CreditOffers,
+)
 from typing import Optional
+import logging
 import math
 
+logger = logging.getLogger(__name__)
+
 
 def calculate_monthly_payment(
     prestamo: float, interes_anual: float, meses: int
@@ -153,14 +164,14 @@ def validate_and_correct_credit_offer(offer: CreditOffer) -> Optional[CreditOffe
 
     # If calculation failed (payment too low), reject the offer
     if correct_months is None:
-        print(
-            f"Warning: Payment {fixed_monthly_payment} is too low for loan {prestamo} at {interes}% interest"
+        logger.warning(
+            "Payment %s is too low for loan %s at %s%% interest", fixed_monthly_payment, prestamo, interes
         )
         return None
 
     # If months exceed 120, reject the offer
     if correct_months > 120:
-        print(f"Warning: Loan requires {correct_months} months (max is 120)")
+        logger.warning("Loan requires %s months (max is 120)", correct_months)
         return None
 
     # Create corrected offer with the mathematically correct months
@@ -193,7 +204,7 @@ def validate_and_correct_credit_offers(credit_offers: CreditOffers) -> CreditOff
         try:
             credit_offers = CreditOffers(**credit_offers)
         except Exception as e:
-            print(f"Warning: Could not cast dict to CreditOffers: {e}")
+            logger.warning("Could not cast dict to CreditOffers: %s", e)
             return CreditOffers(creditOffers=[])
 
     corrected_offers = []
@@ -206,8 +217,102 @@ def validate_and_correct_credit_offers(credit_offers: CreditOffers) -> CreditOff
     return CreditOffers(creditOffers=corrected_offers)
 
 
-def determine_response_type(message: str) -> ChatResponseType:
-    prompt = f"""
+# Annual green-loan rate by minimum credit score (credit_score is 0-1), best first
+RATE_TABLE = [(0.8, 3.5), (0.65, 4.5), (0.5, 5.5), (0.35, 7.0), (0.0, 8.5)]
+DEFAULT_RATE = 6.5  # Clients without a credit score yet
+
+MIN_MONTHS = 6
+MAX_MONTHS = 120
+
+# Term when there is no spend in the product's category to size the payment against
+TERM_BY_AMOUNT = [(54_000, 24), (270_000, 48), (float("inf"), 84)]
+
+
+def rate_for_score(credit_score: Optional[float]) -> float:
+    if credit_score is None:
+        return DEFAULT_RATE
+    for min_score, rate in RATE_TABLE:
+        if credit_score >= min_score:
+            return rate
+    return RATE_TABLE[-1][1]
+
+
+def synthesize_credit_offer(draft: CreditOfferDraft, profile: ClientProfile) -> Optional[CreditOffer]:
+    """
+    Builds the offer's money fields from the model's draft:
+
+    - prestamo: the product price
+    - interes: RATE_TABLE by credit score
+    - gasto_inicial_mes (fixed payment): what the client already spends per month in the
+      product's category, with the term stretched or shortened to MIN_MONTHS-MAX_MONTHS
+      (the payment is recomputed when it had to be clamped)
+    - gasto_final_mes: that same spend reduced by the draft's ahorro_porcentaje
+    """
+    prestamo = round(draft.product.precio, 2)
+    if prestamo <= 0:
+        return None
+    interes = rate_for_score(profile.credit_score)
+    gasto_actual = profile.gastos_mensuales.get(draft.product.categoria, 0.0)
+
+    if gasto_actual > 0:
+        meses = calculate_months_from_payment(prestamo, interes, gasto_actual) or MAX_MONTHS
+    else:
+        meses = next(term for limit, term in TERM_BY_AMOUNT if prestamo < limit)
+    meses = min(max(meses, MIN_MONTHS), MAX_MONTHS)
+    # Rounded up to the cent so the validator's inverse formula gives back the same term
+    pago = math.ceil(calculate_monthly_payment(prestamo, interes, meses) * 100) / 100
+
+    ahorro = min(max(draft.ahorro_porcentaje, 0.0), 100.0)
+    return CreditOffer(
+        prestamo=prestamo,
+        interes=interes,
+        meses_originales=meses,
+        descripcion=draft.descripcion,
+        gasto_inicial_mes=pago,
+        gasto_final_mes=round(gasto_actual * (1 - ahorro / 100), 2),
+        product=draft.product,
+    )
+
+
+def synthesize_credit_offers(drafts, profile: Optional[ClientProfile] = None) -> CreditOffers:
+    """Drafts (CreditOfferDrafts or its dict) -> validated CreditOffers."""
+    if isinstance(drafts, dict):
+        try:
+            drafts = CreditOfferDrafts(**drafts)
+        except Exception as e:
+            logger.warning("Could not cast dict to CreditOfferDrafts: %s", e)
+            return CreditOffers(creditOffers=[])
+    profile = profile or ClientProfile()
+    offers = [synthesize_credit_offer(draft, profile) for draft in drafts.creditOffers]
+    return validate_and_correct_credit_offers(
+        CreditOffers(creditOffers=[offer for offer in offers if offer is not None])
+    )
+
+
+TEXT_ASSISTANT_CONTEXT = """
+        CONTEXT:
+        You are an expert environmental and sustainable finance assistant. Your role is to provide accurate, helpful information about:
+        - Environmental sustainability and eco-friendly practices
+        - Green products and technologies (solar panels, electric vehicles, energy-efficient appliances, water-saving devices, etc.)
+        - Sustainable finance and green credits
+        - Carbon footprint reduction strategies
+        - Renewable energy and conservation methods
+        - Climate change mitigation and environmental impact
+        
+        GUIDELINES:
+        - Provide clear, concise, and actionable information
+        - Be professional, respectful, and encouraging
+        - Focus on practical solutions and benefits
+        - If a question is not related to environmental or sustainability topics, politely redirect the conversation back to these areas
+        - Use accessible language that users can understand
+        
+        ------
+        USER MESSAGE:
+        """
+
+
+def response_type_prompt(message: str) -> str:
+    return f"""
       Determine the type of the following message. In here, the user is asking for either general information (text) or information about a possible credit for buying a particular green product that helps reduce its environmental impact in either energy, water or transportation mainly (credit).
       
       If the user is talking about a particular product, like solar panels, electric vehicles, energy-efficient appliances, water-saving devices, or similar items that contribute to environmental sustainability, classify it as 'credit', as they will be provided with credit options for the object in addition to the response for the inquiry.
@@ -227,178 +332,90 @@ def determine_response_type(message: str) -> ChatResponseType:
       Message: "{message}"
       Respond with a JSON object with two fields: 'response_type' indicating the type, and 'object_in_response' containing the specific object mentioned (or empty string if none).
     """
-    return gemini_structured_response(prompt, ChatResponseType)
 
 
-def create_credit_offers(
-    conversation_context: str, num_offers: int = 3
-) -> CreditOffers:
-    prompt = f"""
-    You are a financial advisor specializing in green financing and sustainable products. Based on the conversation context provided, generate realistic credit offers for green products that help reduce environmental impact.
-    
-    IMPORTANT GUIDELINES FOR REALISTIC OFFERS:
-    1. LOAN AMOUNTS (prestamo):
-       - Base the loan amount on realistic market prices for the mentioned products in Mexican pesos (MXN)
-       - Consider the user's financial capacity based on their transaction history and balance
-       - All prices are in MXN pesos
-    
-    2. INTEREST RATES (interes):
-       - Use competitive green loan rates: typically 3.5% to 8.5% annual rate
-       - Lower rates for better credit scores and shorter terms
-       - Green products often qualify for preferential rates
-    
-    3. LOAN TERMS (meses_originales):
-       - Match term to product lifespan and loan amount
-       - Small purchases ($9,000-$54,000 MXN): 12-36 months
-       - Medium purchases ($54,000-$270,000 MXN): 24-60 months
-       - Large purchases ($270,000+ MXN): 36-120 months
-    
-    4. DESCRIPTIONS (descripcion):
-       - Be specific about the product and its environmental benefits
-       - Mention concrete savings and payback period if applicable
-       - Include relevant product specifications or capacity
-       - ONLY 1 SENTENCE. DO NOT MAKE IT LONG.
-       - MAKE SURE ITS IN SPANISH. ALL TEXT.
-    
-    5. PROJECTED SAVINGS:
-       - Calculate accurate savings based on product specifications:
-         * Solar panels: 40-70% reduction in electricity bills
-         * LED bulbs: 75-80% reduction in lighting costs
-         * High-efficiency appliances: 20-50% reduction in related utility costs
-         * Electric vehicles: 60-80% reduction in fuel costs
-    
-    6. MONTHLY LOAN PAYMENT (gasto_inicial_mes):
-       - *** THIS IS THE FIXED MONTHLY PAYMENT THE USER WILL PAY FOR THE LOAN ***
-       - This value should be based on the user's monthly expense for the specific category
-       - Calculate from user's transaction history over the last 12 months
-       - This becomes the FIXED MONTHLY PAYMENT for the credit
-       - Examples:
-         * For solar panels: If user pays 2,000 MXN/month for electricity, set gasto_inicial_mes = 2,000
-         * For electric vehicle: If user pays 5,000 MXN/month for gas, set gasto_inicial_mes = 5,000
-         * For energy-efficient appliances: Use average monthly utility expense
-       - This value will NOT change - it's the exact monthly payment
-       - Use actual transaction data from the conversation context
-       - Express in MXN pesos
-    
-    7. FINAL MONTHLY EXPENSE (gasto_final_mes):
-       - This is the EXPECTED monthly expense AFTER implementing the purchased product
-       - This represents the REDUCED utility/operational cost (the savings benefit)
-       - DO NOT include the credit payment in this calculation
-       - Only calculate the reduced utility/operational cost
-       - Examples:
-         * For solar panels: new expected electricity bill (30-60% of original bill)
-         * For electric vehicle: new expected charging costs (20-40% of previous fuel costs)
-         * For energy-efficient appliance: new expected utility cost (50-80% of previous cost)
-         * For LED bulbs: new expected lighting costs (20-25% of previous costs)
-       - This shows the pure savings benefit, independent of the loan
-       - Express in MXN pesos
-       
-    8. LOAN TERM CALCULATION (meses_originales):
-       - Calculate using the INVERSE amortization formula:
-         * Given: prestamo (P), interes (r), gasto_inicial_mes (M = fixed monthly payment)
-         * Calculate: n = -log(1 - (P × r/12) / M) / log(1 + r/12)
-       - The months will be automatically validated and corrected if needed
-       - Aim for terms between 6-120 months
-       - If calculated months exceed 120, the offer may be rejected
-    
-    9. PRODUCT DATA (product):
-       - Each credit offer MUST include specific product information
-       - nombre: Specific product name/model (e.g., "Panel Solar 450W Monocristalino", "Tesla Model 3", "Refrigerador Samsung Inverter 18 pies")
-       - link: A realistic product URL (can use placeholder like "https://mercadolibre.com.mx/producto/[id]" or similar Mexican retailer)
-       - img_link: A realistic image URL (can use placeholder like "https://http2.mlstatic.com/D_NQ_NP_[product-id].jpg")
-       - precio: The actual product price in MXN pesos (should match or be close to the prestamo amount)
-       - Ensure the product details match the description and loan amount
-    
-    ANALYSIS REQUIREMENTS:
-    - Review the user's transaction history to identify current spending patterns
-    - Match credit offers to products that address their highest utility expenses
-    - The loan payment should fit within what the user currently pays for the related utility (gasto_inicial_mes)
-    - Show realistic ROI and payback periods
-    - Generate {num_offers} offers with varying terms and amounts
-        
+def determine_response_type(message: str) -> ChatResponseType:
+    return gemini_structured_response(response_type_prompt(message), ChatResponseType)
+
+
+def credit_offers_prompt(conversation_context: str, num_offers: int = 3) -> str:
+    # Amounts, rate, term and payments are computed locally (synthesize_credit_offers)
+    return f"""
+    You are a financial advisor specializing in green financing and sustainable products. Based on the conversation context provided, choose {num_offers} green products for credit offers that help the user reduce their environmental impact and their highest utility expenses.
+
+    For each offer return:
+    1. product: the specific product (nombre, link, img_link, precio in MXN, categoria).
+       - Prefer the related products listed in the context; otherwise use a realistic product and URLs from a Mexican retailer
+       - categoria must be one of "Luz", "Agua", "Gas", "Transporte": the expense the product reduces
+       - precio is the realistic market price in MXN pesos
+    2. descripcion: ONLY 1 SENTENCE IN SPANISH about the product and its environmental benefit.
+    3. ahorro_porcentaje: expected reduction (0-100) of the user's monthly expense in that category:
+       * Solar panels: 40-70
+       * LED bulbs: 75-80
+       * High-efficiency appliances: 20-50
+       * Electric vehicles: 60-80
+       * Water-saving devices: 20-50
+
+    Vary the products and price ranges across offers, and keep them within reach of the user's balance and spending.
+
     ---------
     CONVERSATION CONTEXT:
     {conversation_context}
-    
-    ---------
-    INSTRUCTIONS:
-    Respond with a JSON array of {num_offers} realistic credit offer objects. Each offer MUST include all fields including the product data (nombre, link, img_link, precio). The product should be specific and tailored to the user's actual situation and needs.
-    
-    IMPORTANT: MAKE SURE THE CALCULUS FOR THE CREDIT AND SAVINGS IS MATHEMATICALLY CORRECT: 
-    THESE FORMULAS MUST HOLD TRUE:
-    
-    1. MONTHLY PAYMENT CALCULATION:
-       - Use the amortization formula for fixed-rate loans:
-       - Monthly Payment (M) = P x [r(1+r)^n] / [(1+r)^n - 1]
-       Where:
-         * P = prestamo (loan amount in MXN)
-         * r = monthly interest rate = (interes / 100) / 12
-         * n = meses_originales (total number of months)
-       
-       Example: If prestamo = 120,000 MXN, interes = 6% annual, meses_originales = 36
-         * r = (6 / 100) / 12 = 0.005
-         * n = 36
-         * M = 120,000 x [0.005(1.005)^36] / [(1.005)^36 - 1]
-         * M ≈ 3,651.93 MXN per month
-    
-    2. TOTAL AMOUNT PAID VERIFICATION:
-       - Total Paid = Monthly Payment x meses_originales
-       - Total Interest = Total Paid - prestamo
-       - Verify that total interest aligns with the stated annual interest rate
-    
-    3. SAVINGS CALCULATION VERIFICATION:
-       - gasto_inicial_mes = FIXED MONTHLY LOAN PAYMENT (not related to savings)
-       - gasto_final_mes = New reduced utility cost after product installation
-       - The savings on utilities should be realistic based on product efficiency:
-         * Solar panels: 40-70% reduction in electricity bills
-         * Electric vehicles: 60-80% reduction in fuel costs
-         * Efficient appliances: 20-50% reduction in utility costs
-    
-    4. TOTAL PAYMENT VERIFICATION:
-       - Total Amount Paid = gasto_inicial_mes x meses_originales
-       - This should equal approximately: prestamo + (prestamo x interes_total)
-       - Where interes_total is the total interest paid over the life of the loan
-       - CRITICAL: Verify this matches the amortization formula results
-    
-    5. CONSISTENCY CHECKS:
-       - Ensure producto.precio ≈ prestamo (loan should cover product cost)
-       - Ensure gasto_final_mes < current utility expense (there must be savings)
-       - Ensure meses_originales is between 6 and 120 months
-       - Ensure interest rate is within 3.5% - 8.5% for green loans
-       - VERIFY: gasto_inicial_mes X meses_originales ≈ prestamo + total_interest
-    
-    EXAMPLE CALCULATION:
-    For a solar panel system where the user currently pays 2,500 MXN/month for electricity:
-    
-    Correct Example:
-    - prestamo = 60,000 MXN
-    - interes = 6% annual (0.5% monthly)
-    - gasto_inicial_mes = 1,800 MXN (FIXED MONTHLY PAYMENT for the loan)
-    - gasto_final_mes = 1,000 MXN (new electricity bill after solar panels - 60% reduction)
-    
-    Calculate months using inverse amortization:
-    - r = 6% / 12 = 0.005 (monthly rate)
-    - n = -log(1 - (60,000 X 0.005) / 1,800) / log(1.005)
-    - n ≈ 36 months
-    
-    Verification:
-    - Monthly Payment using standard formula: M = 60,000 X [0.005(1.005)^36] / [(1.005)^36 - 1] ≈ 1,825 MXN ✓
-    - Total Paid = 1,825 X 36 = 65,700 MXN
-    - Total Interest = 65,700 - 60,000 = 5,700 MXN
-    - Effective rate ≈ 6.02% annual ✓
-    - User saves 2,500 - 1,000 = 1,500 MXN/month on electricity AFTER loan is paid
-    
-    VERIFY ALL CALCULATIONS BEFORE RETURNING THE RESPONSE.
-    
     """
 
-    # Get AI-generated offers
-    ai_offers = gemini_structured_response(prompt, CreditOffers)
 
-    # Validate and correct the offers
-    corrected_offers = validate_and_correct_credit_offers(ai_offers)
+def create_credit_offers(
+    conversation_context: str, num_offers: int = 3, profile: Optional[ClientProfile] = None
+) -> CreditOffers:
+    # Get AI-generated drafts (product, description, savings %)
+    drafts = gemini_structured_response(
+        credit_offers_prompt(conversation_context, num_offers), CreditOfferDrafts
+    )
+
+    # Compute the money fields locally and validate
+    return synthesize_credit_offers(drafts, profile)
+
+
+def classify_and_create_offers(
+    message: str,
+    conversation_context: str,
+    num_offers: int = 3,
+    api_key: str = None,
+    profile: Optional[ClientProfile] = None,
+) -> dict:
+    """
+    Single-pass mode: one structured call that classifies the message and, in the same
+    response, answers it ('text') or generates the credit offers ('credit').
+    Returns the same shapes as the two-call flow in routers/gemini.process_message.
+    """
+    prompt = f"""
+    You will handle a user's message in a single step.
+
+    STEP 1 - CLASSIFY THE MESSAGE:
+    {response_type_prompt(message)}
+
+    STEP 2 - RESPOND:
+    - If response_type is 'text': write the answer in 'text_response' following these instructions, and return an empty 'creditOffers' list.
+    {TEXT_ASSISTANT_CONTEXT}{message}
 
-    return corrected_offers
+    - If response_type is 'credit': set 'text_response' to an empty string and fill 'creditOffers' following these instructions:
+    {credit_offers_prompt(conversation_context, num_offers)}
+
+    Respond with a JSON object with the fields 'response_type', 'object_in_response', 'text_response' and 'creditOffers'.
+    """
+    result = gemini_structured_response(prompt, ClassifiedCreditOffers, api_key=api_key)
+    if "error" in result:
+        return result
+    if result["response_type"] == "credit":
+        offers = synthesize_credit_offers(
+            CreditOfferDrafts(creditOffers=result["creditOffers"]), profile
+        )
+        return {
+            "response_type": "credit",
+            "object_in_response": result["object_in_response"],
+            "creditOffers": offers,
+        }
+    return {"response_type": "text", "text_response": result["text_response"]}
 
 
 if __name__ == "__main__":
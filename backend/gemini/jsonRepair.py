@@ -0,0 +1,350 @@
+"""
+Repair stage for Gemini structured output.
+
+gemini_structured_response used to fail the whole call whenever the JSON did not
+validate, and process_message_endpoint then re-ran the full pipeline with the next
+API key. Most of those failures are mechanical, so they are fixed here first:
+
+1. Local text repair: markdown fences, trailing commas and truncated output
+   (the incomplete tail is cut back to the last complete value and brackets are closed).
+2. Local schema repair: missing optional fields (nullable -> None, lists -> []) and
+   numbers sent as strings ("$12,500", "7.5%").
+3. Follow-up: only the fields that are still invalid go back to the model, which
+   answers with a small JSON object of path -> value that is merged and re-validated.
+
+Every failure class and outcome is counted in repair_stats so wasted calls are visible.
+"""
+
+import json
+import logging
+import re
+import threading
+import types
+from collections import Counter
+from typing import Any, Callable, Optional, Type, Union, get_args, get_origin
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+logger = logging.getLogger(__name__)
+
+# Failure classes (code_fence, trailing_comma, truncated, missing_field, number_format,
+# invalid_json, api_error) and outcomes (valid, repaired_locally, follow_up,
+# follow_up_repaired, unrepairable)
+repair_stats: Counter = Counter()
+_stats_lock = threading.Lock()
+
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*```\s*$", re.DOTALL)
+_NUMBER_NOISE_RE = re.compile(r"[\s$,%]|MXN", re.IGNORECASE)
+_NUMBER_ERRORS = {"float_parsing", "int_parsing", "int_from_float", "float_type", "int_type"}
+
+
+class StructuredOutputError(ValueError):
+    """The response could not be turned into a valid instance of the schema."""
+
+
+def count(key: str, n: int = 1) -> None:
+    with _stats_lock:
+        repair_stats[key] += n
+
+
+def _scan(text: str):
+    """
+    Yields (index, char, kind) for every character; kind is "code", "string" (inside
+    a string literal) or "quote" (an unescaped string delimiter).
+    """
+    in_string = escape = False
+    for i, ch in enumerate(text):
+        if in_string and escape:
+            escape = False
+        elif in_string and ch == "\\":
+            escape = True
+        elif ch == '"':
+            in_string = not in_string
+            yield i, ch, "quote"
+            continue
+        yield i, ch, "string" if in_string else "code"
+
+
+def strip_trailing_commas(text: str) -> str:
+    out = []
+    pending_comma = None
+    for _, ch, kind in _scan(text):
+        in_string = kind != "code"
+        if not in_string and ch == ",":
+            if pending_comma is not None:
+                out.append(pending_comma)
+            pending_comma = ch
+            continue
+        if pending_comma is not None:
+            if not in_string and ch.isspace():
+                pending_comma += ch
+                continue
+            if in_string or ch not in "}]":
+                out.append(pending_comma)
+            else:
+                out.append(pending_comma[1:])
+            pending_comma = None
+        out.append(ch)
+    if pending_comma is not None:
+        out.append(pending_comma)
+    return "".join(out)
+
+
+def close_truncated(text: str) -> Optional[str]:
+    """
+    Closes JSON cut off mid-way. Returns None if the text is not truncated (or cannot
+    be made valid). The incomplete tail (half a string, half a number, a dangling key)
+    is dropped rather than completed, so no value is ever made up.
+    """
+    stack: list[str] = []
+    cut_points: list[tuple[int, list[str]]] = []  # (end index, closers needed there)
+    in_string = False
+    for i, ch, kind in _scan(text):
+        if kind == "quote":
+            in_string = not in_string
+        if kind != "code":
+            continue
+        if ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            cut_points.append((i + 1, list(stack)))
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            cut_points.append((i + 1, list(stack)))
+        elif ch == ",":
+            cut_points.append((i, list(stack)))
+
+    if not stack and not in_string:
+        return None
+
+    tail = text.rstrip()
+    candidates = []
+    if not in_string and (tail.endswith(('"', "}", "]")) or tail.endswith(("true", "false", "null"))):
+        candidates.append(tail + "".join(reversed(stack)))
+    candidates.extend(text[:end] + "".join(reversed(closers)) for end, closers in reversed(cut_points))
+    for candidate in candidates:
+        try:
+            json.loads(candidate)
+        except ValueError:
+            continue
+        return candidate
+    return None
+
+
+def parse_json_lenient(text: str) -> tuple[Any, list[str]]:
+    """json.loads with local text repairs; returns (data, fixes applied)."""
+    fixes: list[str] = []
+    match = _FENCE_RE.match(text)
+    if match:
+        text = match.group(1)
+        fixes.append("code_fence")
+    try:
+        return json.loads(text), fixes
+    except ValueError:
+        pass
+
+    stripped = strip_trailing_commas(text)
+    if stripped != text:
+        fixes.append("trailing_comma")
+        text = stripped
+        try:
+            return json.loads(text), fixes
+        except ValueError:
+            pass
+
+    closed = close_truncated(text)
+    if closed is not None:
+        fixes.append("truncated")
+        return json.loads(closed), fixes
+    raise StructuredOutputError("response is not valid JSON")
+
+
+def _unwrap_optional(annotation):
+    origin = get_origin(annotation)
+    if origin is Union or origin is types.UnionType:
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        return (args[0] if len(args) == 1 else annotation), len(args) < len(get_args(annotation))
+    return annotation, False
+
+
+def _annotation_at(schema: Type[BaseModel], loc: tuple) -> Any:
+    """Type annotation of the field at a validation-error loc, or None if unknown."""
+    annotation: Any = schema
+    for part in loc:
+        annotation, _ = _unwrap_optional(annotation)
+        if isinstance(part, int):
+            if get_origin(annotation) is not list:
+                return None
+            annotation = get_args(annotation)[0]
+        elif isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            field = annotation.model_fields.get(part)
+            if field is None:
+                return None
+            annotation = field.annotation
+        else:
+            return None
+    return annotation
+
+
+def _get_at(data: Any, loc: tuple) -> Any:
+    for part in loc:
+        data = data[part]
+    return data
+
+
+def set_at(data: Any, loc: tuple, value: Any) -> None:
+    for part in loc[:-1]:
+        if isinstance(data, dict):
+            data = data.setdefault(part, {})
+        else:
+            data = data[part]
+    data[loc[-1]] = value
+
+
+def _coerce_number(value: Any, annotation: Any) -> Optional[Union[int, float]]:
+    if not isinstance(value, (str, float)):
+        return None
+    try:
+        number = float(_NUMBER_NOISE_RE.sub("", value)) if isinstance(value, str) else value
+    except ValueError:
+        return None
+    annotation, _ = _unwrap_optional(annotation)
+    return round(number) if annotation is int else number
+
+
+def _fix_fields(data: Any, schema: Type[BaseModel], errors: list[dict]) -> list[str]:
+    """Fixes the errors that need no model call; returns the fix classes applied."""
+    fixes = []
+    for error in errors:
+        loc = tuple(error["loc"])
+        annotation = _annotation_at(schema, loc)
+        if annotation is None:
+            continue
+        try:
+            if error["type"] == "missing":
+                inner, nullable = _unwrap_optional(annotation)
+                if nullable:
+                    set_at(data, loc, None)
+                elif get_origin(inner) is list:
+                    set_at(data, loc, [])
+                else:
+                    continue
+                fixes.append("missing_field")
+            elif error["type"] in _NUMBER_ERRORS:
+                number = _coerce_number(_get_at(data, loc), annotation)
+                if number is None:
+                    continue
+                set_at(data, loc, number)
+                fixes.append("number_format")
+        except (KeyError, IndexError, TypeError):
+            continue
+    return fixes
+
+
+def _validate_locally(data: Any, schema: Type[BaseModel]) -> tuple[Optional[BaseModel], list[dict], list[str]]:
+    """Validates, applying local field fixes while they make progress."""
+    fixes: list[str] = []
+    while True:
+        try:
+            return schema.model_validate(data), [], fixes
+        except ValidationError as exc:
+            errors = exc.errors()
+        if not isinstance(data, dict):
+            return None, errors, fixes
+        applied = _fix_fields(data, schema, errors)
+        if not applied:
+            return None, errors, fixes
+        fixes.extend(applied)
+
+
+def _path(loc: tuple) -> str:
+    return ".".join(str(part) for part in loc)
+
+
+def _schema_fragment(schema: Type[BaseModel], loc: tuple) -> Optional[dict]:
+    """JSON schema of just the field at loc (with its description), or None if unknown."""
+    annotation = _annotation_at(schema, loc)
+    if annotation is None:
+        return None
+    try:
+        fragment = TypeAdapter(annotation).json_schema()
+    except Exception:
+        return None
+    parent = _annotation_at(schema, loc[:-1]) if isinstance(loc[-1], str) else None
+    parent, _ = _unwrap_optional(parent)
+    if isinstance(parent, type) and issubclass(parent, BaseModel):
+        description = parent.model_fields[loc[-1]].description
+        if description:
+            fragment["description"] = description
+    return fragment
+
+
+def follow_up_prompt(schema: Type[BaseModel], errors: list[dict]) -> str:
+    """
+    Follow-up for the fields that are still invalid. It carries only those paths, their
+    current value and their schema fragment: neither the original prompt (catalog,
+    transaction history) nor the rest of the answer is sent again.
+    """
+    lines = []
+    for e in errors:
+        loc = tuple(e["loc"])
+        current = "missing" if e["type"] == "missing" else json.dumps(e.get("input"), ensure_ascii=False)
+        lines.append(f'- "{_path(loc)}": {e["msg"]} (current value: {current})')
+        fragment = _schema_fragment(schema, loc)
+        if fragment is not None:
+            lines.append(f"  schema: {json.dumps(fragment, ensure_ascii=False)}")
+    fields = "\n".join(lines)
+    return f"""
+    Some fields of a JSON answer are missing or invalid:
+    {fields}
+
+    Respond ONLY with a JSON object whose keys are exactly the field paths listed above
+    and whose values are the corrected values, valid against each field's schema.
+    """
+
+
+def parse_structured(
+    text: str,
+    schema: Type[BaseModel],
+    follow_up: Optional[Callable[[str], str]] = None,
+) -> BaseModel:
+    """
+    Turns a model response into a schema instance, repairing locally first and asking
+    follow_up (prompt -> JSON text) only for the fields that are still invalid.
+    Raises StructuredOutputError if it cannot.
+    """
+    try:
+        data, fixes = parse_json_lenient(text)
+    except StructuredOutputError:
+        count("invalid_json")
+        count("unrepairable")
+        raise
+
+    validated, errors, field_fixes = _validate_locally(data, schema)
+    fixes += field_fixes
+    for fix in fixes:
+        count(fix)
+    if validated is not None:
+        count("repaired_locally" if fixes else "valid")
+        return validated
+
+    if follow_up is not None:
+        count("follow_up")
+        logger.info("asking Gemini to fix %d invalid field(s) of %s", len(errors), schema.__name__)
+        try:
+            patch, _ = parse_json_lenient(follow_up(follow_up_prompt(schema, errors)))
+            if isinstance(patch, dict):
+                for path, value in patch.items():
+                    loc = tuple(int(p) if p.isdigit() else p for p in str(path).split("."))
+                    set_at(data, loc, value)
+                validated, errors, _ = _validate_locally(data, schema)
+        except Exception:
+            logger.warning("structured output follow-up failed", exc_info=True)
+        if validated is not None:
+            count("follow_up_repaired")
+            return validated
+
+    count("unrepairable")
+    raise StructuredOutputError(
+        "; ".join(f"{_path(tuple(e['loc']))}: {e['msg']}" for e in errors[:5])
+    )
@@ -0,0 +1,97 @@
+"""
+Health of each Gemini API key, as seen by the calls this process made with it.
+
+The routers rotate through GEMINI_API_KEY, GEMINI_API_KEY_2... and silently move on
+when a key fails, so a dead or exhausted key is otherwise invisible. Every provider
+call in baseGeminiQueries reports its outcome here, and /health shows per key:
+
+- "unused": no call yet in this process
+- "ok": the last call succeeded
+- "rate_limited": a 429 within the last KEY_COOLDOWN_SECONDS
+- "failing": KEY_FAILURE_THRESHOLD or more consecutive errors
+
+Keys are reported by fingerprint (hash prefix), never in clear text, and errors by
+exception type only: /health is public and SDK messages can echo request details.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+KEY_COOLDOWN_SECONDS = float(os.getenv("GEMINI_KEY_COOLDOWN_SECONDS", "60"))
+KEY_FAILURE_THRESHOLD = int(os.getenv("GEMINI_KEY_FAILURE_THRESHOLD", "3"))
+
+
+def fingerprint(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()[:8]
+
+
+def _is_rate_limit(error: BaseException) -> bool:
+    # FakeRateLimited.status_code, google.api_core's ResourceExhausted.code
+    code = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return code == 429 or "429" in str(error)
+
+
+@dataclass
+class KeyState:
+    consecutive_failures: int = 0
+    last_success: Optional[float] = None
+    rate_limited_at: Optional[float] = None
+    last_error: Optional[str] = None
+
+
+class KeyHealth:
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._states: Dict[str, KeyState] = {}
+        self._lock = threading.Lock()
+
+    def record_success(self, key: str) -> None:
+        with self._lock:
+            state = self._states.setdefault(fingerprint(key), KeyState())
+            state.consecutive_failures = 0
+            state.rate_limited_at = None
+            state.last_success = self._clock()
+
+    def record_failure(self, key: str, error: BaseException) -> None:
+        with self._lock:
+            state = self._states.setdefault(fingerprint(key), KeyState())
+            state.consecutive_failures += 1
+            state.last_error = type(error).__name__
+            if _is_rate_limit(error):
+                state.rate_limited_at = self._clock()
+
+    def status(self, key: str) -> str:
+        state = self._states.get(fingerprint(key))
+        if state is None:
+            return "unused"
+        if state.rate_limited_at is not None and self._clock() - state.rate_limited_at < KEY_COOLDOWN_SECONDS:
+            return "rate_limited"
+        if state.consecutive_failures >= KEY_FAILURE_THRESHOLD:
+            return "failing"
+        return "ok"
+
+    def snapshot(self, keys: Iterable[str]) -> list:
+        """One entry per configured key, in rotation order."""
+        report = []
+        for key in keys:
+            state = self._states.get(fingerprint(key), KeyState())
+            report.append(
+                {
+                    "key": fingerprint(key),
+                    "status": self.status(key),
+                    "consecutive_failures": state.consecutive_failures,
+                    "last_error": state.last_error,
+                }
+            )
+        return report
+
+    def clear(self) -> None:
+        with self._lock:
+            self._states.clear()
+
+
+key_health = KeyHealth()
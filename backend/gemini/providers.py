@@ -0,0 +1,158 @@
+"""
+Pluggable Gemini backends.
+
+gemini_basic_response, gemini_stream_response and gemini_structured_response only talk
+to the model through a GeminiProvider (baseGeminiQueries.get_provider), so everything
+around the call (JSON repair, token accounting, spans, key rotation in the routers)
+runs the same against the real API and against the fake.
+
+GEMINI_PROVIDER selects the backend: "google" (default, the real SDK) or "fake". The
+fake answers locally with configurable latency, error rate and per-key quota (see
+core/fakes.py: FAKE_GEMINI_LATENCY, FAKE_GEMINI_ERROR_RATE, FAKE_GEMINI_RPM, FAKE_SEED).
+Structured answers are generated from the response schema, so they always validate;
+the content is derived from the prompt, so the same prompt gets the same answer.
+"""
+
+import hashlib
+import json
+import os
+import random
+import time
+import typing
+from types import SimpleNamespace
+from typing import Any, Iterator, Optional, Protocol
+
+from pydantic import BaseModel
+
+from core.fakes import FaultInjector, injector_from_env
+
+
+class GeminiProvider(Protocol):
+    def generate_content(
+        self,
+        prompt: str,
+        model_name: str,
+        api_key: str,
+        generation_config: Optional[dict] = None,
+        stream: bool = False,
+    ) -> Any:
+        """
+        Same contract as GenerativeModel.generate_content: a response with .text and
+        .usage_metadata, or with stream=True an iterator of such chunks.
+        """
+        ...
+
+
+# Values that keep fake structured answers plausible for this app's schemas
+FAKE_NUMBER_RANGES = {
+    "precio": (2000.0, 250000.0),
+    "ahorro_porcentaje": (10.0, 60.0),
+    "index": (0, 9),
+}
+FAKE_STRING_CHOICES = {"categoria": ["Luz", "Agua", "Gas", "Transporte"]}
+
+FAKE_SENTENCES = [
+    "Reducir el consumo en casa empieza por medir cuánto gastas cada mes.",
+    "Los paneles solares suelen pagarse solos en pocos años con el ahorro en luz.",
+    "Una regadera ahorradora puede bajar el consumo de agua casi a la mitad.",
+    "Cambiar a focos LED es de las mejoras más baratas y rápidas.",
+    "El transporte eléctrico reduce emisiones y el gasto en combustible.",
+    "Revisa tu historial de gastos para ver qué categoría conviene atacar primero.",
+]
+
+
+def fake_value(annotation, name: str, rng: random.Random):
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Literal:
+        return rng.choice(args)
+    if origin is typing.Union:
+        return fake_value(next(a for a in args if a is not type(None)), name, rng)
+    if origin is list:
+        return [fake_value(args[0] if args else str, name, rng) for _ in range(3)]
+    if origin is dict:
+        return {}
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return fake_instance(annotation, rng)
+    if annotation is bool:
+        return rng.random() < 0.5
+    if annotation is int:
+        low, high = FAKE_NUMBER_RANGES.get(name, (0, 100))
+        return rng.randint(int(low), int(high))
+    if annotation is float:
+        low, high = FAKE_NUMBER_RANGES.get(name, (0.0, 1.0))
+        return round(rng.uniform(low, high), 2)
+    if name in FAKE_STRING_CHOICES:
+        return rng.choice(FAKE_STRING_CHOICES[name])
+    if "link" in name:
+        return f"https://fake.example/{name}/{rng.randint(1, 9999)}"
+    return f"{name} {rng.randint(1, 9999)}"
+
+
+def fake_instance(schema: type[BaseModel], rng: random.Random) -> dict:
+    return {
+        name: fake_value(field.annotation, name, rng)
+        for name, field in schema.model_fields.items()
+    }
+
+
+def _tokens(text: str) -> int:
+    # Roughly what Gemini reports for Spanish/English text
+    return max(1, len(text) // 4)
+
+
+def _response(prompt: str, text: str, output: Optional[str] = None):
+    """Response/chunk with `text`; usage_metadata only if `output` (the whole answer) is given."""
+    metadata = (
+        SimpleNamespace(prompt_token_count=_tokens(prompt), candidates_token_count=_tokens(output))
+        if output is not None
+        else None
+    )
+    return SimpleNamespace(text=text, usage_metadata=metadata)
+
+
+class FakeGeminiProvider:
+    def __init__(self, faults: FaultInjector, seed: int = 0):
+        self.faults = faults
+        self.seed = seed
+
+    def _content_rng(self, prompt: str) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode()).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def _answer(self, prompt: str, generation_config: Optional[dict]) -> str:
+        rng = self._content_rng(prompt)
+        schema = (generation_config or {}).get("response_schema")
+        if schema is not None:
+            return json.dumps(fake_instance(schema, rng), ensure_ascii=False)
+        if (generation_config or {}).get("response_mime_type") == "application/json":
+            # Follow-up repair prompts: nothing left to fix
+            return "{}"
+        return " ".join(rng.choice(FAKE_SENTENCES) for _ in range(rng.randint(2, 5)))
+
+    def generate_content(self, prompt, model_name, api_key, generation_config=None, stream=False):
+        call = self.faults.next_call(api_key)
+        text = self._answer(prompt, generation_config)
+        if not stream:
+            time.sleep(call.delay)
+            if call.error:
+                raise call.error
+            return _response(prompt, text, output=text)
+        return self._stream(prompt, text, call)
+
+    def _stream(self, prompt: str, text: str, call) -> Iterator[SimpleNamespace]:
+        # Part of the latency goes before the first chunk; the rest is spread over the chunks
+        time.sleep(call.delay * 0.4)
+        if call.error:
+            raise call.error
+        words = text.split(" ")
+        chunks = [" ".join(words[i : i + 8]) + " " for i in range(0, len(words), 8)]
+        for n, chunk in enumerate(chunks):
+            time.sleep(call.delay * 0.6 / len(chunks))
+            # Like the SDK, the last chunk carries the usage totals of the whole stream
+            yield _response(prompt, chunk, output=text if n == len(chunks) - 1 else None)
+
+
+def fake_provider_from_env() -> FakeGeminiProvider:
+    faults = injector_from_env("GEMINI", default_latency="lognormal:800:3000")
+    return FakeGeminiProvider(faults, seed=int(os.getenv("FAKE_SEED", "0")))
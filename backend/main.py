@@ -1,6 +1,9 @@
+import core.env  # noqa: F401  (primero: carga .env antes de los módulos que leen variables)
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from routers.cliente import router as cliente_router
 from routers.item import router as item_router
 from routers.admin import router as admin_router
@@ -8,12 +11,95 @@ from routers.credito import router as credito_router
 from routers.transacciones import router as transaccion_router
 from routers.products import router as productos_router
 from routers.gemini import router as gemini_router
+from catalog.rapidapi import close_client as close_rapidapi_client
+from core.health import HealthCheck, default_probes
+from core.querycount import QueryCountMiddleware
+from core.ratelimit import RateLimit, RateLimitMiddleware, RateLimitRule, backend_from_env
+from core.telemetry import CounterSource, TelemetryMiddleware, register, render_metrics
+from core.warmup import Warmup, default_steps
+from gemini.baseGeminiQueries import token_usage
+from gemini.jsonRepair import repair_stats
+import asyncio
+import os
+
+# Endpoints que consumen cuota de Gemini (por cliente / total de la ruta)
+RATE_LIMIT_RULES = [
+    RateLimitRule(
+        "POST", "/gemini/process",
+        per_client=RateLimit(10, per_seconds=60), per_route=RateLimit(120, per_seconds=60),
+    ),
+    RateLimitRule(
+        "POST", "/gemini/process/stream",
+        per_client=RateLimit(10, per_seconds=60), per_route=RateLimit(120, per_seconds=60),
+    ),
+    RateLimitRule(
+        "POST", "/creditos/preapproved/generate",
+        per_client=RateLimit(3, per_seconds=30 * 60), per_route=RateLimit(60, per_seconds=60),
+    ),
+]
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+# Solo si se usa: con RATE_LIMIT_REDIS_URL el backend crea el cliente de Redis
+rate_limit_backend = backend_from_env() if RATE_LIMIT_ENABLED else None
+
+# Máximo de consultas SQL por petición (plantilla de ruta). Con QUERY_COUNT_ENABLED=1
+# (desarrollo, CI y tests) se avisa en el log y los tests fallan si se pasan.
+QUERY_BUDGETS = {
+    "/admin/manage_credits": 3,
+    "/admin/manage_credits/pendientes": 3,
+    "/admin/manage_credits/aprovados": 3,
+    "/admin/manage_credits/negados": 3,
+    "/admin/manage_credits/aceptados": 3,
+    "/clientes/{cliente_id}/creditos": 3,
+    "/clientes/{cliente_id}/creditos/aceptado": 3,
+    "/clientes/{cliente_id}/creditos/aprobado": 3,
+    "/clientes/{cliente_id}/creditos/negado": 3,
+    "/clientes/{cliente_id}/creditos/pendiente": 3,
+}
+
+register(CounterSource("gemini_usage_total", "Llamadas y tokens de Gemini", "type", lambda: token_usage))
+register(
+    CounterSource(
+        "gemini_structured_output_total",
+        "Fallas y resultados de la reparación de salida estructurada",
+        "result",
+        lambda: repair_stats,
+    )
+)
+
+
+# Pool de BD, catálogo e índice, clientes de Gemini/RapidAPI; ver /health/ready
+warmup = Warmup(default_steps())
+# Base de datos, llaves de Gemini, circuito de RapidAPI; cacheado HEALTH_CACHE_SECONDS
+health = HealthCheck(default_probes(), warmup=warmup)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # En segundo plano: el worker acepta conexiones (liveness) mientras calienta
+    task = None
+    if os.getenv("WARMUP_ENABLED", "1") != "0":
+        task = asyncio.create_task(warmup.run())
+    else:
+        warmup.skip()
+    yield
+    if task is not None and not task.done():
+        task.cancel()
+    # Cerrar las conexiones keep-alive del cliente HTTP compartido
+    await close_rapidapi_client()
+    if rate_limit_backend is not None and hasattr(rate_limit_backend, "close"):
+        await rate_limit_backend.close()
+
 
 app = FastAPI(
     title="API de Créditos Verdes",
     description="CRUD completo para finanzas sustentables",
+    lifespan=lifespan,
 )
 
+if RATE_LIMIT_ENABLED:
+    # Se agrega antes que CORS para que los 429 también lleven los headers de CORS
+    app.add_middleware(RateLimitMiddleware, rules=RATE_LIMIT_RULES, backend=rate_limit_backend)
+
 # Enable CORS for frontend
 app.add_middleware(
     CORSMiddleware,
@@ -23,6 +109,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if os.getenv("QUERY_COUNT_ENABLED") == "1":
+    app.add_middleware(QueryCountMiddleware, budgets=QUERY_BUDGETS)
+
+if os.getenv("TELEMETRY_ENABLED", "1") != "0":
+    # Último en agregarse = más externo: mide también los 429 y el preflight de CORS
+    app.add_middleware(TelemetryMiddleware)
+
 app.include_router(cliente_router)
 app.include_router(item_router)
 app.include_router(admin_router)
@@ -35,6 +128,22 @@ app.include_router(gemini_router)
 async def root():
     return {"message": "API de Créditos Verdes", "status": "running", "docs": "/docs"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
+    """Estado de cada dependencia. Siempre 200: un worker sin base sigue vivo."""
+    return await health.report()
+
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness: el proceso responde (no revisa dependencias)."""
     return {"status": "healthy"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: 503 mientras calienta o si la base no responde."""
+    report = await health.report()
+    return JSONResponse(report, status_code=503 if report["status"] == "down" else 200)
@@ -0,0 +1,67 @@
+"""
+Entorno de Alembic. Reutiliza la URL y el contexto SSL de config.py para que las
+migraciones corran contra la misma base que la API.
+"""
+
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import pool
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+
+from config import DATABASE_URL, ssl_context
+
+# Importar todos los modelos para que SQLModel.metadata esté completo (autogenerate)
+from models.admin import Admin  # noqa: F401
+from models.cliente import Cliente  # noqa: F401
+from models.credito import Credito  # noqa: F401
+from models.item import Item  # noqa: F401
+from models.transacciones import Transaccion  # noqa: F401
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = SQLModel.metadata
+
+
+def run_migrations_offline() -> None:
+    """Genera el SQL sin conectarse (alembic upgrade head --sql)."""
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(connection=connection, target_metadata=target_metadata)
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    connect_args = {"ssl": ssl_context} if DATABASE_URL.startswith("postgresql+asyncpg") else {}
+    connectable = create_async_engine(
+        DATABASE_URL, poolclass=pool.NullPool, connect_args=connect_args
+    )
+
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await connectable.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_async_migrations())
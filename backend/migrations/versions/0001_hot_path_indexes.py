@@ -0,0 +1,79 @@
+"""Índices para los filtros calientes de transacciones y créditos
+
+Las tablas ya existen en producción; esta revisión solo agrega índices. Se crean con
+CONCURRENTLY (fuera de la transacción de la migración) para no bloquear escrituras.
+
+Revision ID: 0001_hot_path_indexes
+Revises:
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_hot_path_indexes"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OFERTA_APROBADA = sa.text("estado = 'APROBADO' AND oferta")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_transacciones_cliente_fecha",
+            "transacciones",
+            ["cliente_id", "fecha"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_creditos_cliente_estado_oferta",
+            "creditos",
+            ["cliente_id", "estado", "oferta"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_creditos_estado",
+            "creditos",
+            ["estado"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_creditos_fecha_inicio",
+            "creditos",
+            ["fecha_inicio"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_creditos_ofertas_aprobadas",
+            "creditos",
+            ["cliente_id"],
+            postgresql_where=OFERTA_APROBADA,
+            sqlite_where=OFERTA_APROBADA,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table in [
+            ("ix_creditos_ofertas_aprobadas", "creditos"),
+            ("ix_creditos_fecha_inicio", "creditos"),
+            ("ix_creditos_estado", "creditos"),
+            ("ix_creditos_cliente_estado_oferta", "creditos"),
+            ("ix_transacciones_cliente_fecha", "transacciones"),
+        ]:
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True, if_exists=True
+            )
@@ -0,0 +1,87 @@
+"""Búsqueda de texto completo en items: tsvector generado + GIN, y trigramas
+
+- Configuración es_unaccent: stemming en español sin acentos (panel = panél).
+- items.search_vector: columna generada (nombre pesa A, categoría pesa B) con índice GIN.
+- Índice GIN de trigramas sobre nombre para búsquedas parciales (ILIKE '%...%').
+
+Revision ID: 0002_items_fulltext_search
+Revises: 0001_hot_path_indexes
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_items_fulltext_search"
+down_revision: Union[str, Sequence[str], None] = "0001_hot_path_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('es_unaccent', coalesce(nombre, '')), 'A') || "
+    "setweight(to_tsvector('es_unaccent', coalesce(categoria, '')), 'B')"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_unaccent') THEN
+                CREATE TEXT SEARCH CONFIGURATION es_unaccent (COPY = spanish);
+                ALTER TEXT SEARCH CONFIGURATION es_unaccent
+                    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+            END IF;
+        END
+        $$
+        """
+    )
+    op.add_column(
+        "items",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(SEARCH_VECTOR_SQL, persisted=True),
+        ),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_items_search_vector",
+            "items",
+            ["search_vector"],
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_items_nombre_trgm",
+            "items",
+            ["nombre"],
+            postgresql_using="gin",
+            postgresql_ops={"nombre": "gin_trgm_ops"},
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_items_nombre_trgm", table_name="items",
+            postgresql_concurrently=True, if_exists=True,
+        )
+        op.drop_index(
+            "ix_items_search_vector", table_name="items",
+            postgresql_concurrently=True, if_exists=True,
+        )
+    op.drop_column("items", "search_vector")
+    op.execute("DROP TEXT SEARCH CONFIGURATION IF EXISTS es_unaccent")
@@ -0,0 +1,36 @@
+"""Versión compartida de la tabla items
+
+- items_version: una fila (id=1) con un contador que cada escritura en items incrementa
+  en su transacción. Los workers lo usan para saber si su caché de /items y su índice
+  de búsqueda local están atrasados (catalog/items_version.py).
+
+Revision ID: 0003_items_version
+Revises: 0002_items_fulltext_search
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_items_version"
+down_revision: Union[str, Sequence[str], None] = "0002_items_fulltext_search"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "items_version",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.execute("INSERT INTO items_version (id, version) VALUES (1, 0)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("items_version")
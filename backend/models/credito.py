@@ -1,5 +1,6 @@
 from typing import List, Optional
 from datetime import date
+from sqlalchemy import Index, text
 from sqlmodel import SQLModel, Field, Relationship
 
 
@@ -24,6 +25,22 @@ class CreditoBase(SQLModel):
 
 class Credito(CreditoBase, table=True):
     __tablename__ = "creditos"
+    # Índices para los filtros calientes (las migraciones viven en migrations/versions)
+    __table_args__ = (
+        # Créditos de un cliente por estado / oferta (/clientes/{id}/creditos/*, preaprobados)
+        Index("ix_creditos_cliente_estado_oferta", "cliente_id", "estado", "oferta"),
+        # Listados de admin por estado (/admin/manage_credits/*)
+        Index("ix_creditos_estado", "estado"),
+        # Orden de /creditos/todos
+        Index("ix_creditos_fecha_inicio", "fecha_inicio"),
+        # Ofertas preaprobadas vigentes: parcial, solo las filas que se consultan
+        Index(
+            "ix_creditos_ofertas_aprobadas",
+            "cliente_id",
+            postgresql_where=text("estado = 'APROBADO' AND oferta"),
+            sqlite_where=text("estado = 'APROBADO' AND oferta"),
+        ),
+    )
 
     # Tu schema usa id_cred, así que lo respetamos
     id_cred: Optional[int] = Field(default=None, primary_key=True)
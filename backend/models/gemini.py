@@ -1,11 +1,14 @@
 from pydantic import BaseModel
-from typing import Literal
+from typing import Literal, Optional
 
 
 class GeminiRequest(BaseModel):
     last_message: str
     conversation_context: str
     user_id: int
+    # "two_call": classify, then generate offers/answer (default)
+    # "single_pass": one structured call that classifies and answers/offers at once
+    mode: Literal["two_call", "single_pass"] = "two_call"
 
 
 class ChatResponseType(BaseModel):
@@ -25,6 +28,17 @@ class ProductData(BaseModel):
     categoria: str  # Main topics are "Agua", "Luz", "Gas", "Transporte"
 
 
+class ProductCategory(BaseModel):
+    """Categoría asignada por Gemini a un título de producto (por índice en el lote)"""
+
+    index: int
+    categoria: Literal["Agua", "Luz", "Gas", "Transporte"]
+
+
+class ProductCategories(BaseModel):
+    categorias: list[ProductCategory]
+
+
 class CreditOffer(BaseModel):
     prestamo: float
     interes: float
@@ -39,6 +53,38 @@ class CreditOffers(BaseModel):
     creditOffers: list[CreditOffer]
 
 
+class CreditOfferDraft(BaseModel):
+    """
+    What the model decides for an offer. prestamo, interes, plazo and the monthly
+    amounts are computed locally (chatUtils.synthesize_credit_offers).
+    """
+
+    descripcion: str
+    ahorro_porcentaje: float  # Expected reduction (0-100) of the category's monthly expense
+    product: ProductData
+
+
+class CreditOfferDrafts(BaseModel):
+    creditOffers: list[CreditOfferDraft]
+
+
+class ClientProfile(BaseModel):
+    """Client data used to compute offers locally: rate table and monthly payment"""
+
+    credit_score: Optional[float] = None
+    # Average monthly spend per category ("Luz", "Agua", "Gas", "Transporte"), last 12 months
+    gastos_mensuales: dict[str, float] = {}
+
+
+class ClassifiedCreditOffers(BaseModel):
+    """Single-pass output: classification plus either the text answer or the offer drafts"""
+
+    response_type: Literal["text", "credit"]
+    object_in_response: str
+    text_response: str
+    creditOffers: list[CreditOfferDraft]
+
+
 class ChatMessageResponse(BaseModel):
     """
     Response model when the message is of type 'credit' ro 'text'.
@@ -17,15 +17,35 @@ class Item(ItemBase, table=True):
     # Relación: Un item puede estar en muchos créditos
     creditos: List["Credito"] = Relationship(back_populates="item")
 
+class ItemsVersion(SQLModel, table=True):
+    """
+    Contador compartido de cambios en items (una sola fila, id=1). Cada escritura lo
+    incrementa en su misma transacción; los workers lo comparan para saber si su caché
+    de /items o su índice de búsqueda quedaron atrasados.
+    """
+    __tablename__ = "items_version"
+
+    id: int = Field(default=1, primary_key=True)
+    version: int = 0
+
 class ItemCreate(ItemBase):
     pass
 
 class ItemRead(ItemBase):
     id: int
 
+class ItemSearchHit(ItemRead):
+    rank: float
+
+class ItemSearchPage(SQLModel):
+    items: List[ItemSearchHit]
+    page: int
+    page_size: int
+    has_more: bool
+
 class ItemUpdate(SQLModel):
     nombre: Optional[str] = None
     precio: Optional[float] = None
     link: Optional[str] = None
     img_link: Optional[str] = None
-    categoria: Optional[str] = None
\ No newline at end of file
+    categoria: Optional[str] = None
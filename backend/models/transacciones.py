@@ -1,5 +1,6 @@
 from datetime import datetime
 from typing import List, Optional
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel, Relationship
 
 # -----------------
@@ -15,6 +16,10 @@ class TransaccionBase(SQLModel):
 
 class Transaccion(TransaccionBase, table=True):
     __tablename__ = "transacciones"
+    # Filtro caliente: transacciones de un cliente por rango de fecha (monthly_stats, contexto de Gemini)
+    __table_args__ = (
+        Index("ix_transacciones_cliente_fecha", "cliente_id", "fecha"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
 
@@ -4,16 +4,18 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from sqlmodel import select, or_
 
-from config import get_session
+from config import get_read_session, get_session
+from core.auth import ROLE_ADMIN, issue_token
+from core.passwords import hash_password_async, verify_missing_user, verify_password_async
 from models.admin import Admin, AdminCreate, AdminRead, AdminUpdate
 from models.credito import Credito, CreditoUpdate
-from models.cliente import Cliente
-from models.item import Item
+
+from .cliente import cargar_clientes_e_items
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
 @router.get("/manage_credits/aceptados")
-async def creditos_aceptados(session: AsyncSession = Depends(get_session)):
+async def creditos_aceptados(session: AsyncSession = Depends(get_read_session)):
     """Devuelve todos los créditos en estado ACEPTADO, con info de cliente e item relacionado."""
     statement = select(Credito).where(Credito.estado == "ACEPTADO")
     result = await session.execute(statement)
@@ -21,7 +23,7 @@ async def creditos_aceptados(session: AsyncSession = Depends(get_session)):
     return await build_creditos_response(creditos, session)()
 
 @router.get("/manage_credits")
-async def creditos_todos(session: AsyncSession = Depends(get_session)):
+async def creditos_todos(session: AsyncSession = Depends(get_read_session)):
     """Devuelve todos los créditos, con info de cliente e item relacionado."""
     statement = select(Credito)
     result = await session.execute(statement)
@@ -35,7 +37,9 @@ async def admin_signup(admin_in: AdminCreate, session: AsyncSession = Depends(ge
     existing = result.scalar_one_or_none()
     if existing:
         raise HTTPException(status_code=400, detail="Username already exists")
-    db_admin = Admin(**admin_in.dict())
+    admin_data = admin_in.dict()
+    admin_data["pwd"] = await hash_password_async(admin_in.pwd)
+    db_admin = Admin(**admin_data)
     session.add(db_admin)
     await session.commit()
     await session.refresh(db_admin)
@@ -56,6 +60,7 @@ async def create_admin(
     """Crea un nuevo administrador."""
     
     admin_data = admin_in.dict()
+    admin_data["pwd"] = await hash_password_async(admin_in.pwd)
     
     db_admin = Admin(**admin_data)
     
@@ -65,18 +70,32 @@ async def create_admin(
     return db_admin
 
 
-@router.post("/login", response_model=AdminRead)
+class AdminLoginResponse(AdminRead):
+    access_token: str
+    token_type: str = "bearer"
+
+
+@router.post("/login", response_model=AdminLoginResponse)
 async def admin_login(
     login: AdminLogin, session: AsyncSession = Depends(get_session)
 ):
-    statement = select(Admin).where(
-        Admin.username == login.username, Admin.pwd == login.pwd
-    )
+    statement = select(Admin).where(Admin.username == login.username)
     result = await session.execute(statement)
     admin = result.scalar_one_or_none()
-    if not admin:
+    if admin:
+        verification = await verify_password_async(login.pwd, admin.pwd)
+    else:
+        verification = await verify_missing_user(login.pwd)
+    if not verification.ok:
         raise HTTPException(status_code=401, detail="Usuario o contraseña incorrectos")
-    return admin
+    if verification.needs_rehash:
+        # Fila con contraseña en texto plano (o parámetros viejos): se migra al hash ya
+        admin.pwd = await hash_password_async(login.pwd)
+        await session.commit()
+    return AdminLoginResponse(
+        **AdminRead.model_validate(admin).model_dump(),
+        access_token=issue_token(admin.id_admin, ROLE_ADMIN),
+    )
 
 @router.get("/", response_model=List[AdminRead], tags=["Admins"])
 async def read_admins(
@@ -110,6 +129,8 @@ async def update_admin(
         raise HTTPException(status_code=44, detail="Admin no encontrado")
     
     update_data = admin_in.dict(exclude_unset=True)
+    if update_data.get("pwd"):
+        update_data["pwd"] = await hash_password_async(update_data["pwd"])
     for key, value in update_data.items():
         setattr(db_admin, key, value)
     
@@ -191,10 +212,11 @@ async def aceptar_credito(
 def build_creditos_response(creditos, session):
     # Helper para armar la respuesta con info de cliente e item
     async def build():
+        clientes, items = await cargar_clientes_e_items(creditos, session)
         response = []
         for credito in creditos:
-            cliente = await session.get(Cliente, credito.cliente_id)
-            item = await session.get(Item, credito.item_id) if credito.item_id else None
+            cliente = clientes.get(credito.cliente_id)
+            item = items.get(credito.item_id) if credito.item_id else None
             response.append({
                 "credito": {
                     "id_cred": credito.id_cred,
@@ -225,7 +247,7 @@ def build_creditos_response(creditos, session):
     return build
 
 @router.get("/manage_credits/pendientes")
-async def creditos_pendientes(session: AsyncSession = Depends(get_session)):
+async def creditos_pendientes(session: AsyncSession = Depends(get_read_session)):
     """Devuelve todos los créditos en estado PENDIENTE, con info de cliente e item relacionado."""
     statement = select(Credito).where(Credito.estado == "PENDIENTE")
     result = await session.execute(statement)
@@ -233,7 +255,7 @@ async def creditos_pendientes(session: AsyncSession = Depends(get_session)):
     return await build_creditos_response(creditos, session)()
 
 @router.get("/manage_credits/aprovados")
-async def creditos_aprovados(session: AsyncSession = Depends(get_session)):
+async def creditos_aprovados(session: AsyncSession = Depends(get_read_session)):
     """Devuelve todos los créditos en estado APROBADO, con info de cliente e item relacionado."""
     statement = select(Credito).where(Credito.estado == "APROBADO")
     result = await session.execute(statement)
@@ -241,7 +263,7 @@ async def creditos_aprovados(session: AsyncSession = Depends(get_session)):
     return await build_creditos_response(creditos, session)()
 
 @router.get("/manage_credits/negados")
-async def creditos_negados(session: AsyncSession = Depends(get_session)):
+async def creditos_negados(session: AsyncSession = Depends(get_read_session)):
     """Devuelve todos los créditos en estado NEGADO, con info de cliente e item relacionado."""
     statement = select(Credito).where(Credito.estado == "NEGADO")
     result = await session.execute(statement)
@@ -1,14 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 from sqlmodel import select, or_
 from datetime import date, datetime, timedelta
 from pydantic import BaseModel
 
-from config import get_session
+from config import get_read_session, get_session
+from core.auth import ROLE_CLIENTE, get_current_cliente, invalidate_principal, issue_token
+from core.passwords import hash_password_async, verify_missing_user, verify_password_async
 from models.cliente import Cliente, ClienteCreate, ClienteRead, ClienteUpdate
 from models.transacciones import Transaccion, TransaccionRead
 from models.credito import Credito
+from models.gemini import ClientProfile
 from models.item import Item
 
 router = APIRouter(prefix="/clientes", tags=["Clientes"])
@@ -88,9 +91,27 @@ async def get_average_monthly_expenses(transactions: List[Transaccion]):
     return response
 
 
+async def get_client_profile(
+    cliente_id: int, session: AsyncSession, user: Optional[Cliente] = None
+) -> ClientProfile:
+    """
+    Perfil con el que se calculan tasa y pagos de las ofertas: credit score guardado del
+    cliente y gasto mensual promedio por categoría de los últimos 12 meses (los mismos
+    números que /monthly_stats). Nunca se toma del cliente HTTP.
+    """
+    if user is None:
+        user = await session.get(Cliente, cliente_id)
+    transactions = await get_12months_transactions(cliente_id, session)
+    expenses = await get_average_monthly_expenses(transactions)
+    return ClientProfile(
+        credit_score=user.credit_score if user else None,
+        gastos_mensuales={categoria: data["average"] for categoria, data in expenses.items()},
+    )
+
+
 @router.get("/{cliente_id}/monthly_stats", tags=["Transacciones"])
 async def get_monthly_stats(
-    cliente_id: int, session: AsyncSession = Depends(get_session)
+    cliente_id: int, session: AsyncSession = Depends(get_read_session)
 ):
     transactions = await get_12months_transactions(cliente_id, session)
     average_monthly_expenses = await get_average_monthly_expenses(transactions)
@@ -191,12 +212,27 @@ async def negar_credito_cliente(
     return {"ok": True, "id_cred": credito.id_cred, "nuevo_estado": credito.estado}
 
 
+async def cargar_clientes_e_items(creditos, session):
+    """Clientes e items de una lista de créditos en dos consultas (no dos por crédito)."""
+    cliente_ids = {credito.cliente_id for credito in creditos}
+    item_ids = {credito.item_id for credito in creditos if credito.item_id}
+    clientes, items = {}, {}
+    if cliente_ids:
+        result = await session.execute(select(Cliente).where(Cliente.id.in_(cliente_ids)))
+        clientes = {cliente.id: cliente for cliente in result.scalars()}
+    if item_ids:
+        result = await session.execute(select(Item).where(Item.id.in_(item_ids)))
+        items = {item.id: item for item in result.scalars()}
+    return clientes, items
+
+
 # Helper para armar la respuesta de créditos
 async def build_creditos_response(creditos, session):
+    clientes, items = await cargar_clientes_e_items(creditos, session)
     response = []
     for credito in creditos:
-        cliente = await session.get(Cliente, credito.cliente_id)
-        item = await session.get(Item, credito.item_id) if credito.item_id else None
+        cliente = clientes.get(credito.cliente_id)
+        item = items.get(credito.item_id) if credito.item_id else None
         response.append(
             {
                 "credito": {
@@ -322,6 +358,7 @@ async def cliente_signup(
     )
     cliente_data = cliente_in.dict()
     cliente_data["edad"] = edad
+    cliente_data["pwd"] = await hash_password_async(cliente_in.pwd)
     db_cliente = Cliente(**cliente_data)
     session.add(db_cliente)
     await session.commit()
@@ -335,18 +372,32 @@ class ClienteLogin(BaseModel):
     pwd: str
 
 
-@router.post("/login", response_model=ClienteRead)
+class ClienteLoginResponse(ClienteRead):
+    access_token: str
+    token_type: str = "bearer"
+
+
+@router.post("/login", response_model=ClienteLoginResponse)
 async def cliente_login(
     login: ClienteLogin, session: AsyncSession = Depends(get_session)
 ):
-    statement = select(Cliente).where(
-        Cliente.username == login.username, Cliente.pwd == login.pwd
-    )
+    statement = select(Cliente).where(Cliente.username == login.username)
     result = await session.execute(statement)
     cliente = result.scalar_one_or_none()
-    if not cliente:
+    if cliente:
+        verification = await verify_password_async(login.pwd, cliente.pwd)
+    else:
+        verification = await verify_missing_user(login.pwd)
+    if not verification.ok:
         raise HTTPException(status_code=401, detail="Usuario o contraseña incorrectos")
-    return cliente
+    if verification.needs_rehash:
+        # Fila con contraseña en texto plano (o parámetros viejos): se migra al hash ya
+        cliente.pwd = await hash_password_async(login.pwd)
+        await session.commit()
+    return ClienteLoginResponse(
+        **ClienteRead.model_validate(cliente).model_dump(),
+        access_token=issue_token(cliente.id, ROLE_CLIENTE),
+    )
 
 
 @router.post("/", response_model=ClienteRead)
@@ -361,6 +412,7 @@ async def create_cliente(
         raise HTTPException(status_code=400, detail="Username already exists")
 
     cliente_data = cliente_in.dict()
+    cliente_data["pwd"] = await hash_password_async(cliente_in.pwd)
     db_cliente = Cliente(**cliente_data)
     session.add(db_cliente)
     await session.commit()
@@ -377,6 +429,12 @@ async def read_clientes(
     return result.scalars().all()
 
 
+@router.get("/me", response_model=ClienteRead)
+async def read_current_cliente(cliente: ClienteRead = Depends(get_current_cliente)):
+    """Cliente dueño del token (`Authorization: Bearer <access_token>` del login)."""
+    return cliente
+
+
 @router.get("/{cliente_id}", response_model=ClienteRead)
 async def read_cliente(cliente_id: int, session: AsyncSession = Depends(get_session)):
     db_cliente = await session.get(Cliente, cliente_id)
@@ -399,6 +457,7 @@ async def update_cliente(
         setattr(db_cliente, key, value)
     session.add(db_cliente)
     await session.commit()
+    invalidate_principal(ROLE_CLIENTE, cliente_id)
     await session.refresh(db_cliente)
     return db_cliente
 
@@ -410,13 +469,14 @@ async def delete_cliente(cliente_id: int, session: AsyncSession = Depends(get_se
         raise HTTPException(status_code=404, detail="Cliente no encontrado")
     await session.delete(db_cliente)
     await session.commit()
+    invalidate_principal(ROLE_CLIENTE, cliente_id)
     return {"ok": True, "detail": "Cliente eliminado"}
 
 
 # Endpoint para obtener todas las transacciones de un cliente
 @router.get("/{cliente_id}/transacciones", response_model=List[TransaccionRead])
 async def get_transacciones_cliente(
-    cliente_id: int, session: AsyncSession = Depends(get_session)
+    cliente_id: int, session: AsyncSession = Depends(get_read_session)
 ):
     """Devuelve todas las transacciones correspondientes a un cliente específico."""
     statement = select(Transaccion).where(Transaccion.cliente_id == cliente_id)
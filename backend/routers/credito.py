@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from sqlmodel import select
+from datetime import datetime
+import asyncio
+import logging
 import random
 
 from models.gemini import CreditOffers, ProductData, CreditOffer
-from config import get_session
+from config import get_read_session, get_session
 from models.credito import (
     Credito,
     CreditoCreate,
@@ -21,7 +25,17 @@ from pydantic import BaseModel
 # Import from gemini module
 from gemini.chatUtils import create_credit_offers
 
+from catalog.items_version import bump_items_version
+from catalog.search_index import product_index
+from core.auth import ROLE_CLIENTE, invalidate_principal
+from core.http_cache import items_cache
+from core.telemetry import annotate
+
+from .cliente import get_client_profile
+from .transacciones import debitar_saldo
+
 router = APIRouter(prefix="/creditos", tags=["Creditos"])
+logger = logging.getLogger(__name__)
 
 
 # Endpoint para pagar parte de un crédito
@@ -31,78 +45,74 @@ class PagoCreditoRequest(BaseModel):
     monto: float
 
 
-@router.post("/pagar")
-async def pagar_credito(
-    pago: PagoCreditoRequest, session: AsyncSession = Depends(get_session)
-):
+async def diagnosticar_pago_rechazado(pago: PagoCreditoRequest, session: AsyncSession):
     """
-    Permite a un cliente pagar parte de un crédito.
-    Valida que el cliente tenga saldo suficiente y que no pague más de lo que debe.
-    Devuelve el crédito y el cliente actualizados.
+    Explica por qué no se aplicó un pago, con las mismas reglas y el mismo orden
+    que la validación original. Solo se llama en el camino de error.
     """
-    print("1")
-    # Obtener crédito
     credito = await session.get(Credito, pago.credito_id)
     if not credito or credito.cliente_id != pago.cliente_id:
         raise HTTPException(
             status_code=404, detail="Crédito no encontrado para este cliente"
         )
-    # Obtener cliente
     cliente = await session.get(Cliente, pago.cliente_id)
     if not cliente:
-        print("2")
         raise HTTPException(status_code=404, detail="Cliente no encontrado")
-    # Validar monto
-    print("3")
-    if pago.monto <= 0:
-        print("4")
-        raise HTTPException(status_code=400, detail="El monto debe ser mayor a cero")
     if cliente.saldo < pago.monto:
-        print("5")
         raise HTTPException(status_code=400, detail="Fondos insuficientes")
-    print("6")
-    monto_restante = credito.prestamo - credito.pagado
-    if pago.monto > monto_restante:
-        print("7")
-        raise HTTPException(
-            status_code=400, detail="No puedes pagar más de lo que debes del crédito"
-        )
-    # Realizar pago
-    print("8")
-    # Usar SQL directo para evitar deadlocks ORM
-    from sqlalchemy import update
-
-    print("9")
-    await session.execute(
-        update(Cliente)
-        .where(Cliente.id == pago.cliente_id)
-        .values(saldo=cliente.saldo - pago.monto)
+    raise HTTPException(
+        status_code=400, detail="No puedes pagar más de lo que debes del crédito"
     )
-    await session.execute(
-        update(Credito)
-        .where(Credito.id_cred == pago.credito_id)
-        .values(pagado=credito.pagado + pago.monto)
-    )
-    print("10")
 
 
+@router.post("/pagar")
+async def pagar_credito(
+    pago: PagoCreditoRequest, session: AsyncSession = Depends(get_session)
+):
+    """
+    Permite a un cliente pagar parte de un crédito.
+    Valida que el cliente tenga saldo suficiente y que no pague más de lo que debe.
+    Devuelve el crédito y el cliente actualizados.
+
+    Ambas validaciones van dentro de UPDATEs condicionales con RETURNING, en una sola
+    transacción: si alguno no afecta filas se hace rollback y se diagnostica el error.
+    """
+    annotate(credito_id=pago.credito_id, cliente_id=pago.cliente_id, monto=pago.monto)
+    if pago.monto <= 0:
+        raise HTTPException(status_code=400, detail="El monto debe ser mayor a cero")
+
+    cliente = await debitar_saldo(session, pago.cliente_id, pago.monto)
+    credito = None
+    if cliente is not None:
+        result = await session.execute(
+            update(Credito)
+            .where(
+                Credito.id_cred == pago.credito_id,
+                Credito.cliente_id == pago.cliente_id,
+                Credito.pagado + pago.monto <= Credito.prestamo,
+            )
+            .values(pagado=Credito.pagado + pago.monto)
+            .returning(Credito)
+            .execution_options(populate_existing=True)
+        )
+        credito = result.scalar_one_or_none()
+    if credito is None:
+        await session.rollback()
+        await diagnosticar_pago_rechazado(pago, session)
+
     # Crear transacción de pago con fecha actual
-    from datetime import datetime
-    nueva_transaccion = Transaccion(
-        cliente_id=pago.cliente_id,
-        monto=pago.monto,
-        categoria="Credito Verde",
-        descripcion=f"Pago realizado al crédito #{pago.credito_id}",
-        fecha=datetime.utcnow(),
+    await session.execute(
+        insert(Transaccion).values(
+            cliente_id=pago.cliente_id,
+            monto=pago.monto,
+            categoria="Credito Verde",
+            descripcion=f"Pago realizado al crédito #{pago.credito_id}",
+            fecha=datetime.utcnow(),
+        )
     )
-    session.add(nueva_transaccion)
-
     await session.commit()
-    print("11")
-    # Refrescar desde base de datos
-    cliente = await session.get(Cliente, pago.cliente_id)
-    credito = await session.get(Credito, pago.credito_id)
-    print("12")
+    invalidate_principal(ROLE_CLIENTE, pago.cliente_id)
+
     return {
         "credito": CreditoRead.model_validate(credito).model_dump(),
         "cliente": ClienteRead.model_validate(cliente).model_dump(),
@@ -140,7 +150,7 @@ async def create_credito(
 
 @router.get("/", response_model=List[CreditoRead], tags=["Creditos"])
 async def read_creditos(
-    skip: int = 0, limit: int = 100, session: AsyncSession = Depends(get_session)
+    skip: int = 0, limit: int = 100, session: AsyncSession = Depends(get_read_session)
 ):
     """Lee una lista de créditos."""
     statement = select(Credito).offset(skip).limit(limit)
@@ -151,7 +161,7 @@ async def read_creditos(
 
 @router.get("/todos", response_model=List[CreditoConNombreCliente], tags=["Creditos"])
 async def get_all_creditos_with_client_info(
-    skip: int = 0, limit: int = 100, session: AsyncSession = Depends(get_session)
+    skip: int = 0, limit: int = 100, session: AsyncSession = Depends(get_read_session)
 ):
     """
     Obtiene todos los créditos con información del cmeliente (nombre, apellido, credit_score).
@@ -258,7 +268,7 @@ async def generate_preapproved_credit(
     - If they have 1 pre-approved credit: generate 1 new offer
     - If they have 2+ pre-approved credits: do not generate new offers (return error)
 
-    30 minutes rate limiting is checked on frontend!
+    Rate limiting is enforced server-side on /creditos/preapproved/generate (see main.RATE_LIMIT_RULES).
 
     These offers only use one of previously defined products in the database, such as solar panels or electric cars.
 
@@ -339,7 +349,9 @@ async def generate_preapproved_credit(
 
     # Use Gemini to generate credit offers
     credit_offers = create_credit_offers(
-        conversation_context, num_offers=num_offers_to_generate
+        conversation_context,
+        num_offers=num_offers_to_generate,
+        profile=await get_client_profile(cliente_id, session, user),
     )
 
     return credit_offers
@@ -352,6 +364,9 @@ class PreapprovedContextResponse(BaseModel):
 
 
 class GenerateCreditOffersRequest(BaseModel):
+    # El perfil (credit score y gasto mensual) con el que se calcula la tasa se arma
+    # en el servidor a partir de cliente_id; nunca se acepta del cuerpo de la petición
+    cliente_id: int
     conversation_context: str
     num_offers_to_generate: int
 
@@ -459,14 +474,27 @@ async def get_preapproved_context(
 
 
 @router.post("/preapproved/generate", response_model=CreditOffers)
-async def generate_credit_offers_endpoint(request: GenerateCreditOffersRequest):
+async def generate_credit_offers_endpoint(
+    request: GenerateCreditOffersRequest,
+    session: AsyncSession = Depends(get_read_session),
+):
     """
     Step 2: Generate credit offers using Gemini AI.
     Takes the conversation context and number of offers to generate,
-    and returns the AI-generated credit offers.
+    and returns the AI-generated credit offers. Rates and payments are computed
+    from the client's stored profile, looked up by cliente_id.
     """
-    credit_offers = create_credit_offers(
-        request.conversation_context, num_offers=request.num_offers_to_generate
+    user = await session.get(Cliente, request.cliente_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    profile = await get_client_profile(request.cliente_id, session, user)
+
+    # La llamada a Gemini es bloqueante: en un hilo, para no frenar el event loop
+    credit_offers = await asyncio.to_thread(
+        create_credit_offers,
+        request.conversation_context,
+        num_offers=request.num_offers_to_generate,
+        profile=profile,
     )
 
     return credit_offers
@@ -486,6 +514,7 @@ async def save_preapproved_credits(
         raise HTTPException(status_code=404, detail="User not found")
 
     created_credits = []
+    new_items = []
 
     # Store each generated offer in the database
     for offer in request.credit_offers.creditOffers:
@@ -513,6 +542,7 @@ async def save_preapproved_credits(
             session.add(new_item)
             await session.flush()  # Flush to get the ID
             item_id = new_item.id
+            new_items.append(new_item)
 
         # Create a new Credito record with estado="APROBADO"
         new_credito = Credito(
@@ -534,7 +564,12 @@ async def save_preapproved_credits(
         await session.flush()
         created_credits.append(new_credito.id_cred)
 
+    version = await bump_items_version(session) if new_items else None
     await session.commit()
+    # Pudieron crearse items nuevos: el listado cacheado de /items ya no es válido
+    items_cache.invalidate()
+    for item in new_items:
+        product_index.upsert_item(item, version)
 
     return {
         "message": "Credit offers saved successfully",
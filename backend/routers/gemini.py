@@ -1,22 +1,37 @@
 from fastapi import APIRouter, Depends
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 from models.gemini import ProductData
-from config import get_session
+from config import get_read_session_factory, get_session
 from models.cliente import Cliente
 from models.transacciones import Transaccion
 from models.gemini import ChatMessageResponse, GeminiRequest
 
 # Import from gemini module
-from gemini.chatUtils import create_credit_offers, determine_response_type
-from gemini.baseGeminiQueries import gemini_basic_response
+from gemini.chatUtils import (
+    TEXT_ASSISTANT_CONTEXT,
+    classify_and_create_offers,
+    create_credit_offers,
+    determine_response_type,
+)
+from gemini.baseGeminiQueries import gemini_basic_response, gemini_stream_response
+from catalog.product_catalog import load_product_catalog
+import asyncio
+import json
+import logging
 import os
+import time
 
 # Import from .products
 from .products import search_products
+from .cliente import get_client_profile
 
 router = APIRouter(prefix="/gemini", tags=["Gemini"])
 
+logger = logging.getLogger(__name__)
+
 
 async def get_conversation_context(
     request: GeminiRequest,
@@ -74,99 +89,319 @@ async def get_conversation_context_endpoint(
 
 
 
+def gemini_api_keys() -> list[str]:
+    """All configured GEMINI_API_KEYs, in the order they should be tried."""
+    keys = [
+        os.getenv("GEMINI_API_KEY"),
+        os.getenv("GEMINI_API_KEY_2"),
+        os.getenv("GEMINI_API_KEY_3"),
+        os.getenv("GEMINI_API_KEY_4"),
+    ]
+    return [k for k in keys if k]
+
+
+class StageTrace:
+    """
+    Start/end of each pipeline stage relative to the start of the request. The log line
+    compares wall time (critical path) against the sum of the stages (what a strictly
+    sequential pipeline would take).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.t0 = time.perf_counter()
+        self.stages: dict[str, tuple[float, float, str]] = {}
+
+    async def run(self, stage: str, awaitable):
+        start = time.perf_counter() - self.t0
+        status = "ok"
+        try:
+            return await awaitable
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            self.stages[stage] = (start, time.perf_counter() - self.t0, status)
+
+    def summary(self) -> dict:
+        wall = time.perf_counter() - self.t0
+        return {
+            "wall_ms": round(wall * 1000, 1),
+            "sequential_ms": round(sum(end - start for start, end, _ in self.stages.values()) * 1000, 1),
+            "stages": {
+                stage: {"start_ms": round(start * 1000, 1), "end_ms": round(end * 1000, 1), "status": status}
+                for stage, (start, end, status) in self.stages.items()
+            },
+        }
+
+    def log(self) -> None:
+        logger.info("%s trace: %s", self.name, json.dumps(self.summary()))
+
+
+async def cancel_speculative(task: asyncio.Task) -> None:
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+def start_context_prefetch(
+    request: GeminiRequest, session_factory, trace: StageTrace
+) -> asyncio.Task:
+    """
+    Speculatively builds the credit-offer context (catalog + user data and transactions)
+    and the client's profile while the message is still being classified. The task
+    returns (context, profile) and is cancelled if the message is 'text'.
+
+    The task opens its own session from session_factory: if it is cancelled mid-query
+    only that session is closed, and no other caller (e.g. the next attempt of the key
+    rotation) ever reuses it.
+    """
+
+    async def fetch_context():
+        products = await trace.run("catalog", asyncio.to_thread(load_product_catalog))
+        async with session_factory() as session:
+            context = await trace.run(
+                "context", get_conversation_context(request, session, list(products))
+            )
+            profile = await trace.run("profile", get_client_profile(request.user_id, session))
+        return context, profile
+
+    return asyncio.create_task(fetch_context())
+
+
+async def build_credit_response(
+    product_query: str, context_task: asyncio.Task, trace: StageTrace
+) -> ChatMessageResponse:
+    conv_context, profile = await context_task
+    offers = await trace.run(
+        "offers", asyncio.to_thread(create_credit_offers, conv_context, profile=profile)
+    )
+    return {
+        "response_type": "credit",
+        "object_in_response": product_query,
+        "creditOffers": offers,
+    }
+
+
+def text_response(request: GeminiRequest, gemini_api_key=None) -> str:
+    # Pass the API key to gemini_basic_response if supported, else set it globally
+    if gemini_api_key:
+        # Try to pass the key if the function supports it
+        try:
+            return gemini_basic_response(TEXT_ASSISTANT_CONTEXT + request.last_message, api_key=gemini_api_key)
+        except TypeError:
+            # Fallback: set env var for the API key
+            os.environ["GEMINI_API_KEY"] = gemini_api_key
+            return gemini_basic_response(TEXT_ASSISTANT_CONTEXT + request.last_message)
+    return gemini_basic_response(TEXT_ASSISTANT_CONTEXT + request.last_message)
+
+
 async def process_message(
-    request: GeminiRequest, session: AsyncSession, gemini_api_key=None
+    request: GeminiRequest, session_factory, gemini_api_key=None
 ) -> ChatMessageResponse:
     """
     Processes a user message by determining its type and responding appropriately.
     If type is 'text', returns a Gemini response.
     If type is 'credit', searches for related products and returns the first 3.
-    Accepts an optional gemini_api_key to use for Gemini API calls.
-    """
-    response_type_data = determine_response_type(request.last_message)
-    if response_type_data["response_type"] == "credit":
-        import json
-        product_query = response_type_data["object_in_response"]
-        backend_dir = os.path.dirname(os.path.abspath(__file__))
-        product_list_path = os.path.join(backend_dir, "../productList.json")
-        with open(product_list_path, "r", encoding="utf-8") as f:
-            all_products = json.load(f)
-        products = all_products
-        conv_context = await get_conversation_context(request, session, products)
-        offers = create_credit_offers(conv_context)
-        return {
-            "response_type": "credit",
-            "object_in_response": product_query,
-            "creditOffers": offers,
-        }
-    else:
-        context = """
-        CONTEXT:
-        You are an expert environmental and sustainable finance assistant. Your role is to provide accurate, helpful information about:
-        - Environmental sustainability and eco-friendly practices
-        - Green products and technologies (solar panels, electric vehicles, energy-efficient appliances, water-saving devices, etc.)
-        - Sustainable finance and green credits
-        - Carbon footprint reduction strategies
-        - Renewable energy and conservation methods
-        - Climate change mitigation and environmental impact
-        
-        GUIDELINES:
-        - Provide clear, concise, and actionable information
-        - Be professional, respectful, and encouraging
-        - Focus on practical solutions and benefits
-        - If a question is not related to environmental or sustainability topics, politely redirect the conversation back to these areas
-        - Use accessible language that users can understand
-        
-        ------
-        USER MESSAGE:
-        """
-        # Pass the API key to gemini_basic_response if supported, else set it globally
-        if gemini_api_key:
-            # Try to pass the key if the function supports it
-            try:
-                gemini_response = gemini_basic_response(context + request.last_message, api_key=gemini_api_key)
-            except TypeError:
-                # Fallback: set env var for the API key
-                os.environ["GEMINI_API_KEY"] = gemini_api_key
-                gemini_response = gemini_basic_response(context + request.last_message)
-        else:
-            gemini_response = gemini_basic_response(context + request.last_message)
+    Accepts an optional gemini_api_key to use for Gemini API calls. session_factory
+    (config.open_read_session, or a sessionmaker) opens the session the context uses.
+
+    Runs as a small DAG: classification (LLM) and the offer context (catalog + DB) start
+    together; only the offers call waits for both. The context is discarded if the
+    message turns out to be 'text'.
+
+    With request.mode == "single_pass" the context is built first and a single
+    structured call classifies and answers/generates offers (see
+    chatUtils.classify_and_create_offers).
+    """
+    trace = StageTrace("process_message")
+    context_task = start_context_prefetch(request, session_factory, trace)
+    try:
+        if request.mode == "single_pass":
+            # One call for everything, so it needs the context up front
+            conv_context, profile = await context_task
+            return await trace.run(
+                "classify_and_offer",
+                asyncio.to_thread(
+                    classify_and_create_offers,
+                    request.last_message,
+                    conv_context,
+                    api_key=gemini_api_key,
+                    profile=profile,
+                ),
+            )
+        response_type_data = await trace.run(
+            "classify", asyncio.to_thread(determine_response_type, request.last_message)
+        )
+        if response_type_data.get("response_type") == "credit":
+            return await build_credit_response(
+                response_type_data["object_in_response"], context_task, trace
+            )
+        await cancel_speculative(context_task)
+        if "error" in response_type_data:
+            return response_type_data
+        gemini_response = await trace.run(
+            "text", asyncio.to_thread(text_response, request, gemini_api_key)
+        )
         return {"response_type": "text", "text_response": gemini_response}
+    finally:
+        if not context_task.done():
+            await cancel_speculative(context_task)
+        trace.log()
 
 
+async def with_key_rotation(call, keys: list[str]):
+    """
+    Awaits call(key) with each Gemini API key in order until one returns a response
+    without an error; if all fail, returns the last error. /process and the single_pass
+    mode of /process/stream share it, so one exhausted key never fails the request.
+    """
+    last_error = None
+    for key in keys:
+        try:
+            response = await call(key)
+        except Exception as e:
+            last_error = {"error": str(e)}
+            continue
+        # Check for error in response (customize this check as needed)
+        if isinstance(response, dict) and ("error" in response or "Error" in response):
+            last_error = response
+            continue
+        return response
+    return last_error or {"error": "All Gemini API keys failed."}
+
 
 @router.post("/process")
 async def process_message_endpoint(
-    request: GeminiRequest, session: AsyncSession = Depends(get_session)
+    request: GeminiRequest, session_factory=Depends(get_read_session_factory)
 ):
     """
     Endpoint that receives a user message and:
     - Tries all available Gemini API keys in order until one succeeds (does not return error)
     - If all fail, returns an error
     """
-    # Gather all GEMINI_API_KEYs from environment
-    keys = [
-        os.getenv("GEMINI_API_KEY"),
-        os.getenv("GEMINI_API_KEY_2"),
-        os.getenv("GEMINI_API_KEY_3"),
-        os.getenv("GEMINI_API_KEY_4"),
-    ]
-    keys = [k for k in keys if k]
+    return await with_key_rotation(
+        lambda key: process_message(request, session_factory, gemini_api_key=key), gemini_api_keys()
+    )
+
+
+def sse_event(event: str, data) -> str:
+    payload = json.dumps(jsonable_encoder(data), ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+_STREAM_END = object()
+
+
+async def stream_text_chunks(prompt: str, keys: list[str]):
+    """
+    Forwards Gemini's streamed chunks, iterating the blocking SDK generator in a worker
+    thread. Keys are tried in order until one produces its first chunk; after that an
+    error can no longer switch keys (the user already saw part of the answer).
+    """
     last_error = None
     for key in keys:
+        chunks = gemini_stream_response(prompt, api_key=key)
         try:
-            response = await process_message(request, session, gemini_api_key=key)
-            # Check for error in response (customize this check as needed)
-            if (
-                isinstance(response, dict)
-                and ("error" in response or "Error" in response)
-            ):
-                last_error = response
-                continue
-            # If response looks valid, return it
-            return response
+            first = await asyncio.to_thread(next, chunks, _STREAM_END)
         except Exception as e:
-            last_error = {"error": str(e)}
+            last_error = e
             continue
-    # If all keys fail
-    return last_error or {"error": "All Gemini API keys failed."}
+        chunk = first
+        while chunk is not _STREAM_END:
+            yield chunk
+            chunk = await asyncio.to_thread(next, chunks, _STREAM_END)
+        return
+    raise RuntimeError(str(last_error) if last_error else "All Gemini API keys failed.")
+
+
+@router.post("/process/stream")
+async def process_message_stream_endpoint(
+    request: GeminiRequest, session_factory=Depends(get_read_session_factory)
+):
+    """
+    Streaming version of /gemini/process over Server-Sent Events.
+
+    Events, in order:
+    - `classification`: {"response_type", "object_in_response"} as soon as it's known
+    - 'text' messages: one `token` event per chunk ({"text": ...})
+    - 'credit' messages: one `offers` event with the same body as /gemini/process
+    - `done`: the full response (same shape as /gemini/process), or `error`: {"error"}
+    """
+    keys = gemini_api_keys()
+
+    async def events():
+        trace = StageTrace("process_message_stream")
+        context_task = start_context_prefetch(request, session_factory, trace)
+        try:
+            if request.mode == "single_pass":
+                # No token streaming here: the structured response arrives all at once
+                conv_context, profile = await context_task
+                response = await with_key_rotation(
+                    lambda key: trace.run(
+                        "classify_and_offer",
+                        asyncio.to_thread(
+                            classify_and_create_offers,
+                            request.last_message,
+                            conv_context,
+                            api_key=key,
+                            profile=profile,
+                        ),
+                    ),
+                    keys,
+                )
+                if "error" in response:
+                    yield sse_event("error", response)
+                    return
+                yield sse_event(
+                    "classification",
+                    {
+                        "response_type": response["response_type"],
+                        "object_in_response": response.get("object_in_response", ""),
+                    },
+                )
+                if response["response_type"] == "credit":
+                    yield sse_event("offers", response)
+                else:
+                    yield sse_event("token", {"text": response["text_response"]})
+                yield sse_event("done", response)
+                return
+
+            response_type_data = await trace.run(
+                "classify", asyncio.to_thread(determine_response_type, request.last_message)
+            )
+            if "error" in response_type_data:
+                yield sse_event("error", response_type_data)
+                return
+            yield sse_event("classification", response_type_data)
+
+            if response_type_data["response_type"] == "credit":
+                response = await build_credit_response(
+                    response_type_data["object_in_response"], context_task, trace
+                )
+                yield sse_event("offers", response)
+                yield sse_event("done", response)
+                return
+            await cancel_speculative(context_task)
+
+            parts = []
+            async for chunk in stream_text_chunks(
+                TEXT_ASSISTANT_CONTEXT + request.last_message, keys
+            ):
+                parts.append(chunk)
+                yield sse_event("token", {"text": chunk})
+            yield sse_event("done", {"response_type": "text", "text_response": "".join(parts)})
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+        finally:
+            if not context_task.done():
+                await cancel_speculative(context_task)
+            trace.log()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
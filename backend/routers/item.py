@@ -1,38 +1,109 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import func, literal_column, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from sqlmodel import select
 
 from config import get_session
-from models.item import Item, ItemCreate, ItemRead, ItemUpdate
+from catalog.items_version import bump_items_version, get_items_version
+from catalog.search_index import product_index
+from core.http_cache import items_cache
+from models.item import Item, ItemCreate, ItemRead, ItemSearchHit, ItemSearchPage, ItemUpdate
 
 router = APIRouter(prefix="/items", tags=["Items"])
 
+# Columna generada por la migración 0002 (no está en el modelo para no traerla en cada SELECT)
+search_vector = literal_column("items.search_vector")
+
 @router.post("/", response_model=ItemRead)
 async def create_item(item_in: ItemCreate, session: AsyncSession = Depends(get_session)):
     """Crea un nuevo item (producto verde)."""
     db_item = Item.from_orm(item_in)
     session.add(db_item)
+    version = await bump_items_version(session)
     await session.commit()
     await session.refresh(db_item)
+    items_cache.invalidate()
+    product_index.upsert_item(db_item, version)
     return db_item
 
 @router.get("/", response_model=List[ItemRead])
-async def read_items(skip: int = 0, limit: int = 100, session: AsyncSession = Depends(get_session)):
-    """Lee una lista de items."""
+async def read_items(request: Request, skip: int = 0, limit: int = 100, session: AsyncSession = Depends(get_session)):
+    """
+    Lee una lista de items. Responde con ETag; si la versión de items no cambió, 304
+    sin volver a leer la tabla.
+    """
+    cache_key = ("list", skip, limit, await get_items_version(session))
+    cached = items_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
     statement = select(Item).offset(skip).limit(limit)
     result = await session.execute(statement)   # <-- use execute()
     items = result.scalars().all()              
-    return items
+    return items_cache.store(request, cache_key, [ItemRead.model_validate(i) for i in items])
+
+
+def escape_like(text: str) -> str:
+    """Escapa los comodines de LIKE para que `%` y `_` del usuario se busquen literales."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@router.get("/search", response_model=ItemSearchPage)
+async def search_items(
+    q: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Búsqueda de texto completo en items (nombre y categoría), ordenada por relevancia.
+    En Postgres usa items.search_vector (GIN, stemming en español sin acentos);
+    en otros motores cae a un ILIKE sin ranking (con `%` y `_` escapados).
+    """
+    offset = (page - 1) * page_size
+    if session.bind.dialect.name == "postgresql":
+        ts_query = func.websearch_to_tsquery("es_unaccent", q)
+        rank = func.ts_rank_cd(search_vector, ts_query)
+        statement = (
+            select(Item, rank.label("rank"))
+            .where(search_vector.op("@@")(ts_query))
+            .order_by(rank.desc(), Item.id)
+        )
+    else:
+        pattern = f"%{escape_like(q)}%"
+        statement = (
+            select(Item, literal_column("0.0").label("rank"))
+            .where(
+                or_(
+                    Item.nombre.ilike(pattern, escape="\\"),
+                    Item.categoria.ilike(pattern, escape="\\"),
+                )
+            )
+            .order_by(Item.id)
+        )
+    # Se pide una fila de más para saber si hay otra página sin hacer COUNT(*)
+    result = await session.execute(statement.offset(offset).limit(page_size + 1))
+    rows = result.all()
+    hits = [
+        ItemSearchHit(**ItemRead.model_validate(item).model_dump(), rank=rank)
+        for item, rank in rows[:page_size]
+    ]
+    return ItemSearchPage(
+        items=hits, page=page, page_size=page_size, has_more=len(rows) > page_size
+    )
 
 
 @router.get("/{item_id}", response_model=ItemRead)
-async def read_item(item_id: int, session: AsyncSession = Depends(get_session)):
-    """Lee un item específico por ID."""
+async def read_item(request: Request, item_id: int, session: AsyncSession = Depends(get_session)):
+    """Lee un item específico por ID. Responde con ETag, igual que el listado."""
+    cache_key = ("item", item_id, await get_items_version(session))
+    cached = items_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
     db_item = await session.get(Item, item_id)
     if not db_item:
         raise HTTPException(status_code=404, detail="Item no encontrado")
-    return db_item
+    return items_cache.store(request, cache_key, ItemRead.model_validate(db_item))
 
 
 @router.patch("/{item_id}", response_model=ItemRead)
@@ -51,8 +122,11 @@ async def update_item(
         setattr(db_item, key, value)
     
     session.add(db_item)
+    version = await bump_items_version(session)
     await session.commit()
     await session.refresh(db_item)
+    items_cache.invalidate()
+    product_index.upsert_item(db_item, version)
     return db_item
 
 
@@ -64,5 +138,8 @@ async def delete_item(item_id: int, session: AsyncSession = Depends(get_session)
         raise HTTPException(status_code=404, detail="Item no encontrado")
     
     await session.delete(db_item)
+    version = await bump_items_version(session)
     await session.commit()
+    items_cache.invalidate()
+    product_index.remove_item(item_id, version)
     return {"ok": True, "detail": "Item eliminado"}
@@ -1,86 +1,91 @@
-from fastapi import APIRouter
-import http.client
-import ssl
-import certifi
-import urllib.parse
-import json
-import re
-import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
+from config import get_session
 from models.gemini import ProductData
+from catalog.categorizer import categorize_products, classify_by_rules
+from catalog.pricing import parse_prices
+from catalog.rapidapi import fetch_products, retry_after_for
+from catalog.search_index import product_index, search_local
+from core.http_cache import productos_cache
+from core.telemetry import traced
 
 router = APIRouter(prefix="/productos", tags=["Productos"])
 
+PAGE_SIZE = 20
 
-def parse_price(price_str):
-    """
-    Convert a price string like 'MX$3,140.50' or 'USD 1,200.75' into a float.
-    Returns None if parsing fails.
-    """
-    if not price_str:
-        return None
-    # Remove all non-digit, non-dot, non-comma characters
-    cleaned = re.sub(r"[^\d.,]", "", price_str)
-    # If both comma and dot exist, assume dot is decimal separator
-    if "." in cleaned and "," in cleaned:
-        cleaned = cleaned.replace(",", "")
-    # If only comma exists, assume it's decimal separator
-    elif "," in cleaned and "." not in cleaned:
-        cleaned = cleaned.replace(",", ".")
-    try:
-        return float(cleaned)
-    except ValueError:
-        return None
 
+@traced("search_products")
+async def search_products(query, page=1, country="mx") -> List[ProductData]:
+    products_data = (await fetch_products(query, page, country))[:PAGE_SIZE]
+    prices = parse_prices(p.get("price", "") for p in products_data)
 
-def search_products(query, page=1, country="mx"):
-    # Use certifi's CA bundle for SSL verification
-    context = ssl.create_default_context(cafile=certifi.where())
-    conn = http.client.HTTPSConnection(
-        "product-search-api.p.rapidapi.com", context=context
+    # Los productos sin precio legible se descartan (ProductData exige precio)
+    priced = [(p, precio) for p, precio in zip(products_data, prices) if precio is not None]
+    # Una sola pasada para toda la página; lo que no se resuelva toma la categoría de la consulta
+    categorias = await categorize_products(
+        [p.get("title", "") for p, _ in priced], default=classify_by_rules(query)
     )
 
-    payload = urllib.parse.urlencode({"query": query, "page": page, "country": country})
-
-    rapidapi_key = os.environ.get("RAPIDAPI_KEY")
-    if not rapidapi_key:
-        raise RuntimeError("RAPIDAPI_KEY not set in environment variables")
-
-    headers = {
-        "x-rapidapi-key": rapidapi_key,
-        "x-rapidapi-host": "product-search-api.p.rapidapi.com",
-        "Content-Type": "application/x-www-form-urlencoded",
-    }
-
-    conn.request("POST", "/shopping", payload, headers)
-    res = conn.getresponse()
-    data = res.read()
-
-    products_data = json.loads(data.decode("utf-8")).get("products", [])
-
     simplified_products: List[ProductData] = [
         ProductData(
             nombre=p.get("title", ""),
             link=p.get("link", ""),
             img_link=p.get("imageUrl", ""),
-            precio=parse_price(p.get("price", "")),
-            categoria="Luz",  # TODO: Just a placeholder
+            precio=precio,
+            categoria=categoria,
         )
-        for p in products_data[:20]
+        for (p, precio), categoria in zip(priced, categorias)
     ]
 
-    print(simplified_products)
-
     return simplified_products
 
 
 @router.get("/buscar/", response_model=List[ProductData])
-async def search_products_endpoint(query: str, page: int = 1, country: str = "mx"):
+async def search_products_endpoint(
+    request: Request,
+    response: Response,
+    query: str,
+    page: int = Query(1, ge=1),
+    country: str = "mx",
+    remote: bool = False,
+    session: AsyncSession = Depends(get_session),
+):
     """
-    Search for products using the external API.
+    Search for products. The local index (items table + productList.json) answers
+    first; the external API is only used when it has no matches for the query or
+    `remote=true`. The source depends on the query, not on the page, so every page of
+    one query comes from the same place (past the last local match pages are empty).
+    The `X-Search-Source` header says which one answered (`local` / `remote`).
 
     - **query**: Search term
     - **page**: Page number (default 1)
-    - **country**: Search country (default "mx")
+    - **country**: Search country (default "mx"; the local catalog only covers "mx")
+    - **remote**: Skip the local index and query the external API
+
+    If the external API is unavailable (circuit open, no key, HTTP or network error)
+    the answer is 503 with `Retry-After`.
     """
-    return search_products(query, page, country)
+    if not remote and country.lower() == "mx":
+        await product_index.ensure_loaded(session)
+        if product_index.has_matches(query):
+            response.headers["X-Search-Source"] = "local"
+            return search_local(query, limit=PAGE_SIZE, offset=(page - 1) * PAGE_SIZE)
+
+    cache_key = (query.strip().lower(), page, country.lower())
+    cached = productos_cache.lookup(request, cache_key)
+    if cached is None:
+        try:
+            products = await search_products(query, page, country)
+        except Exception as e:
+            retry_after = retry_after_for(e)
+            if retry_after is None:
+                raise
+            raise HTTPException(
+                status_code=503,
+                detail="Product search is temporarily unavailable",
+                headers={"Retry-After": str(retry_after)},
+            )
+        cached = productos_cache.store(request, cache_key, products)
+    cached.headers["X-Search-Source"] = "remote"
+    return cached
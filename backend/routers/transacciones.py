@@ -1,23 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import Any, Dict, List, Optional
 from sqlmodel import select
+from datetime import datetime
+from pydantic import BaseModel, ValidationError
+import json
+import logging
+import time
 
-from config import get_session
+from config import get_read_session, get_session
+from core.auth import ROLE_CLIENTE, invalidate_principal
+from core.telemetry import annotate
 from models.transacciones import Transaccion, TransaccionCreate, TransaccionRead, TransaccionUpdate
 
 router = APIRouter(prefix="/transacciones", tags=["Transacciones"])
+logger = logging.getLogger(__name__)
 
 
+# Columnas que se cargan en las inserciones masivas (el id lo asigna la base)
+COLUMNAS_BULK = ("cliente_id", "monto", "categoria", "descripcion", "fecha")
+MAX_FILAS_BULK = 50_000
+TAMANO_LOTE_BULK = 5_000
+
+
+def normalizar_fecha(fecha: Optional[datetime]) -> Optional[datetime]:
+    """Convierte la fecha a naïve si viene con tzinfo (la columna no guarda zona)."""
+    if fecha and fecha.tzinfo:
+        return fecha.replace(tzinfo=None)
+    return fecha
+
 
 # Endpoint original: solo crea una transacción
 @router.post("/", response_model=TransaccionRead)
 async def create_transaccion(trans_in: TransaccionCreate, session: AsyncSession = Depends(get_session)):
     """Crea una nueva transacción (sin afectar saldo del cliente)."""
     db_trans = Transaccion.from_orm(trans_in)
-    # Convertir fecha a naïve si viene con tzinfo
-    if db_trans.fecha and db_trans.fecha.tzinfo:
-        db_trans.fecha = db_trans.fecha.replace(tzinfo=None)
+    db_trans.fecha = normalizar_fecha(db_trans.fecha)
     session.add(db_trans)
     await session.commit()
     await session.refresh(db_trans)
@@ -27,39 +46,254 @@ async def create_transaccion(trans_in: TransaccionCreate, session: AsyncSession
 
 from models.cliente import Cliente, ClienteRead
 
+
+async def debitar_saldo(
+    session: AsyncSession, cliente_id: int, monto: float
+) -> Optional[Cliente]:
+    """
+    Descuenta `monto` del saldo del cliente en un solo UPDATE condicional.
+
+    La validación de fondos vive en el WHERE, así que la base de datos la evalúa
+    sobre la fila bloqueada: dos escritores concurrentes no pueden gastar el mismo
+    saldo ni pisarse el resultado. Devuelve el cliente actualizado (vía RETURNING)
+    o None si no existe o no tiene fondos suficientes.
+
+    El saldo forma parte del principal cacheado de /clientes/me: quien llama debe
+    invalidarlo (invalidate_principal) después del commit, no antes; si no, una lectura
+    concurrente puede volver a cachear el saldo viejo.
+    """
+    result = await session.execute(
+        update(Cliente)
+        .where(Cliente.id == cliente_id, Cliente.saldo >= monto)
+        .values(saldo=Cliente.saldo - monto)
+        .returning(Cliente)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalar_one_or_none()
+
+
 @router.post("/registrar")
 async def registrar_transaccion(trans_in: TransaccionCreate, session: AsyncSession = Depends(get_session)):
     """
     Crea una transacción, descuenta el monto del cliente y verifica fondos suficientes.
     Devuelve la transacción y el cliente actualizado.
+
+    El descuento y el INSERT van en la misma transacción, sin leer el cliente antes:
+    si el UPDATE no afecta ninguna fila se hace rollback y se responde 400 (o 404 si
+    el cliente no existe). Son dos sentencias (UPDATE ... RETURNING e INSERT ...
+    RETURNING), no un solo CTE: SQLite, que usan los tests, no admite DML dentro de
+    WITH, y la atomicidad la da la transacción, no el número de sentencias.
     """
-    # Obtener cliente
-    cliente = await session.get(Cliente, trans_in.cliente_id)
-    if not cliente:
-        raise HTTPException(status_code=404, detail="Cliente no encontrado")
-    if trans_in.monto > -9999999999:
-        # Solo permitimos transacciones de retiro (monto positivo = gasto)
-        if cliente.saldo < trans_in.monto:
-            raise HTTPException(status_code=400, detail="Fondos insuficientes")
-        cliente.saldo -= trans_in.monto
-        session.add(cliente)
+    annotate(cliente_id=trans_in.cliente_id, monto=trans_in.monto)
+    cliente = await debitar_saldo(session, trans_in.cliente_id, trans_in.monto)
+    if cliente is None:
+        await session.rollback()
+        if not await session.get(Cliente, trans_in.cliente_id):
+            raise HTTPException(status_code=404, detail="Cliente no encontrado")
+        raise HTTPException(status_code=400, detail="Fondos insuficientes")
+
     # Registrar transacción
-    db_trans = Transaccion.from_orm(trans_in)
-    # Convertir fecha a naïve si viene con tzinfo
-    if db_trans.fecha and db_trans.fecha.tzinfo:
-        db_trans.fecha = db_trans.fecha.replace(tzinfo=None)
-    session.add(db_trans)
+    trans_data = trans_in.dict()
+    trans_data["fecha"] = normalizar_fecha(trans_data["fecha"])
+    result = await session.execute(
+        insert(Transaccion).values(**trans_data).returning(Transaccion)
+    )
+    db_trans = result.scalar_one()
     await session.commit()
-    await session.refresh(db_trans)
-    await session.refresh(cliente)
+    invalidate_principal(ROLE_CLIENTE, trans_in.cliente_id)
+
     return {
         "transaccion": TransaccionRead.model_validate(db_trans).model_dump(),
         "cliente": ClienteRead.model_validate(cliente).model_dump()
     }
 
 
+# --- INGESTA MASIVA (estados de cuenta) ---
+class LoteRechazado(Exception):
+    """Rechazo esperado de un lote (fondos); su mensaje sí se devuelve al cliente."""
+
+
+class BulkFilaError(BaseModel):
+    fila: int
+    cliente_id: Optional[int] = None
+    error: str
+
+
+class BulkIngestaResponse(BaseModel):
+    recibidas: int
+    insertadas: int
+    fallidas: int
+    errores: List[BulkFilaError]
+    duracion_s: float
+    filas_por_segundo: float
+
+
+async def leer_filas_bulk(request: Request):
+    """
+    Lee el cuerpo como arreglo JSON o como NDJSON (una transacción por línea).
+    El NDJSON se procesa conforme llega, sin cargar todo el cuerpo en memoria.
+    Genera tuplas (numero_de_fila, objeto_o_excepcion).
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        pendiente = b""
+        fila = 0
+        async for chunk in request.stream():
+            pendiente += chunk
+            *lineas, pendiente = pendiente.split(b"\n")
+            for linea in lineas:
+                if not linea.strip():
+                    continue
+                try:
+                    yield fila, json.loads(linea)
+                except ValueError as e:
+                    yield fila, e
+                fila += 1
+        if pendiente.strip():
+            try:
+                yield fila, json.loads(pendiente)
+            except ValueError as e:
+                yield fila, e
+        return
+
+    try:
+        cuerpo = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="El cuerpo no es JSON válido")
+    if not isinstance(cuerpo, list):
+        raise HTTPException(
+            status_code=400, detail="Se esperaba un arreglo JSON de transacciones"
+        )
+    for fila, obj in enumerate(cuerpo):
+        yield fila, obj
+
+
+async def insertar_lote(session: AsyncSession, filas: List[Dict[str, Any]]):
+    """
+    Inserta un lote de transacciones ya validadas.
+    Con asyncpg usa COPY (copy_records_to_table); con otros drivers, executemany.
+    """
+    conn = await session.connection()
+    if conn.dialect.driver == "asyncpg":
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            Transaccion.__tablename__,
+            records=[tuple(f[c] for c in COLUMNAS_BULK) for f in filas],
+            columns=list(COLUMNAS_BULK),
+        )
+    else:
+        await session.execute(insert(Transaccion), filas)
+
+
+@router.post("/bulk", response_model=BulkIngestaResponse)
+async def ingesta_masiva_transacciones(
+    request: Request,
+    debitar_saldo_clientes: bool = False,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Inserta miles de transacciones en una sola petición (arreglo JSON o NDJSON con
+    `Content-Type: application/x-ndjson`).
+
+    - Cada fila se valida como `TransaccionCreate`; las inválidas se reportan y se omiten.
+      Las filas sin `fecha` se guardan con NULL, igual que en /registrar.
+    - Con `debitar_saldo_clientes=true` se descuenta del saldo el total por cliente con
+      un solo UPDATE condicional; si un cliente no tiene fondos, sus filas se rechazan.
+    - Cada lote corre en un SAVEPOINT: un lote que falla no tumba a los demás.
+    """
+    inicio = time.perf_counter()
+    recibidas = 0
+    validas: List[Dict[str, Any]] = []
+    errores: List[BulkFilaError] = []
+
+    async for fila, obj in leer_filas_bulk(request):
+        recibidas += 1
+        if recibidas > MAX_FILAS_BULK:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Máximo {MAX_FILAS_BULK} transacciones por petición",
+            )
+        if isinstance(obj, Exception):
+            errores.append(BulkFilaError(fila=fila, error=f"JSON inválido: {obj}"))
+            continue
+        try:
+            trans_in = TransaccionCreate.model_validate(obj)
+        except ValidationError as e:
+            errores.append(
+                BulkFilaError(fila=fila, error=str(e.errors(include_url=False)))
+            )
+            continue
+        trans_data = trans_in.dict()
+        trans_data["fecha"] = normalizar_fecha(trans_data["fecha"])
+        trans_data["_fila"] = fila
+        validas.append(trans_data)
+
+    # Armar lotes: por cliente si hay que debitar (el débito y sus filas van juntos),
+    # o en bloques de tamaño fijo si solo se insertan.
+    lotes: List[tuple[Optional[int], List[Dict[str, Any]]]] = []
+    if debitar_saldo_clientes:
+        por_cliente: Dict[int, List[Dict[str, Any]]] = {}
+        for f in validas:
+            por_cliente.setdefault(f["cliente_id"], []).append(f)
+        lotes = list(por_cliente.items())
+    else:
+        lotes = [
+            (None, validas[i : i + TAMANO_LOTE_BULK])
+            for i in range(0, len(validas), TAMANO_LOTE_BULK)
+        ]
+
+    insertadas = 0
+    debitados: List[int] = []
+    for cliente_id, lote in lotes:
+        filas = [{c: f[c] for c in COLUMNAS_BULK} for f in lote]
+        try:
+            async with session.begin_nested():
+                if cliente_id is not None:
+                    total = sum(f["monto"] for f in filas)
+                    if await debitar_saldo(session, cliente_id, total) is None:
+                        raise LoteRechazado(
+                            "Fondos insuficientes o cliente inexistente "
+                            f"(total del lote: {total})"
+                        )
+                    debitados.append(cliente_id)
+                for i in range(0, len(filas), TAMANO_LOTE_BULK):
+                    await insertar_lote(session, filas[i : i + TAMANO_LOTE_BULK])
+            insertadas += len(filas)
+        except Exception as e:
+            if isinstance(e, LoteRechazado):
+                error = str(e)
+            else:
+                # El texto del driver (SQL, constraints) va al log, no a la respuesta
+                logger.exception("ingesta_masiva: falló un lote de %s filas", len(filas))
+                error = "Error al insertar el lote"
+            errores.extend(
+                BulkFilaError(fila=f["_fila"], cliente_id=f["cliente_id"], error=error)
+                for f in lote
+            )
+    await session.commit()
+    for cliente_id in debitados:
+        invalidate_principal(ROLE_CLIENTE, cliente_id)
+
+    duracion = time.perf_counter() - inicio
+    logger.info(
+        "ingesta_masiva recibidas=%s insertadas=%s fallidas=%s duracion_ms=%.2f",
+        recibidas,
+        insertadas,
+        len(errores),
+        duracion * 1000,
+    )
+    return BulkIngestaResponse(
+        recibidas=recibidas,
+        insertadas=insertadas,
+        fallidas=len(errores),
+        errores=sorted(errores, key=lambda e: e.fila),
+        duracion_s=round(duracion, 4),
+        filas_por_segundo=round(insertadas / duracion, 1) if duracion > 0 else 0.0,
+    )
+
+
 @router.get("/", response_model=List[TransaccionRead])
-async def read_transacciones(skip: int = 0, limit: int = 100, session: AsyncSession = Depends(get_session)):
+async def read_transacciones(skip: int = 0, limit: int = 100, session: AsyncSession = Depends(get_read_session)):
     """Lee una lista de transacciones."""
     statement = select(Transaccion).offset(skip).limit(limit)
     result = await session.execute(statement)
@@ -106,7 +340,7 @@ async def delete_transaccion(transaccion_id: int, session: AsyncSession = Depend
     return {"ok": True, "detail": "Transacción eliminada"}
 
 @router.get("/cliente/{cliente_id}", response_model=List[TransaccionRead])
-async def read_transacciones_cliente(cliente_id: int, session: AsyncSession = Depends(get_session)):
+async def read_transacciones_cliente(cliente_id: int, session: AsyncSession = Depends(get_read_session)):
     """Obtiene todas las transacciones de un cliente específico."""
     statement = select(Transaccion).where(Transaccion.cliente_id == cliente_id)
     result = await session.execute(statement)
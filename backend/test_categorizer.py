@@ -0,0 +1,82 @@
+"""
+Test del clasificador de categorías por lote (catalog/categorizer.py).
+"""
+
+import asyncio
+
+import pytest
+
+from catalog import categorizer
+from catalog.categorizer import categorize_products, classify_by_rules
+from catalog.product_catalog import load_product_catalog
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    categorizer.clear_cache()
+    yield
+    categorizer.clear_cache()
+
+
+@pytest.mark.parametrize(
+    "title, expected",
+    [
+        ("Panel Solar Canadian Solar 550w", "Luz"),
+        ("Feit Set de 10 Focos LED 60W", "Luz"),
+        ("Calentador de Agua Solar Foset 15 Tubos", "Luz"),
+        ("Regadera Ecológica Ahorradora de Agua", "Agua"),
+        ("Calentador instantáneo Mabe gas lp 6 litros", "Gas"),
+        ("Estufa Eléctrica Xpert Cooking Empotrable", "Gas"),
+        ("Scooter electrico Con Asiento Luz Led", "Transporte"),
+        ("Cargador portátil para vehículos eléctricos", "Transporte"),
+    ],
+)
+def test_rules(title, expected):
+    assert classify_by_rules(title) == expected
+
+
+def test_rules_agree_with_local_catalog():
+    catalog = load_product_catalog()
+    agree = sum(classify_by_rules(p.nombre) == p.categoria for p in catalog)
+    assert agree / len(catalog) >= 0.9
+
+
+def test_unknown_or_tied_titles_are_unresolved():
+    assert classify_by_rules("Caucho líquido flex seal") is None
+    assert classify_by_rules("calentador de agua") is None  # Gas vs Agua
+
+
+def test_leftovers_go_to_one_batched_call_and_are_cached(monkeypatch):
+    calls = []
+
+    def fake_gemini(titles):
+        calls.append(list(titles))
+        return {i: "Gas" for i in range(len(titles))}
+
+    monkeypatch.setattr(categorizer, "_classify_with_gemini", fake_gemini)
+    titles = ["Foco LED 9W", "Caucho líquido flex seal", "Foamular 1 pulgada", "caucho  LÍQUIDO flex seal"]
+
+    first = asyncio.run(categorize_products(titles, use_llm=True))
+    second = asyncio.run(categorize_products(titles, use_llm=True))
+
+    assert first == second == ["Luz", "Gas", "Gas", "Gas"]
+    assert calls == [["Caucho líquido flex seal", "Foamular 1 pulgada"]]
+
+
+def test_unresolved_titles_use_default_and_are_not_cached(monkeypatch):
+    monkeypatch.setattr(categorizer, "_classify_with_gemini", lambda titles: {})
+
+    result = asyncio.run(
+        categorize_products(["Foamular 1 pulgada", "Bicicleta Eléctrica"], default="Agua", use_llm=True)
+    )
+    assert result == ["Agua", "Transporte"]
+    assert categorizer._cache_key("Foamular 1 pulgada") not in categorizer._cache
+
+
+def test_without_api_key_no_llm_call(monkeypatch):
+    def fail(titles):
+        raise AssertionError("Gemini should not be called")
+
+    monkeypatch.setattr(categorizer, "_classify_with_gemini", fail)
+    assert asyncio.run(categorize_products(["Foamular 1 pulgada"])) == [categorizer.DEFAULT_CATEGORIA]
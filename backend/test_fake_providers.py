@@ -0,0 +1,105 @@
+"""
+Test de los proveedores falsos de Gemini y RapidAPI (core/fakes.py, gemini/providers.py,
+catalog/rapidapi.py) usados en pruebas de carga sin cuota.
+"""
+
+import asyncio
+import random
+import statistics
+
+import httpx
+import pytest
+
+from catalog import rapidapi
+from core.fakes import FaultInjector, LatencyDistribution
+from gemini import baseGeminiQueries
+from gemini.providers import FakeGeminiProvider
+from models.gemini import CreditOfferDrafts
+
+
+@pytest.fixture(autouse=True)
+def reset_providers():
+    yield
+    baseGeminiQueries.set_provider(None)
+    rapidapi.set_provider(None)
+    rapidapi.clear_cache()
+
+
+def instant(**kwargs) -> FaultInjector:
+    return FaultInjector(LatencyDistribution.parse("fixed:0"), **kwargs)
+
+
+def test_latency_specs():
+    rng = random.Random(1)
+    assert LatencyDistribution.parse("fixed:250").sample(rng) == 0.25
+    assert 0.1 <= LatencyDistribution.parse("uniform:100:200").sample(rng) <= 0.2
+    samples = sorted(LatencyDistribution.parse("lognormal:100:1000").sample(rng) for _ in range(5000))
+    assert statistics.median(samples) == pytest.approx(0.1, rel=0.1)
+    assert samples[int(len(samples) * 0.99)] == pytest.approx(1.0, rel=0.25)
+    for spec in ("fixed", "normal:1:2", "uniform:5", "lognormal:500:100", "fixed:-1"):
+        with pytest.raises(ValueError):
+            LatencyDistribution.parse(spec)
+
+
+def test_quota_per_key_and_seeded_errors():
+    now = [0.0]
+    faults = instant(rpm=2, clock=lambda: now[0])
+    results = [faults.next_call("a").error for _ in range(3)] + [faults.next_call("b").error]
+    assert [type(e).__name__ if e else None for e in results] == [None, None, "FakeRateLimited", None]
+    now[0] = 61
+    assert faults.next_call("a").error is None
+
+    # Misma semilla, mismas fallas
+    a, b = instant(error_rate=0.3, seed=7), instant(error_rate=0.3, seed=7)
+    outcomes_a = [a.next_call().error is not None for _ in range(200)]
+    outcomes_b = [b.next_call().error is not None for _ in range(200)]
+    assert outcomes_a == outcomes_b and 30 < sum(outcomes_a) < 90
+
+
+def test_fake_gemini_goes_through_the_normal_path(monkeypatch):
+    baseGeminiQueries.set_provider(FakeGeminiProvider(instant(rpm=2), seed=3))
+    monkeypatch.setitem(baseGeminiQueries.token_usage, "calls", 0)
+
+    first = baseGeminiQueries.gemini_structured_response("ofertas", CreditOfferDrafts, api_key="k1")
+    again = baseGeminiQueries.gemini_structured_response("ofertas", CreditOfferDrafts, api_key="k1")
+    assert first == again
+    CreditOfferDrafts.model_validate(first)
+    assert baseGeminiQueries.token_usage["calls"] == 2
+
+    # Tercera llamada con la misma llave: cuota agotada, error como con la API real
+    limited = baseGeminiQueries.gemini_structured_response("ofertas", CreditOfferDrafts, api_key="k1")
+    assert "429" in limited["error"]
+    assert "error" not in baseGeminiQueries.gemini_structured_response("ofertas", CreditOfferDrafts, api_key="k2")
+
+    text = baseGeminiQueries.gemini_basic_response("hola", api_key="k3")
+    streamed = "".join(baseGeminiQueries.gemini_stream_response("hola", api_key="k3"))
+    assert streamed.split() == text.split()
+
+
+def test_provider_selected_by_environment(monkeypatch):
+    monkeypatch.setenv("GEMINI_PROVIDER", "fake")
+    monkeypatch.setenv("RAPIDAPI_PROVIDER", "fake")
+    monkeypatch.setenv("FAKE_GEMINI_LATENCY", "fixed:0")
+    monkeypatch.setenv("FAKE_RAPIDAPI_LATENCY", "fixed:0")
+    assert isinstance(baseGeminiQueries.get_provider(), FakeGeminiProvider)
+    assert isinstance(rapidapi.get_provider(), rapidapi.FakeProductSearchProvider)
+    monkeypatch.setenv("GEMINI_PROVIDER", "otro")
+    baseGeminiQueries.set_provider(None)
+    with pytest.raises(ValueError):
+        baseGeminiQueries.get_provider()
+
+
+def test_fake_rapidapi_results_and_429():
+    rapidapi.set_provider(rapidapi.FakeProductSearchProvider(instant(rpm=1), seed=1))
+
+    async def scenario():
+        products = await rapidapi.fetch_products("paneles solares")
+        cached = await rapidapi.fetch_products("paneles solares")  # caché: no gasta cuota
+        with pytest.raises(httpx.HTTPStatusError) as error:
+            await rapidapi.fetch_products("boiler")
+        return products, cached, error.value
+
+    products, cached, error = asyncio.run(scenario())
+    assert products is cached and len(products) == 20
+    assert products[0]["title"].startswith("Paneles Solares") and products[0]["price"].startswith("$")
+    assert error.response.status_code == 429 and error.response.headers["Retry-After"] == "60"
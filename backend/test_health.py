@@ -0,0 +1,138 @@
+"""
+Test del subsistema de salud (core/health.py), del circuit breaker de RapidAPI
+(core/circuit.py) y del estado de las llaves de Gemini (gemini/keyHealth.py).
+"""
+
+import asyncio
+
+import pytest
+
+from catalog import rapidapi
+from core.circuit import CircuitBreaker, CircuitOpenError
+from core.fakes import FakeRateLimited, FaultInjector, LatencyDistribution
+from core.health import HealthCheck, HealthProbe, check_database
+from gemini import baseGeminiQueries
+from gemini.keyHealth import KeyHealth, fingerprint, key_health
+from gemini.providers import FakeGeminiProvider
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    yield
+    rapidapi.breaker.record_success()
+    rapidapi.set_provider(None)
+    rapidapi.clear_cache()
+    baseGeminiQueries.set_provider(None)
+    key_health.clear()
+
+
+def test_circuit_opens_fails_fast_and_closes_after_a_probe():
+    now = [0.0]
+    breaker = CircuitBreaker("api", failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure(RuntimeError("500"))
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after == 10
+
+    # Medio abierto: una sola llamada de prueba; si falla se vuelve a abrir
+    now[0] = 11
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure(RuntimeError("500"))
+    assert breaker.state == "open"
+    now[0] = 22
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.snapshot() == {"state": "closed", "consecutive_failures": 0, "last_error": "RuntimeError"}
+
+
+def test_rapidapi_outages_open_the_circuit():
+    failing = FaultInjector(LatencyDistribution.parse("fixed:0"), error_rate=1.0)
+    rapidapi.set_provider(rapidapi.FakeProductSearchProvider(failing))
+
+    async def scenario():
+        errors = []
+        for i in range(rapidapi.breaker.failure_threshold + 1):
+            try:
+                await rapidapi.fetch_products(f"boiler {i}")
+            except Exception as e:
+                errors.append(type(e).__name__)
+        return errors
+
+    errors = asyncio.run(scenario())
+    assert errors[-2:] == ["HTTPStatusError", "CircuitOpenError"]
+    assert rapidapi.breaker.state == "open"
+
+
+def test_key_health_tracks_each_gemini_key():
+    now = [0.0]
+    health = KeyHealth(clock=lambda: now[0])
+    health.record_success("k1")
+    health.record_failure("k2", FakeRateLimited("429 Resource has been exhausted"))
+    for _ in range(3):
+        health.record_failure("k3", RuntimeError("403 API key not valid"))
+    report = health.snapshot(["k1", "k2", "k3", "k4"])
+    assert [k["status"] for k in report] == ["ok", "rate_limited", "failing", "unused"]
+    assert report[0]["key"] == fingerprint("k1") and "k1" not in str(report)
+    assert report[2]["last_error"] == "RuntimeError" and "not valid" not in str(report)
+    now[0] = 61
+    assert health.status("k2") == "ok"
+
+    # Las llamadas reales pasan por key_health
+    limited = FaultInjector(LatencyDistribution.parse("fixed:0"), rpm=1)
+    baseGeminiQueries.set_provider(FakeGeminiProvider(limited))
+    baseGeminiQueries.gemini_basic_response("hola", api_key="a")
+    baseGeminiQueries.gemini_basic_response("hola", api_key="a")
+    assert key_health.status("a") == "rate_limited"
+
+
+def test_report_is_cached_and_shared_by_concurrent_polls():
+    now = [0.0]
+    calls = []
+
+    async def probe():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"status": "ok"}
+
+    async def down():
+        raise ConnectionRefusedError("sin base")
+
+    async def scenario():
+        health = HealthCheck([HealthProbe("db", probe, required=True)], ttl=5, clock=lambda: now[0])
+        reports = await asyncio.gather(*(health.report() for _ in range(10)))
+        now[0] = 4
+        await health.report()
+        now[0] = 6
+        await health.report()
+        broken = HealthCheck([HealthProbe("db", down, required=True), HealthProbe("gemini", probe)])
+        return reports, await broken.report()
+
+    reports, broken = asyncio.run(scenario())
+    # Las 10 juntas y la de t=4 comparten un chequeo; t=6 ya expiró; +1 del segundo HealthCheck
+    assert len(calls) == 3
+    assert reports[0]["status"] == "ok" and reports[0]["checks"]["db"]["latency_ms"] >= 0
+    assert broken["status"] == "down"
+    # Solo el tipo: el mensaje de la excepción no sale en /health
+    assert broken["checks"]["db"]["error"] == "ConnectionRefusedError"
+    assert "sin base" not in str(broken)
+
+
+def test_database_probe_reports_pool_stats(tmp_path):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'health.db'}")
+        try:
+            return await check_database(engine)
+        finally:
+            await engine.dispose()
+
+    result = asyncio.run(scenario())
+    assert result["status"] == "ok"
+    assert result["pool"]["checkedin"] == 1 and result["pool"]["checkedout"] == 0
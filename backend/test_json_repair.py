@@ -0,0 +1,165 @@
+"""
+Tests de la etapa de reparación de salida estructurada (gemini/jsonRepair.py) y de su
+uso en gemini_structured_response con el modelo de Gemini sustituido.
+"""
+
+import json
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+from gemini import baseGeminiQueries, jsonRepair
+from gemini.jsonRepair import StructuredOutputError, parse_structured
+from models.gemini import ChatResponseType, CreditOffers
+
+PRODUCT = {
+    "nombre": "Panel Solar 450W",
+    "link": "https://tienda.mx/panel",
+    "img_link": "https://tienda.mx/panel.jpg",
+    "precio": 60000.0,
+    "categoria": "Luz",
+}
+
+OFFER = {
+    "prestamo": 60000.0,
+    "interes": 6.0,
+    "meses_originales": 36,
+    "descripcion": "Paneles solares",
+    "gasto_inicial_mes": 1800.0,
+    "gasto_final_mes": 800.0,
+    "product": PRODUCT,
+}
+
+
+class Note(BaseModel):
+    title: str
+    tags: list[str]
+    author: Optional[str]
+
+
+@pytest.fixture(autouse=True)
+def clear_stats():
+    jsonRepair.repair_stats.clear()
+    yield
+    jsonRepair.repair_stats.clear()
+
+
+def test_valid_json_needs_no_repair():
+    result = parse_structured('{"response_type": "text", "object_in_response": ""}', ChatResponseType)
+    assert result.response_type == "text"
+    assert jsonRepair.repair_stats == {"valid": 1}
+
+
+def test_fences_and_trailing_commas_are_fixed_locally():
+    text = '```json\n{"response_type": "credit", "object_in_response": "paneles, solares",}\n```'
+    result = parse_structured(text, ChatResponseType)
+    assert result.object_in_response == "paneles, solares"
+    assert jsonRepair.repair_stats["code_fence"] == 1
+    assert jsonRepair.repair_stats["trailing_comma"] == 1
+    assert jsonRepair.repair_stats["repaired_locally"] == 1
+
+
+def test_truncated_output_keeps_complete_items_only():
+    complete = json.dumps({"creditOffers": [OFFER, OFFER]})
+    # Cortado a mitad de la descripción de la segunda oferta
+    truncated = complete[: complete.rindex("Paneles solares") + 4]
+    with pytest.raises(StructuredOutputError):
+        # Sin follow-up, la segunda oferta queda incompleta y no valida
+        parse_structured(truncated, CreditOffers)
+    assert jsonRepair.repair_stats["truncated"] == 1
+    assert jsonRepair.repair_stats["unrepairable"] == 1
+
+    # Cortado justo entre ofertas: se cierra y valida sin llamar al modelo
+    result = parse_structured(complete[: complete.rindex(", {")], CreditOffers)
+    assert len(result.creditOffers) == 1
+
+
+def test_truncation_never_completes_a_number():
+    data, fixes = jsonRepair.parse_json_lenient('{"a": 1, "b": 12')
+    assert data == {"a": 1}
+    assert fixes == ["truncated"]
+
+
+def test_missing_optional_fields_and_number_strings_are_filled():
+    result = parse_structured('{"title": "x"}', Note)
+    assert result.tags == [] and result.author is None
+    assert jsonRepair.repair_stats["missing_field"] == 2
+
+    offer = dict(OFFER, prestamo="$60,000.00", interes="6.5%", meses_originales=36.4)
+    result = parse_structured(json.dumps({"creditOffers": [offer]}), CreditOffers)
+    assert result.creditOffers[0].prestamo == 60000.0
+    assert result.creditOffers[0].interes == 6.5
+    assert result.creditOffers[0].meses_originales == 36
+    assert jsonRepair.repair_stats["number_format"] == 3
+
+
+def test_follow_up_only_asks_for_invalid_fields():
+    offer = dict(OFFER)
+    del offer["descripcion"]
+    prompts = []
+
+    def follow_up(prompt):
+        prompts.append(prompt)
+        return '{"creditOffers.0.descripcion": "Paneles solares 450W"}'
+
+    result = parse_structured(
+        json.dumps({"creditOffers": [offer]}), CreditOffers, follow_up=follow_up
+    )
+    assert result.creditOffers[0].descripcion == "Paneles solares 450W"
+    assert result.creditOffers[0].product.nombre == "Panel Solar 450W"
+    assert len(prompts) == 1
+    assert '"creditOffers.0.descripcion"' in prompts[0] and "(current value: missing)" in prompts[0]
+    assert 'schema: {"type": "string"}' in prompts[0]
+    # Ni los campos válidos ni sus valores viajan de nuevo
+    assert "creditOffers.0.prestamo" not in prompts[0]
+    assert "Panel Solar 450W" not in prompts[0] and "60000" not in prompts[0]
+    assert jsonRepair.repair_stats["follow_up"] == 1
+    assert jsonRepair.repair_stats["follow_up_repaired"] == 1
+
+
+def test_unrepairable_response_raises_after_one_follow_up():
+    calls = []
+    with pytest.raises(StructuredOutputError, match="response_type"):
+        parse_structured(
+            '{"response_type": "other", "object_in_response": ""}',
+            ChatResponseType,
+            follow_up=lambda prompt: calls.append(prompt) or '{"response_type": "still wrong"}',
+        )
+    assert len(calls) == 1
+    assert jsonRepair.repair_stats["unrepairable"] == 1
+
+    with pytest.raises(StructuredOutputError):
+        parse_structured("Lo siento, no puedo ayudar con eso", ChatResponseType)
+    assert jsonRepair.repair_stats["invalid_json"] == 1
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+def test_structured_response_repairs_before_failing(monkeypatch):
+    answers = iter(['{"response_type": "credit",}', '{"object_in_response": "paneles solares"}'])
+    configs = []
+    prompts = []
+
+    class FakeModel:
+        def __init__(self, model_name, generation_config=None):
+            configs.append(generation_config)
+
+        def generate_content(self, prompt):
+            prompts.append(prompt)
+            return FakeResponse(next(answers))
+
+    monkeypatch.setattr(baseGeminiQueries.genai, "configure", lambda api_key: None)
+    monkeypatch.setattr(baseGeminiQueries.genai, "GenerativeModel", FakeModel)
+
+    original = "CATALOGO: Panel Solar 450W ... HISTORIAL: luz 1200, gas 800 ..."
+    result = baseGeminiQueries.gemini_structured_response(original, ChatResponseType, api_key="k")
+    assert result == {"response_type": "credit", "object_in_response": "paneles solares"}
+    # La segunda llamada es el follow-up, sin el esquema completo ni el prompt original
+    assert "response_schema" in configs[0] and "response_schema" not in configs[1]
+    assert len(prompts) == 2 and original not in prompts[1] and "CATALOGO" not in prompts[1]
+    assert '"object_in_response"' in prompts[1] and '"response_type"' not in prompts[1]
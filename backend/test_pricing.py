@@ -0,0 +1,71 @@
+"""
+Test del parser de precios (catalog/pricing.py), incluyendo fuzzing de formatos.
+"""
+
+import random
+
+import pytest
+
+from catalog.pricing import Money, parse_money, parse_price, parse_prices
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("MX$3,140.50", Money(3140.50, "MXN")),
+        ("USD 1,200.75", Money(1200.75, "USD")),
+        ("$1,299", Money(1299.0, "MXN")),  # coma de miles (antes: 1.299)
+        ("1.299,50 €", Money(1299.50, "EUR")),  # formato europeo (antes: 1.2995)
+        ("$20 USD", Money(20.0, "USD")),
+        ("R$ 49,90", Money(49.90, "BRL")),
+        ("1,234,567", Money(1234567.0, None)),
+        ("MX$1,000 - MX$2,000", Money(1000.0, "MXN")),
+        ("22499", Money(22499.0, None)),
+        ("1,2345", Money(1.2345, None)),  # no son miles (antes: 1234.0)
+    ],
+)
+def test_known_formats(text, expected):
+    assert parse_money(text) == expected
+
+
+@pytest.mark.parametrize("text", [None, "", "Gratis", "Consultar precio"])
+def test_unparseable_returns_none(text):
+    assert parse_price(text) is None
+
+
+def test_locale_with_dot_thousands():
+    assert parse_price("1.299") == 1.299
+    assert parse_price("1.299", locale="es") == 1299.0
+
+
+def test_batch_matches_single():
+    values = ["MX$3,140.50", "Gratis", "$1,299", "1.299,50 €"]
+    assert parse_prices(values) == [parse_price(v) for v in values]
+
+
+def group(integer: int, sep: str) -> str:
+    return f"{integer:,}".replace(",", sep)
+
+
+FORMATS = [
+    # (formateador, locale, ¿conserva centavos?)
+    (lambda i, c: f"MX${group(i, ',')}.{c:02d}", "mx", True),
+    (lambda i, c: f"${group(i, ',')}", "mx", False),
+    (lambda i, c: f"USD {group(i, ',')}.{c:02d}", "mx", True),
+    (lambda i, c: f"{group(i, '.')},{c:02d} €", "mx", True),
+    (lambda i, c: f"€{group(i, '.')},{c:02d}", "es", True),
+    (lambda i, c: f"{group(i, chr(0xA0))},{c:02d} EUR", "es", True),
+    (lambda i, c: f"{i}.{c:02d}", "mx", True),
+    (lambda i, c: f"Precio: MXN {group(i, ',')}.{c:02d} (IVA incluido)", "mx", True),
+]
+
+
+def test_fuzz_round_trip():
+    rng = random.Random(2025)
+    for _ in range(5000):
+        integer = rng.choice([rng.randint(0, 999), rng.randint(1000, 10**7)])
+        cents = rng.randint(0, 99)
+        fmt, locale, keeps_cents = rng.choice(FORMATS)
+        text = fmt(integer, cents)
+        expected = integer + cents / 100 if keeps_cents else float(integer)
+        assert parse_price(text, locale) == pytest.approx(expected), text
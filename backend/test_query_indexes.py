@@ -0,0 +1,107 @@
+"""
+Verifica con EXPLAIN que las consultas calientes usan los índices declarados en los modelos.
+
+Por defecto corre contra SQLite en memoria (el esquema sale del mismo SQLModel.metadata).
+Si TEST_POSTGRES_URL está definida, repite las consultas en ese Postgres local con
+enable_seqscan=off, para que el plan refleje qué índice elegiría el planner.
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlmodel import SQLModel, select
+
+from models.admin import Admin  # noqa: F401
+from models.cliente import Cliente
+from models.credito import Credito
+from models.item import Item  # noqa: F401
+from models.transacciones import Transaccion
+
+# (consulta, índices aceptables): las mismas construcciones que usan los routers
+HOT_QUERIES = {
+    "transacciones_12_meses": (
+        select(Transaccion).where(
+            Transaccion.cliente_id == 1,
+            Transaccion.fecha >= datetime(2025, 1, 1) - timedelta(days=365),
+        ),
+        {"ix_transacciones_cliente_fecha"},
+    ),
+    "creditos_cliente_estado": (
+        select(Credito).where(Credito.cliente_id == 1, Credito.estado == "ACEPTADO"),
+        {"ix_creditos_cliente_estado_oferta"},
+    ),
+    "ofertas_preaprobadas": (
+        select(Credito).where(
+            Credito.cliente_id == 1, Credito.estado == "APROBADO", Credito.oferta
+        ),
+        {"ix_creditos_cliente_estado_oferta", "ix_creditos_ofertas_aprobadas"},
+    ),
+    "creditos_por_estado": (
+        select(Credito).where(Credito.estado == "PENDIENTE"),
+        {"ix_creditos_estado"},
+    ),
+    "creditos_todos": (
+        select(Credito, Cliente.nombre, Cliente.apellido, Cliente.credit_score)
+        .join(Cliente, Credito.cliente_id == Cliente.id)
+        .order_by(Credito.fecha_inicio.desc())
+        .offset(0)
+        .limit(100),
+        {"ix_creditos_fecha_inicio"},
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def sqlite_engine():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def explain_sqlite(engine, statement) -> str:
+    compiled = statement.compile(dialect=engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_index_sqlite(sqlite_engine, name):
+    statement, expected = HOT_QUERIES[name]
+    plan = explain_sqlite(sqlite_engine, statement)
+    assert any(index in plan for index in expected), f"{name}:\n{plan}"
+
+
+@pytest.mark.skipif(
+    not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL no definida"
+)
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_index_postgres(name):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = os.environ["TEST_POSTGRES_URL"].replace(
+        "postgresql://", "postgresql+asyncpg://", 1
+    )
+    statement, expected = HOT_QUERIES[name]
+
+    async def explain() -> str:
+        engine = create_async_engine(url)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(SQLModel.metadata.create_all)
+                await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+                compiled = statement.compile(
+                    dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+                )
+                rows = await conn.exec_driver_sql(f"EXPLAIN {compiled}")
+                return "\n".join(row[0] for row in rows.all())
+        finally:
+            await engine.dispose()
+
+    plan = asyncio.run(explain())
+    assert any(index in plan for index in expected), f"{name}:\n{plan}"
@@ -0,0 +1,77 @@
+"""
+Test del modo de una sola llamada (gemini/chatUtils.classify_and_create_offers) con la
+respuesta de Gemini sustituida.
+"""
+
+from gemini import chatUtils
+from models.gemini import ClassifiedCreditOffers, ClientProfile
+
+def draft(nombre, precio, categoria, ahorro):
+    return {
+        "descripcion": nombre,
+        "ahorro_porcentaje": ahorro,
+        "product": {
+            "nombre": nombre,
+            "link": "https://tienda.mx/p",
+            "img_link": "https://tienda.mx/p.jpg",
+            "precio": precio,
+            "categoria": categoria,
+        },
+    }
+
+
+def test_credit_message_returns_synthesized_offers(monkeypatch):
+    prompts = []
+
+    def fake_structured(prompt, schema, api_key=None):
+        prompts.append((prompt, schema, api_key))
+        return {
+            "response_type": "credit",
+            "object_in_response": "paneles solares",
+            "text_response": "",
+            "creditOffers": [
+                draft("Panel Solar 450W", 60000.0, "Luz", 60),
+                draft("Auto eléctrico", 400000.0, "Transporte", 70),
+            ],
+        }
+
+    monkeypatch.setattr(chatUtils, "gemini_structured_response", fake_structured)
+    profile = ClientProfile(credit_score=0.7, gastos_mensuales={"Luz": 1800.0, "Transporte": 1000.0})
+    result = chatUtils.classify_and_create_offers(
+        "Quiero paneles", "CONTEXTO-USUARIO", api_key="k", profile=profile
+    )
+
+    assert result["response_type"] == "credit"
+    assert result["object_in_response"] == "paneles solares"
+    panel, auto = result["creditOffers"].creditOffers
+    assert (panel.prestamo, panel.interes, panel.meses_originales) == (60000.0, 4.5, 36)
+    assert panel.gasto_final_mes == 720.0
+    # Con 1,000 al mes no se paga en 120 meses: se ofrece a 120 con un pago mayor en vez de descartarla
+    assert auto.meses_originales == 120 and auto.gasto_inicial_mes > 1000
+    ((prompt, schema, api_key),) = prompts
+    assert schema is ClassifiedCreditOffers and api_key == "k"
+    assert "CONTEXTO-USUARIO" in prompt and "Quiero paneles" in prompt
+
+
+def test_text_message_returns_answer_from_same_call(monkeypatch):
+    monkeypatch.setattr(
+        chatUtils,
+        "gemini_structured_response",
+        lambda prompt, schema, api_key=None: {
+            "response_type": "text",
+            "object_in_response": "",
+            "text_response": "Apaga luces que no uses.",
+            "creditOffers": [],
+        },
+    )
+    assert chatUtils.classify_and_create_offers("¿Cómo ahorro luz?", "") == {
+        "response_type": "text",
+        "text_response": "Apaga luces que no uses.",
+    }
+
+
+def test_errors_pass_through(monkeypatch):
+    monkeypatch.setattr(
+        chatUtils, "gemini_structured_response", lambda prompt, schema, api_key=None: {"error": "x"}
+    )
+    assert chatUtils.classify_and_create_offers("hola", "") == {"error": "x"}
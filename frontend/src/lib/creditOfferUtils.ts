@@ -29,6 +29,7 @@ export interface PreapprovedContextResponse {
 }
 
 export interface GenerateCreditOffersRequest {
+  cliente_id: number;
   conversation_context: string;
   num_offers_to_generate: number;
 }
@@ -150,6 +151,7 @@ export async function createPreapprovedCredits(
 
     // Step 2: Generate credit offers using AI
     const creditOffers = await generateCreditOffers({
+      cliente_id: clientId,
       conversation_context: context.conversation_context,
       num_offers_to_generate: context.num_offers_to_generate,
     });